@@ -0,0 +1,263 @@
+"""
+포트폴리오 분석 (/portfolio/analytics)
+
+trades와 로컬 시세 이력(price_history), 환율 이력(exchange_rates)으로
+날짜 × 종목 NumPy 행렬을 만든 뒤, 일별 루프 없이 한 번에 계산합니다.
+
+- 수량 행렬 Q: 거래일별 수량 변화를 bincount로 모은 뒤 누적합
+- 가격 행렬 P: 종가(휴장일은 직전 종가), 시세가 없는 구간은 마지막 체결가
+- 환율 행렬 FX: 통화별 원화 환율 이력 (이력이 없으면 현재 스냅샷 환율)
+- 평가금액 V = Q * P * FX (원화), 현금흐름 CF = 거래 수량 * 체결가 * 체결일 환율
+
+일별 수익률은 현금흐름이 그날 시작에 들어왔다고 보는 Modified Dietz 방식으로 계산하며,
+이를 이어 붙여 시간가중수익률(TWR), 변동성, 최대낙폭, 종목별 기여도를 구합니다.
+금액가중수익률(MWR)은 현금흐름의 내부수익률(XIRR)입니다.
+
+요청 처리 중에는 로컬 DB만 읽습니다. 거래한 종목의 시세 이력은 스케줄러 작업(portfolio-history)이
+HISTORY_SYNC_TTL마다 동기화 상태를 한 번에 읽어 빠진 구간만 채워 둡니다. (sync_portfolio_history)
+"""
+import asyncio
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+from common.database import (get_trade_history, get_close_prices, get_exchange_rate_history, get_first_trade_dates,
+                             get_history_sync_many, run_db)
+from api.history import missing_ranges, sync_ranges
+from api.fx import fx_service
+
+TRADING_DAYS = 252
+HISTORY_LEAD_DAYS = 7   # 첫 거래일 이전의 직전 종가도 필요하므로 며칠 앞부터 받아 둡니다.
+
+
+def _daily_returns(value, flow):
+    """Modified Dietz 일별 수익률. value, flow는 (D,) 또는 (D, S) 배열"""
+    prev = np.zeros_like(value)
+    prev[1:] = value[:-1]
+    base = prev + flow
+    gain = value - prev - flow
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = np.where(base > 0, gain / base, 0.0)
+    return r, base
+
+
+def _xirr(amounts, days):
+    """현금흐름(투자자 입장: 납입 음수, 회수 양수)의 연 환산 내부수익률. 수렴하지 않으면 None"""
+    if len(amounts) < 2 or not (np.any(amounts < 0) and np.any(amounts > 0)):
+        return None
+    t = (days - days[0]) / 365.0
+    rate = 0.1
+    for _ in range(100):
+        factor = (1.0 + rate) ** -t
+        npv = np.sum(amounts * factor)
+        d_npv = np.sum(-t * amounts * factor / (1.0 + rate))
+        if d_npv == 0:
+            return None
+        step = npv / d_npv
+        rate = max(rate - step, -0.9999)
+        if abs(step) < 1e-10:
+            return float(rate)
+    return None
+
+
+def _align(series, grid_days, names, backfill=False):
+    """
+    (이름, 일수 배열, 값 배열) 목록을 grid_days 기준 (날짜 × names) 행렬로 맞춥니다.
+    각 날짜에는 그날 또는 그 이전의 마지막 값이 들어가므로 휴장일은 직전 값으로 채워집니다.
+    backfill=True면 첫 값 이전 구간도 첫 값으로 채웁니다. 값이 없는 칸은 NaN입니다.
+    """
+    out = np.full((len(grid_days), len(names)), np.nan)
+    columns = {}
+    for i, name in enumerate(names):
+        columns.setdefault(name, []).append(i)
+    for name, days, values in series:
+        if name not in columns or not days:
+            continue
+        days = np.asarray(days, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        pos = np.searchsorted(days, grid_days, side="right") - 1
+        if backfill:
+            pos = np.maximum(pos, 0)
+        out[:, columns[name]] = np.where(pos >= 0, values[np.maximum(pos, 0)], np.nan)[:, None]
+    return out
+
+
+def compute_analytics(trades, price_rows, fx_rows, current_fx, start=None, end=None, include_series=False):
+    """
+    trades: (stock_code, currency, quantity, price, trade_date) 목록 (시간순)
+    price_rows: (symbol, [1970-01-01 기준 일수], [종가]) 목록
+    fx_rows: (currency_code, [1970-01-01 기준 일수], [환율]) 목록, 통화 1단위당 원화
+    current_fx: {통화: 원화 환율} (이력이 없는 통화에 사용)
+    """
+    end = pd.Timestamp(end or date.today())
+    if not trades:
+        return None
+
+    # --- 1. 거래를 열 단위 배열로 ---
+    codes = np.array([t[0] for t in trades], dtype=object)
+    currencies = np.array([t[1] for t in trades], dtype=object)
+    qty = np.array([float(t[2]) for t in trades])
+    price = np.array([float(t[3]) for t in trades])
+    trade_dates = pd.DatetimeIndex(pd.to_datetime([t[4] for t in trades])).normalize()
+
+    si, key_index = pd.MultiIndex.from_arrays([codes, currencies]).factorize(sort=True)
+    keys = list(key_index)
+    labels = [code for code, _ in keys]
+    if len(set(labels)) != len(labels):
+        labels = [f"{code}:{curr}" for code, curr in keys]
+    S = len(keys)
+
+    dates = pd.bdate_range(trade_dates.min(), end)
+    D = len(dates)
+    if D == 0:
+        return None
+    di = np.minimum(dates.searchsorted(trade_dates), D - 1)   # 주말 거래는 다음 영업일로
+    grid_days = dates.values.astype("datetime64[D]").astype(np.int64)
+    flat = di * S + si
+
+    # --- 2. 수량 행렬 ---
+    dq = np.bincount(flat, weights=qty, minlength=D * S).reshape(D, S)
+    Q = np.cumsum(dq, axis=0)
+
+    # --- 3. 가격 행렬 (종가, 없으면 마지막 체결가) ---
+    P = _align(price_rows, grid_days, [code for code, _ in keys])
+
+    last_trade_price = np.full((D, S), np.nan)
+    last_trade_price[di, si] = price          # 같은 날 여러 건이면 마지막 체결가
+    last_trade_price = pd.DataFrame(last_trade_price).ffill().to_numpy()
+    P = np.where(np.isnan(P), last_trade_price, P)
+    P = np.nan_to_num(P)
+
+    # --- 4. 환율 행렬 ---
+    key_currencies = [curr for _, curr in keys]
+    FX = _align(fx_rows, grid_days, key_currencies, backfill=True)
+    fallback = np.array([1.0 if c == "KRW" else current_fx.get(c, np.nan) for c in key_currencies])
+    FX = np.where(np.isnan(FX), fallback, FX)
+    FX = np.nan_to_num(FX, nan=1.0)   # 환율을 전혀 모르는 통화는 원화로 간주
+
+    # --- 5. 평가금액과 현금흐름 ---
+    V_pos = Q * P * FX
+    trade_fx = FX[di, si]
+    cf_pos = np.bincount(flat, weights=qty * price * trade_fx, minlength=D * S).reshape(D, S)
+    V = V_pos.sum(axis=1)
+    CF = cf_pos.sum(axis=1)
+
+    r, base = _daily_returns(V, CF)
+    r_pos, base_pos = _daily_returns(V_pos, cf_pos)
+
+    # --- 6. 조회 구간으로 자르기 ---
+    start_ts = pd.Timestamp(start) if start else dates[0]
+    mask = dates >= start_ts
+    if not mask.any():
+        return None
+    first = int(np.argmax(mask))
+    r_s, base_s, V_s, CF_s = r[first:], base[first:], V[first:], CF[first:]
+    days_s = dates[first:]
+
+    growth = np.cumprod(1.0 + r_s)
+    twr = float(growth[-1] - 1.0)
+    years = (days_s[-1] - days_s[0]).days / 365.0
+    # 1년 미만 구간은 연 환산 값이 지나치게 커지므로 내지 않습니다.
+    twr_annualized = float(growth[-1] ** (1.0 / years) - 1.0) if years >= 1 and growth[-1] > 0 else None
+
+    volatility = float(np.std(r_s, ddof=1) * np.sqrt(TRADING_DAYS)) if len(r_s) > 1 else 0.0
+    drawdown = growth / np.maximum.accumulate(growth) - 1.0
+    max_drawdown = float(drawdown.min())
+
+    # 종목별 기여도: 그날 포트폴리오 수익률 = Σ (종목 비중 × 종목 수익률)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.where(base_s[:, None] > 0, base_pos[first:] / base_s[:, None], 0.0)
+    contribution = (weights * r_pos[first:]).sum(axis=0)
+
+    # 종목 간 상관계수 (일별 가격 수익률)
+    P_s = P[first:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_returns = np.where(P_s[:-1] > 0, P_s[1:] / P_s[:-1] - 1.0, 0.0)
+    valid = price_returns.std(axis=0) > 0 if len(price_returns) > 1 else np.zeros(S, dtype=bool)
+    corr_labels = [labels[i] for i in np.flatnonzero(valid)]
+    corr = np.corrcoef(price_returns[:, valid], rowvar=False) if valid.sum() > 1 else np.ones((int(valid.sum()),) * 2)
+
+    # 금액가중수익률: 시작 시점 평가금액 + 기간 중 순납입을 투자로 보고 마지막 평가금액을 회수로 봄
+    flows = -CF_s.copy()
+    flow_days = (days_s - days_s[0]).days.to_numpy(dtype=float)
+    if first > 0:
+        flows[0] -= V[first - 1]
+    flows[-1] += V_s[-1]
+    nz = flows != 0
+    irr = _xirr(flows[nz], flow_days[nz])
+    mwr = (1.0 + irr) ** years - 1.0 if irr is not None else None
+    mwr_annualized = irr if irr is not None and years >= 1 else None
+
+    result = {
+        "start": days_s[0].date(),
+        "end": days_s[-1].date(),
+        "days": len(days_s),
+        "value": round(float(V_s[-1]), 2),
+        "net_invested": round(float(CF_s.sum() + (V[first - 1] if first > 0 else 0.0)), 2),
+        "twr": round(twr, 6),
+        "twr_annualized": round(twr_annualized, 6) if twr_annualized is not None else None,
+        "mwr": round(mwr, 6) if mwr is not None else None,
+        "mwr_annualized": round(mwr_annualized, 6) if mwr_annualized is not None else None,
+        "volatility": round(volatility, 6),
+        "max_drawdown": round(max_drawdown, 6),
+        "contribution": {labels[i]: round(float(contribution[i]), 6) for i in range(S)},
+        "correlation": {
+            "symbols": corr_labels,
+            "matrix": np.round(np.atleast_2d(corr), 4).tolist() if corr_labels else [],
+        },
+    }
+    if include_series:
+        result["series"] = [
+            {"date": d.date(), "value": round(float(v), 2), "net_flow": round(float(f), 2)}
+            for d, v, f in zip(days_s, V_s, CF_s)
+        ]
+    return result
+
+
+async def sync_portfolio_history(end=None):
+    """
+    거래한 모든 종목의 시세 이력에서 빠진 구간을 채웁니다. 업스트림 호출 횟수를 돌려줍니다.
+    동기화 상태는 한 번에 읽고, 빠진 구간이 있는 종목만 야후를 부릅니다.
+    """
+    end = end or date.today()
+    first_days = await run_db(get_first_trade_dates)
+    if not first_days:
+        return 0
+    syncs = await run_db(get_history_sync_many, list(first_days), "1d")
+    gaps = {}
+    for symbol, first_day in first_days.items():
+        ranges = missing_ranges(syncs.get(symbol), first_day - timedelta(days=HISTORY_LEAD_DAYS), end)
+        if ranges:
+            gaps[symbol] = ranges
+    results = await asyncio.gather(*(sync_ranges(symbol, ranges) for symbol, ranges in gaps.items()),
+                                   return_exceptions=True)
+    calls = 0
+    for symbol, res in zip(gaps, results):
+        if isinstance(res, Exception):
+            print(f"{symbol} 시세 이력 동기화 실패: {res}")
+        else:
+            calls += res
+    return calls
+
+
+async def portfolio_analytics(start=None, end=None, include_series=False, sync=False):
+    """sync=True면 계산 전에 시세 이력을 먼저 채웁니다. (기본은 스케줄러가 채워 둔 로컬 이력만 읽음)"""
+    end = end or date.today()
+    if sync:
+        await sync_portfolio_history(end)
+    trades = await run_db(get_trade_history, end)
+    if not trades:
+        return None
+
+    symbols = sorted({t[0] for t in trades})
+    first_trade = min(t[4] for t in trades)
+    first_day = first_trade.date() if hasattr(first_trade, "date") else first_trade
+
+    price_rows, fx_rows = await asyncio.gather(
+        run_db(get_close_prices, symbols, first_day - timedelta(days=HISTORY_LEAD_DAYS), end),
+        run_db(get_exchange_rate_history, end),
+    )
+    rates = fx_service.all_rates("KRW")
+    current_fx = {code: e["rate"] for code, e in rates["rates"].items()} if rates else {}
+    return await asyncio.to_thread(compute_analytics, trades, price_rows, fx_rows, current_fx,
+                                   start, end, include_series)
@@ -0,0 +1,263 @@
+"""
+거래 기록 대량 가져오기 (CSV / JSON Lines)
+
+증권사에서 내려받은 수년치 체결 내역을 한 번에 옮길 때 사용합니다.
+줄 단위로 읽으면서 TradeImportRow로 검증하고, 통과한 행만 COPY로 한 트랜잭션에 저장합니다.
+업로드 전체를 메모리에 모으지 않고 읽는 즉시 DB로 흘려보내며, 잘못된 줄은 줄 번호와 사유를 보고합니다.
+CSV에서 따옴표로 감싼 값 안의 줄바꿈은 행의 끝으로 보지 않으며, 거부 행은 그 행이 시작된 줄 번호로 보고합니다.
+
+CSV 첫 줄은 헤더여야 합니다:
+    stock_code,quantity,price,currency[,trade_type,trade_date]
+
+명령줄 사용법 (프로젝트 루트에서):
+    python api/bulk_import.py history.csv
+    python api/bulk_import.py fills.jsonl --format jsonl
+"""
+import argparse
+import asyncio
+import csv
+import codecs
+import json
+import queue
+import sys, os
+from datetime import datetime
+from pydantic import ValidationError
+
+# 부모 폴더의 common 폴더를 참조하기 위한 설정
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.database import copy_trades, run_db
+from api.schemas import TradeImportRow
+
+REQUIRED_COLUMNS = ("stock_code", "quantity", "price", "currency")
+MAX_REPORTED_REJECTS = 100   # 응답에 자세히 담는 거부 행 수 (전체 개수는 따로 셈)
+BATCH_SIZE = 1000            # DB 스레드로 한 번에 넘기는 행 수
+QUEUE_BATCHES = 16           # 업로드 속도가 DB보다 빠를 때 쌓아 둘 최대 배치 수
+MAX_RECORD_LINES = 50        # CSV 한 행이 따옴표 안 줄바꿈으로 이어질 수 있는 최대 줄 수
+
+_END = object()
+_ABORT = object()
+
+
+class BulkImportError(Exception):
+    """파일 전체를 받을 수 없는 오류 (헤더 누락, 지원하지 않는 형식 등)"""
+
+
+def _describe(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
+    return str(error)
+
+
+class TradeRowParser:
+    """한 줄씩 받아 COPY용 튜플로 바꾸고, 실패한 줄은 rejects에 기록합니다."""
+
+    def __init__(self, fmt):
+        if fmt not in ("csv", "jsonl"):
+            raise BulkImportError(f"지원하지 않는 형식입니다: {fmt} (csv, jsonl)")
+        self.fmt = fmt
+        self.header = None
+        self.line_no = 0
+        self.row_line = 0       # 지금 읽는 행이 시작된 줄 번호
+        self._record = None     # 따옴표가 아직 닫히지 않은 CSV 행
+        self.accepted = 0
+        self.rejected = 0
+        self.rejects = []
+        self.imported_at = datetime.now()
+
+    def _reject(self, error):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({"line": self.row_line, "error": _describe(error)})
+
+    def _join_quoted(self, line):
+        """
+        CSV 줄을 모아 한 행을 돌려줍니다. 따옴표가 홀수 개면 값 안의 줄바꿈이므로 다음 줄을 이어 붙이고 None을 돌려줍니다.
+        (이스케이프된 따옴표 ""는 두 개씩이라 짝수 판단에 영향이 없음)
+        """
+        if self._record is None:
+            self.row_line = self.line_no
+            self._record = [line]
+        else:
+            self._record.append(line)
+        record = "\n".join(self._record)
+        if record.count('"') % 2 == 0:
+            self._record = None
+            return record
+        if len(self._record) >= MAX_RECORD_LINES:
+            # 닫는 따옴표를 잃은 행이 나머지 파일을 삼키지 않도록 여기서 끊고 다음 줄부터 새 행으로 읽습니다.
+            self._record = None
+            self._reject(ValueError(f"따옴표가 {MAX_RECORD_LINES}줄 안에 닫히지 않았습니다."))
+        return None
+
+    def feed(self, line):
+        self.line_no += 1
+        line = line.rstrip("\r\n")
+        if self.fmt == "csv":
+            line = self._join_quoted(line)
+            if line is None:
+                return None
+        else:
+            self.row_line = self.line_no
+        if not line.strip():
+            return None
+        try:
+            if self.fmt == "csv":
+                values = next(csv.reader(line.splitlines(keepends=True)))
+                if self.header is None:
+                    self.header = [h.strip() for h in values]
+                    missing = [c for c in REQUIRED_COLUMNS if c not in self.header]
+                    if missing:
+                        raise BulkImportError(f"CSV 헤더에 필수 컬럼이 없습니다: {', '.join(missing)}")
+                    return None
+                data = {k: v.strip() for k, v in zip(self.header, values) if v.strip() != ""}
+            else:
+                data = json.loads(line)
+                if not isinstance(data, dict):
+                    raise ValueError("한 줄에 JSON 객체 하나가 있어야 합니다.")
+            if isinstance(data.get("trade_type"), str):
+                data["trade_type"] = data["trade_type"].upper()
+            row = TradeImportRow.model_validate(data)
+        except BulkImportError:
+            raise
+        except ValueError as e:
+            self._reject(e)
+            return None
+
+        self.accepted += 1
+        return (row.stock_code, row.quantity, row.price, row.currency, row.trade_type,
+                row.trade_date or self.imported_at)
+
+    def finish(self):
+        """입력이 끝났는데 따옴표가 닫히지 않은 행이 남아 있으면 거부로 기록합니다."""
+        if self._record is not None:
+            self._record = None
+            self._reject(ValueError("파일 끝까지 따옴표가 닫히지 않았습니다."))
+
+    def summary(self, inserted):
+        return {
+            "status": "success" if self.rejected == 0 else "partial",
+            "inserted": inserted,
+            "rejected": self.rejected,
+            "rejects": self.rejects,
+        }
+
+
+def detect_format(content_type, fmt=None):
+    if fmt:
+        return fmt
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "json" in content_type:   # application/x-ndjson, application/jsonl 등
+        return "jsonl"
+    raise BulkImportError("Content-Type으로 형식을 알 수 없습니다. format=csv 또는 format=jsonl을 지정하세요.")
+
+
+async def _iter_lines(chunks):
+    """바이트 청크 스트림을 줄 단위 문자열로 바꿉니다. (UTF-8, BOM 허용)"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def _put(q, item, db_task):
+    """DB 쪽이 먼저 실패하면 더 기다리지 않도록 하면서 큐에 넣습니다."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            if db_task.done():
+                db_task.result()
+                raise BulkImportError("DB 저장이 예기치 않게 끝났습니다.")
+            await asyncio.sleep(0.01)
+
+
+def _abort(q):
+    # 큐가 가득 차 있어도 중단 신호는 반드시 전달되도록 자리를 비웁니다.
+    while True:
+        try:
+            q.put_nowait(_ABORT)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+
+async def import_stream(chunks, fmt):
+    """
+    업로드 바이트 스트림(async iterator)을 읽어 가져오기를 수행하고 결과 요약을 돌려줍니다.
+    파싱/검증은 이벤트 루프에서, COPY는 DB 스레드에서 동시에 진행됩니다.
+    """
+    parser = TradeRowParser(fmt)
+    q = queue.Queue(maxsize=QUEUE_BATCHES)
+
+    def rows_from_queue():
+        while True:
+            batch = q.get()
+            if batch is _END:
+                return
+            if batch is _ABORT:
+                raise BulkImportError("업로드가 중단되어 가져오기를 취소했습니다.")
+            yield from batch
+
+    db_task = asyncio.ensure_future(run_db(copy_trades, rows_from_queue()))
+    batch = []
+    try:
+        async for line in _iter_lines(chunks):
+            row = parser.feed(line)
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                await _put(q, batch, db_task)
+                batch = []
+        parser.finish()
+        if batch:
+            await _put(q, batch, db_task)
+        await _put(q, _END, db_task)
+    except BaseException:
+        if not db_task.done():
+            _abort(q)
+        # DB 스레드가 중단 신호를 받아 롤백을 마칠 때까지 기다리고 그 예외를 회수합니다.
+        # (기다리지 않으면 커넥션이 풀에 돌아가기 전에 응답하고 "Task exception was never retrieved"가 남음)
+        await asyncio.gather(db_task, return_exceptions=True)
+        raise
+
+    inserted = await db_task
+    return parser.summary(inserted)
+
+
+def import_file(path, fmt):
+    """명령줄용: 파일을 한 줄씩 읽어 가져옵니다."""
+    parser = TradeRowParser(fmt)
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        rows = (row for row in map(parser.feed, f) if row is not None)
+        inserted = copy_trades(rows)
+    parser.finish()
+    return parser.summary(inserted)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="거래 기록 대량 가져오기 (CSV / JSON Lines)")
+    arg_parser.add_argument("path", help="가져올 파일 경로")
+    arg_parser.add_argument("--format", choices=["csv", "jsonl"], help="파일 형식 (기본값: 확장자로 판단)")
+    args = arg_parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+    result = import_file(args.path, fmt)
+    print(f"✅ 저장 {result['inserted']}건, ❌ 거부 {result['rejected']}건")
+    for reject in result["rejects"]:
+        print(f"  {reject['line']}번째 줄: {reject['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+열(column) 단위 응답 형식과 압축 (콘텐츠 협상)
+
+/market/prices, /holdings, /market/trending은 기본적으로 지금처럼 JSON을 돌려주고,
+클라이언트가 Accept 헤더로 요청하면 같은 내용을 열 단위로 묶어 보냅니다.
+숫자 열은 float64 배열 그대로 담기므로 받는 쪽에서 행마다 파이썬 객체를 만들지 않고 DataFrame으로 바로 올릴 수 있습니다.
+
+- application/vnd.apache.arrow.stream: Arrow IPC 스트림 (pyarrow 필요)
+- application/x-msgpack: {"columns": [...], "dtypes": {...}, "data": {열: 값}}
+  숫자 열(f8)은 리틀엔디언 float64 바이트, 문자열 열은 리스트 (msgpack 필요)
+
+Accept-Encoding에 zstd(zstandard 필요) 또는 gzip이 있으면 본문을 압축합니다.
+설치되지 않은 라이브러리의 형식은 협상 대상에서 빠지므로, 그때는 JSON으로 응답합니다.
+"""
+import gzip
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+MSGPACK = "application/x-msgpack"
+
+COMPRESS_MIN_BYTES = 1024   # 이보다 작은 본문은 압축하지 않음
+VARY = "Accept, Accept-Encoding"
+
+
+def supported_formats():
+    formats = [JSON]
+    if pa is not None:
+        formats.append(ARROW)
+    if msgpack is not None:
+        formats.append(MSGPACK)
+    return formats
+
+
+def _parse_header(value):
+    """'a;q=0.5, b' -> [(a, 0.5, 0), (b, 1.0, 1)] (q가 0인 항목은 제외)"""
+    items = []
+    for position, part in enumerate((value or "").split(",")):
+        name, *params = [p.strip() for p in part.split(";")]
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            items.append((name.lower(), q, position))
+    return items
+
+
+def negotiate(accept):
+    """Accept 헤더에서 지원하는 형식 중 q가 가장 높은 것 (같으면 먼저 적힌 것). 없으면 JSON"""
+    supported = supported_formats()
+    candidates = [(q, -position, name) for name, q, position in _parse_header(accept) if name in supported]
+    return max(candidates)[2] if candidates else JSON
+
+
+def _choose_encoding(accept_encoding):
+    accepted = {name for name, _, _ in _parse_header(accept_encoding)}
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _columns(rows, columns):
+    """행 dict 목록 -> {열 이름: numpy 배열(f8) 또는 리스트(str)}"""
+    data = {}
+    for name, dtype in columns:
+        values = [row.get(name) for row in rows]
+        if dtype == "f8":
+            data[name] = np.array([np.nan if v is None else float(v) for v in values], dtype="<f8")
+        else:
+            data[name] = [None if v is None else str(v) for v in values]
+    return data
+
+
+def _encode_arrow(data, columns):
+    table = pa.table({name: pa.array(data[name], type=pa.float64() if dtype == "f8" else pa.string())
+                      for name, dtype in columns})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _encode_msgpack(data, columns):
+    return msgpack.packb({
+        "columns": [name for name, _ in columns],
+        "dtypes": dict(columns),
+        "data": {name: data[name].tobytes() if dtype == "f8" else data[name] for name, dtype in columns},
+    })
+
+
+def columnar_response(request, json_body, rows, columns):
+    """
+    Accept 헤더에 맞춰 응답을 만듭니다.
+    json_body: JSON일 때 그대로 보낼 값 (기존 응답 형태)
+    rows, columns: 열 단위 형식일 때 쓸 행 dict 목록과 [(열 이름, 'f8' 또는 'str')]
+    """
+    media_type = negotiate(request.headers.get("accept"))
+    if media_type == JSON:
+        return JSONResponse(jsonable_encoder(json_body), headers={"Vary": VARY})
+
+    data = _columns(rows, columns)
+    body = _encode_arrow(data, columns) if media_type == ARROW else _encode_msgpack(data, columns)
+    headers = {"Vary": VARY}
+    encoding = _choose_encoding(request.headers.get("accept-encoding")) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding == "zstd":
+        body = zstandard.ZstdCompressor().compress(body)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=5)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=media_type, headers=headers)
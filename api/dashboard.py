@@ -0,0 +1,108 @@
+"""
+잔고 대시보드 (/portfolio/dashboard)
+
+웹 대시보드가 화면 하나를 그리려고 /holdings, /market/list, /market/exchange-rate, /market/prices를
+차례로 부르던 것을 서버에서 한 번에 모아 돌려줍니다. 잔고는 거래 버전으로 캐시한 것(api.holdings_cache)을 쓰고,
+시세는 quote_cache를 거치며, 종목명은 종목 마스터 → 야후 이름 → 코드 순으로 정합니다.
+"""
+import asyncio
+
+from api.holdings_cache import holdings_cache
+from api.fx import fx_service, DEFAULT_USD_KRW
+from api.market_data import get_quotes
+from api.symbol_master import symbol_master
+
+REPORT_CURRENCY = "KRW"   # 통화별 합계를 환산해 보여주는 기준 통화
+
+
+async def _rate_to_report(currency):
+    """1 currency = ? KRW 환율 정보. 구할 수 없으면 rate가 None"""
+    result = await fx_service.get_rate(currency, REPORT_CURRENCY)
+    if result is not None:
+        return {"rate": result["rate"], "status": result["status"], "source": result["source"]}
+    if currency == "USD":
+        return {"rate": DEFAULT_USD_KRW, "status": "fallback", "source": "default"}
+    return {"rate": None, "status": "unavailable", "source": None}
+
+
+def _display_name(code, quote):
+    # 종목 마스터(한글명 우선)에 있으면 그 이름, 없으면 야후 이름이 코드와 다를 때만 사용
+    entry = symbol_master.get(code)
+    if entry:
+        return entry["name"]
+    name = quote.get("name") if quote else None
+    return name if name and name != code else code
+
+
+def _summary(buy, value):
+    pnl = value - buy
+    return {
+        "buy_amount": round(buy, 4),
+        "market_value": round(value, 4),
+        "pnl": round(pnl, 4),
+        "pnl_pct": round(pnl / buy * 100, 4) if buy else 0.0,
+    }
+
+
+async def build_dashboard():
+    holdings = await holdings_cache.holdings()
+    codes = [h["stock_code"] for h in holdings]
+    # 보유 통화 + USD(매수 화면의 원화 환산가용)의 환율을 시세와 동시에 구합니다.
+    currencies = sorted(({h["currency"] for h in holdings} | {"USD"}) - {REPORT_CURRENCY})
+
+    quotes, rates = await asyncio.gather(
+        get_quotes(codes),
+        asyncio.gather(*(_rate_to_report(c) for c in currencies)),
+    )
+    fx = dict(zip(currencies, rates))
+    fx[REPORT_CURRENCY] = {"rate": 1.0, "status": "success", "source": "identity"}
+
+    rows = []
+    totals = {}
+    for h in holdings:
+        code, currency = h["stock_code"], h["currency"]
+        quote, age = quotes.get(code, (None, None))
+        price = quote["price"] if quote else 0.0
+        prev = quote["prev_close"] if quote else 0.0
+        qty = float(h["total_quantity"])
+        avg_cost = float(h["avg_buy_price"])
+        buy, value = avg_cost * qty, price * qty
+        rows.append({
+            "code": code,
+            "name": _display_name(code, quote),
+            "currency": currency,
+            "quantity": qty,
+            "avg_cost": avg_cost,
+            "price": price,
+            "prev_close": prev,
+            "day_change_pct": round((price - prev) / prev * 100, 4) if prev else 0.0,
+            "age": round(age, 1) if age is not None else None,
+            **_summary(buy, value),
+        })
+        t = totals.setdefault(currency, [0.0, 0.0])
+        t[0] += buy
+        t[1] += value
+
+    summary = {}
+    report_buy = report_value = 0.0
+    report_complete = True
+    for currency, (buy, value) in totals.items():
+        rate = fx[currency]["rate"]
+        entry = _summary(buy, value)
+        if rate is None:
+            entry["report"] = None
+            report_complete = False
+        else:
+            entry["report"] = _summary(buy * rate, value * rate)
+            report_buy += buy * rate
+            report_value += value * rate
+        summary[currency] = entry
+
+    return {
+        "holdings": rows,
+        "totals": summary,
+        "report_currency": REPORT_CURRENCY,
+        # 환율을 구하지 못한 통화가 있으면 전체 합계에서 빠지므로 complete=False로 알려줍니다.
+        "total": {**_summary(report_buy, report_value), "complete": report_complete},
+        "fx": fx,
+    }
@@ -0,0 +1,106 @@
+"""
+블로킹 작업을 이벤트 루프 밖에서 실행하기 위한 실행기
+
+- 시세(야후, Frankfurter) 작업은 market 스레드 풀에서, DB 작업은 common.database의 DB 스레드 풀에서 돌립니다.
+  그래서 야후가 느려져 market 스레드가 모두 묶여도 /trades, /holdings는 영향을 받지 않습니다.
+- 업스트림마다 동시 요청 수 제한과 타임아웃을 따로 둡니다.
+  (요청 한도, 서킷 브레이커, 재시도는 실제 호출을 감싸는 api.upstream 클라이언트가 맡음)
+"""
+import os
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from common.metrics import UPSTREAM_REQUEST_SECONDS, add_timing
+from api.upstream import upstream_clients, UpstreamUnavailable
+
+MARKET_WORKERS = int(os.getenv("MARKET_WORKERS", "16"))  # 시세 작업용 스레드 수
+
+# 업스트림별 설정: (동시 요청 수, 타임아웃 초)
+UPSTREAM_LIMITS = {
+    "yahoo": (int(os.getenv("YAHOO_CONCURRENCY", "8")), float(os.getenv("YAHOO_TIMEOUT", "15"))),
+    "frankfurter": (int(os.getenv("FRANKFURTER_CONCURRENCY", "4")), float(os.getenv("FRANKFURTER_TIMEOUT", "5"))),
+}
+
+_market_executor = ThreadPoolExecutor(max_workers=MARKET_WORKERS, thread_name_prefix="market")
+
+
+class UpstreamTimeout(Exception):
+    """업스트림 작업이 정해진 시간 안에 끝나지 않았을 때 발생합니다."""
+
+
+class _Upstream:
+    def __init__(self, name, concurrency, timeout):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    def stats(self):
+        return {
+            "concurrency": self.concurrency,
+            "timeout": self.timeout,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+_upstreams = {name: _Upstream(name, c, t) for name, (c, t) in UPSTREAM_LIMITS.items()}
+
+
+async def run_upstream(upstream, func, *args, timeout=None, **kwargs):
+    """
+    블로킹 업스트림 호출 func(*args)를 market 스레드 풀에서 실행합니다.
+    동시 실행 수는 업스트림별로 제한되며, timeout(기본값: 업스트림 설정)이 지나면 UpstreamTimeout을 냅니다.
+    """
+    u = _upstreams[upstream]
+    loop = asyncio.get_running_loop()
+    await u.semaphore.acquire()
+    u.in_flight += 1
+    u.calls += 1
+    started = time.perf_counter()
+    ctx = contextvars.copy_context()
+    future = loop.run_in_executor(_market_executor, ctx.run, partial(func, *args, **kwargs))
+
+    def _release(f):
+        # 타임아웃으로 기다리기를 포기해도 스레드는 끝까지 돌기 때문에, 실제로 끝났을 때 자리를 반납합니다.
+        u.in_flight -= 1
+        u.semaphore.release()
+        if not f.cancelled() and f.exception() is not None:
+            u.errors += 1
+
+    future.add_done_callback(_release)
+    # 호출한 쪽에서 본 시간과 결과를 기록합니다. (/metrics, Server-Timing의 업스트림 구간)
+    outcome = "ok"
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), timeout or u.timeout)
+    except asyncio.TimeoutError:
+        u.timeouts += 1
+        outcome = "timeout"
+        raise UpstreamTimeout(f"{upstream} 응답 시간 초과 ({timeout or u.timeout}초)")
+    except UpstreamUnavailable:
+        # 서킷이 열려 있거나 요청 한도에 걸려 업스트림을 부르지 않은 경우
+        outcome = "unavailable"
+        raise
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        UPSTREAM_REQUEST_SECONDS.observe(elapsed, provider=upstream, outcome=outcome)
+        add_timing(upstream, elapsed)
+
+
+def get_executor_stats():
+    return {
+        "market_workers": MARKET_WORKERS,
+        "upstreams": {name: {**u.stats(), "client": upstream_clients[name].stats()} for name, u in _upstreams.items()},
+    }
@@ -0,0 +1,194 @@
+"""
+환율 서비스
+
+n8n이 채워 두는 exchange_rates 테이블(통화별 1단위당 원화 가격)을 메모리 스냅샷으로 들고 있다가
+스케줄러(api/scheduler.py)가 FX_REFRESH_SECONDS마다 다시 읽습니다. 원화를 거치는 교차 환율로 어떤 통화쌍이든 계산하며,
+스냅샷에 없는 통화이거나 스냅샷이 너무 오래됐을 때만 야후/Frankfurter에 동시에 물어보고 먼저 온 답을 씁니다.
+"""
+import os
+import time
+import asyncio
+from datetime import date, datetime
+import yfinance as yf
+
+from common.database import get_latest_exchange_rates
+from api.executors import run_upstream
+from api.upstream import yahoo, frankfurter
+from api.quote_store import quote_store, run_store, SHARED_FX_PREFIX
+
+FX_REFRESH_SECONDS = float(os.getenv("FX_REFRESH_SECONDS", "300"))  # DB 스냅샷을 다시 읽는 주기(초)
+FX_MAX_AGE_DAYS = int(os.getenv("FX_MAX_AGE_DAYS", "4"))            # 이보다 오래된 고시 환율은 실시간 소스로 보완(일)
+FX_LIVE_TTL = float(os.getenv("FX_LIVE_TTL", "60"))                 # 실시간 소스에서 받은 환율 재사용 시간(초)
+
+BASE_CURRENCY = "KRW"   # exchange_rates.rate의 기준 통화
+DEFAULT_USD_KRW = 1400.0  # 모든 소스가 실패했을 때 쓰는 USD/KRW 기본값
+
+
+def _fetch_yahoo_rate(base, quote):
+    data = yahoo.call(yf.Ticker(f"{base}{quote}=X", session=yahoo.session).history, period="1d")
+    if data.empty:
+        return None
+    return float(data['Close'].iloc[-1])
+
+
+def _frankfurter_get(url):
+    res = frankfurter.session.get(url, timeout=3)
+    if res.status_code == 429 or res.status_code >= 500:
+        # 요청 한도 초과와 서버 오류는 일시적 오류로 올려 재시도와 서킷 브레이커에 반영합니다.
+        res.raise_for_status()
+    return res
+
+
+def _fetch_frankfurter_rate(base, quote):
+    # 무료이며 인증키가 필요 없는 오픈 API입니다.
+    res = frankfurter.call(_frankfurter_get, f"https://api.frankfurter.app/latest?from={base}&to={quote}")
+    if res.status_code != 200:
+        return None
+    return float(res.json()['rates'][quote])
+
+
+class FxService:
+    def __init__(self):
+        # 스냅샷은 통째로 바꿔 끼우므로 읽는 쪽은 락 없이 봐도 됩니다.
+        self._snapshot = {"rates": {}, "loaded_at": None}
+        self._live = {}   # (base, quote) -> (rate, source, fetched_at)
+
+    def load(self):
+        """exchange_rates 테이블에서 통화별 최신 환율을 읽어 스냅샷을 교체합니다."""
+        rows = get_latest_exchange_rates()
+        if not rows:
+            return False
+        rates = {BASE_CURRENCY: {"rate": 1.0, "country_name": "대한민국", "rate_date": None}}
+        for r in rows:
+            rates[r['currency_code']] = {
+                "rate": float(r['rate']),
+                "country_name": r['country_name'],
+                "rate_date": r['rate_date'],
+            }
+        self._snapshot = {"rates": rates, "loaded_at": datetime.now()}
+        return True
+
+    def _is_fresh(self, entry):
+        rate_date = entry["rate_date"]
+        if rate_date is None:
+            return True
+        if isinstance(rate_date, datetime):
+            rate_date = rate_date.date()
+        return (date.today() - rate_date).days <= FX_MAX_AGE_DAYS
+
+    def snapshot_rate(self, base, quote):
+        """스냅샷의 교차 환율 (1 base = ? quote). 없으면 None, 오래됐으면 fresh=False"""
+        rates = self._snapshot["rates"]
+        if base not in rates or quote not in rates:
+            return None
+        b, q = rates[base], rates[quote]
+        as_of = max((e["rate_date"] for e in (b, q) if e["rate_date"] is not None), default=None)
+        return {
+            "rate": b["rate"] / q["rate"],
+            "fresh": self._is_fresh(b) and self._is_fresh(q),
+            "as_of": as_of,
+        }
+
+    def _read_shared(self, base, quote):
+        """다른 워커가 공유 저장소(QUOTE_STORE)에 넣어 둔 실시간 환율 (rate, source, fetched_at). 없으면 None"""
+        if quote_store is None:
+            return None
+        try:
+            entry = quote_store.get_many([f"{SHARED_FX_PREFIX}{base}{quote}"])
+        except Exception as e:
+            print(f"공유 환율 읽기 실패: {e}")
+            return None
+        if not entry:
+            return None
+        value, fetched_at = next(iter(entry.values()))
+        return value["price"], value["name"], fetched_at
+
+    def _write_shared(self, base, quote, rate, source):
+        if quote_store is None:
+            return
+        try:
+            quote_store.put_many({f"{SHARED_FX_PREFIX}{base}{quote}": {"price": rate, "prev_close": rate, "name": source}},
+                                 time.time())
+        except Exception as e:
+            print(f"공유 환율 쓰기 실패: {e}")
+
+    async def fetch_live(self, base, quote):
+        """야후와 Frankfurter에 동시에 요청하고 먼저 성공한 값을 씁니다. (둘 다 실패하면 None)"""
+        cached = self._live.get((base, quote)) or await run_store(quote_store, self._read_shared, base, quote)
+        if cached and time.time() - cached[2] < FX_LIVE_TTL:
+            return cached[0], cached[1]
+
+        tasks = {
+            asyncio.ensure_future(run_upstream("yahoo", _fetch_yahoo_rate, base, quote)): "yfinance",
+            asyncio.ensure_future(run_upstream("frankfurter", _fetch_frankfurter_rate, base, quote)): "backup_api",
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        print(f"{tasks[task]} 환율 조회 실패: {task.exception()}")
+                        continue
+                    rate = task.result()
+                    if rate is not None:
+                        self._live[(base, quote)] = (rate, tasks[task], time.time())
+                        await run_store(quote_store, self._write_shared, base, quote, rate, tasks[task])
+                        return rate, tasks[task]
+        finally:
+            for task in pending:
+                task.cancel()
+        return None
+
+    async def get_rate(self, base, quote):
+        """
+        1 base = ? quote 환율을 {"rate", "status", "source", "as_of"} 형태로 돌려줍니다.
+        구할 수 없으면 None
+        """
+        base, quote = base.upper(), quote.upper()
+        if base == quote:
+            return {"rate": 1.0, "status": "success", "source": "identity", "as_of": None}
+
+        snap = self.snapshot_rate(base, quote)
+        if snap is not None and snap["fresh"]:
+            return {"rate": round(snap["rate"], 4), "status": "success", "source": "db", "as_of": snap["as_of"]}
+
+        live = await self.fetch_live(base, quote)
+        if live is not None:
+            rate, source = live
+            return {"rate": round(rate, 4), "status": "success", "source": source, "as_of": None}
+
+        last = self._live.get((base, quote))
+        if last is not None:
+            # 실시간 소스가 모두 실패하면(서킷이 열려 있을 때 포함) 마지막으로 받아 둔 실시간 환율을 씁니다.
+            return {"rate": round(last[0], 4), "status": "stale", "source": last[1], "as_of": None}
+
+        if snap is not None:
+            # 실시간 소스가 모두 실패하면 오래된 고시 환율이라도 돌려줍니다.
+            return {"rate": round(snap["rate"], 4), "status": "stale", "source": "db", "as_of": snap["as_of"]}
+        return None
+
+    def all_rates(self, base=BASE_CURRENCY):
+        """스냅샷의 모든 통화를 1 통화 = ? base 형태로 돌려줍니다."""
+        base = base.upper()
+        snapshot = self._snapshot
+        rates = snapshot["rates"]
+        if base not in rates:
+            return None
+        base_rate = rates[base]["rate"]
+        return {
+            "base": base,
+            "loaded_at": snapshot["loaded_at"],
+            "rates": {
+                code: {
+                    "rate": round(e["rate"] / base_rate, 6),
+                    "country_name": e["country_name"],
+                    "rate_date": e["rate_date"],
+                }
+                for code, e in rates.items() if code != base
+            },
+        }
+
+
+# API 서버 전체가 함께 쓰는 환율 서비스
+fx_service = FxService()
@@ -0,0 +1,94 @@
+"""
+로컬 시세 이력(OHLCV) 저장소
+
+/market/history 요청은 항상 로컬 DB(price_history)에서 응답합니다.
+종목별로 어디까지 받아 두었는지(price_history_sync)를 기록해 두고, 빠진 앞/뒤 구간만 야후에서 추가로 받습니다.
+마지막 확인 후 HISTORY_SYNC_TTL이 지나지 않았다면 최신 구간도 다시 묻지 않으므로,
+같은 요청을 반복하면 업스트림 호출이 전혀 없습니다.
+"""
+import os
+from datetime import date, datetime, timedelta
+import pandas as pd
+import yfinance as yf
+
+from common.database import get_history_sync, save_price_bars, get_price_history, run_db
+from api.executors import run_upstream
+from api.upstream import yahoo
+
+HISTORY_SYNC_TTL = float(os.getenv("HISTORY_SYNC_TTL", "3600"))  # 최신 봉을 다시 확인하는 최소 간격(초)
+HISTORY_DEFAULT_DAYS = 365                                        # start가 없을 때 조회 기간(일)
+INTERVALS = ("1d", "1wk", "1mo")
+
+
+def _to_float(value):
+    return None if pd.isna(value) else float(value)
+
+
+def _download_bars(symbol, start, end, interval):
+    """야후에서 [start, end] 구간의 봉을 받아 (bar_date, open, high, low, close, adj_close, volume) 목록으로 돌려줍니다."""
+    # yfinance의 end는 해당 날짜를 포함하지 않으므로 하루를 더합니다.
+    data = yahoo.call(yf.Ticker(symbol, session=yahoo.session).history,
+                      start=start, end=end + timedelta(days=1), interval=interval, auto_adjust=False)
+    bars = []
+    if data is None or data.empty:
+        return bars
+    data = data.dropna(subset=["Close"])
+    for ts, row in data.iterrows():
+        bars.append((
+            ts.date(),
+            _to_float(row.get("Open")),
+            _to_float(row.get("High")),
+            _to_float(row.get("Low")),
+            float(row["Close"]),
+            _to_float(row.get("Adj Close")),
+            int(row["Volume"]) if not pd.isna(row.get("Volume")) else None,
+        ))
+    return bars
+
+
+def missing_ranges(sync, start, end, today=None, now=None):
+    """로컬에 없는 구간 [(start, end), ...]을 계산합니다."""
+    today = today or date.today()
+    end = min(end, today)
+    if sync is None:
+        return [(start, end)] if start <= end else []
+
+    ranges = []
+    if start < sync["synced_from"]:
+        ranges.append((start, sync["synced_from"] - timedelta(days=1)))
+
+    # 마지막 봉은 장중에 받은 미확정 값일 수 있어 그 날짜부터 다시 받습니다.
+    tail_start = sync["last_bar"] or sync["synced_to"]
+    if end > sync["synced_to"]:
+        ranges.append((tail_start, end))
+    elif sync["synced_to"] >= today - timedelta(days=1) and end >= tail_start:
+        # 최근까지 받아 둔 종목은 HISTORY_SYNC_TTL마다 한 번만 최신 봉을 다시 확인합니다.
+        age = ((now or datetime.now()) - sync["synced_at"]).total_seconds()
+        if age >= HISTORY_SYNC_TTL:
+            ranges.append((tail_start, end))
+    return [(s, e) for s, e in ranges if s <= e]
+
+
+async def sync_ranges(symbol, ranges, interval="1d"):
+    """missing_ranges로 구한 구간들을 야후에서 받아 저장합니다."""
+    for range_start, range_end in ranges:
+        bars = await run_upstream("yahoo", _download_bars, symbol, range_start, range_end, interval)
+        await run_db(save_price_bars, symbol, interval, bars, range_start, range_end)
+    return len(ranges)
+
+
+async def ensure_history(symbol, start, end, interval="1d"):
+    """[start, end] 구간이 로컬에 있도록 빠진 부분만 동기화합니다. 업스트림 호출 횟수를 돌려줍니다."""
+    sync = await run_db(get_history_sync, symbol, interval)
+    return await sync_ranges(symbol, missing_ranges(sync, start, end), interval)
+
+
+async def get_history(symbol, start=None, end=None, interval="1d"):
+    end = end or date.today()
+    start = start or end - timedelta(days=HISTORY_DEFAULT_DAYS)
+    try:
+        await ensure_history(symbol, start, end, interval)
+    except Exception as e:
+        # 동기화에 실패해도 이미 저장된 구간은 그대로 돌려줍니다.
+        print(f"{symbol} 시세 이력 동기화 실패: {e}")
+    return await run_db(get_price_history, symbol, interval, start, end)
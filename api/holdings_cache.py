@@ -0,0 +1,131 @@
+"""
+현재 잔고(GET /holdings) 응답 캐시와 ETag
+
+trades 테이블이 바뀔 때마다 DB 트리거가 trades_version을 1씩 올립니다. (006 마이그레이션)
+잔고와 직렬화한 응답 본문을 이 버전에 묶어 두고, ETag도 버전(+ 응답 형식)으로 만듭니다.
+
+- 클라이언트가 If-None-Match로 같은 ETag를 보내면 잔고를 읽지 않고 304 Not Modified (본문 없음)
+- 버전이 그대로면 잔고 조회와 직렬화 없이 저장해 둔 본문을 그대로 보냄
+- 버전 확인(한 행 조회)도 HOLDINGS_VERSION_CHECK_SECONDS 동안은 생략합니다.
+  이 프로세스에서 거래를 저장하면 invalidate()로 바로 다시 확인하므로 자기 거래는 곧바로 반영되고,
+  다른 워커나 외부 도구가 저장한 거래는 길어야 이 시간 뒤에 반영됩니다.
+"""
+import os
+import time
+import asyncio
+
+from fastapi.responses import Response
+
+from common.database import get_trades_version, get_stock_holdings_versioned, run_db
+from api.columnar import columnar_response, negotiate, JSON, ARROW, MSGPACK, VARY
+
+HOLDINGS_VERSION_CHECK_SECONDS = float(os.getenv("HOLDINGS_VERSION_CHECK_SECONDS", "5"))  # 거래 버전을 다시 확인하는 간격(초)
+HOLDINGS_CACHE_BODIES = 16  # 버전 하나에 보관하는 응답 본문 수 (형식 x Accept-Encoding 조합)
+
+HOLDING_COLUMNS = [("stock_code", "str"), ("total_quantity", "f8"), ("avg_buy_price", "f8"), ("currency", "str")]
+FORMAT_TAGS = {JSON: "json", ARROW: "arrow", MSGPACK: "msgpack"}
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match 헤더에 etag가 있으면 True (약한 비교: W/ 접두사는 무시)"""
+    if not if_none_match:
+        return False
+    target = etag.removeprefix("W/")
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == target:
+            return True
+    return False
+
+
+def not_modified(etag):
+    # 304에도 ETag와 Vary를 그대로 붙여야 중간 캐시와 클라이언트가 저장해 둔 응답을 계속 씁니다.
+    return Response(status_code=304, headers={"ETag": etag, "Vary": VARY, "Cache-Control": "no-cache"})
+
+
+class HoldingsCache:
+    def __init__(self, check_seconds=HOLDINGS_VERSION_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._version = None      # 마지막으로 확인한 거래 버전
+        self._checked_at = 0.0
+        self._rows = None         # _rows_version 기준 잔고 목록
+        self._rows_version = None
+        self._bodies = {}         # (media_type, Accept-Encoding) -> (본문, Content-Encoding)
+        self._lock = asyncio.Lock()
+
+        self.hits = 0             # 저장해 둔 본문을 그대로 보낸 횟수
+        self.misses = 0           # 잔고를 다시 읽은 횟수
+        self.not_modified = 0     # 304로 응답한 횟수
+
+    def invalidate(self):
+        """이 프로세스에서 거래를 저장한 뒤 호출합니다. 다음 요청에서 거래 버전을 바로 다시 확인합니다."""
+        self._checked_at = 0.0
+
+    async def version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._checked_at >= self.check_seconds:
+            self._version = await run_db(get_trades_version)
+            self._checked_at = now
+        return self._version
+
+    async def _load(self):
+        """버전이 바뀌었으면 잔고를 다시 읽습니다. (호출하는 쪽에서 _lock을 잡고 있어야 함)"""
+        version = await self.version()
+        if self._rows_version != version:
+            self.misses += 1
+            version, rows = await run_db(get_stock_holdings_versioned)
+            self._rows, self._rows_version, self._bodies = rows, version, {}
+            if version > self._version:
+                self._version = version
+        return self._rows_version, self._rows
+
+    async def holdings(self):
+        """현재 잔고 목록 (get_stock_holdings와 같은 형태)"""
+        async with self._lock:
+            return (await self._load())[1]
+
+    async def response(self, request):
+        """If-None-Match가 맞으면 304, 아니면 Accept에 맞춘 잔고 응답 (ETag 포함)"""
+        media_type = negotiate(request.headers.get("accept"))
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, self._etag(await self.version(), media_type)):
+            self.not_modified += 1
+            return not_modified(self._etag(self._version, media_type))
+
+        async with self._lock:
+            version, rows = await self._load()
+            key = (media_type, request.headers.get("accept-encoding"))
+            entry = self._bodies.get(key)
+            if entry is None:
+                built = columnar_response(request, rows, rows, HOLDING_COLUMNS)
+                entry = (built.body, built.headers.get("content-encoding"))
+                if len(self._bodies) < HOLDINGS_CACHE_BODIES:
+                    self._bodies[key] = entry
+            else:
+                self.hits += 1
+
+        etag = self._etag(version, media_type)
+        if etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return not_modified(etag)
+        body, encoding = entry
+        headers = {"ETag": etag, "Vary": VARY, "Cache-Control": "no-cache"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=media_type, headers=headers)
+
+    @staticmethod
+    def _etag(version, media_type):
+        # 같은 버전이라도 형식마다 본문이 다르므로 형식을 넣고, 압축 여부와 상관없이 같은 내용이라 약한 ETag를 씁니다.
+        return f'W/"holdings-{version}-{FORMAT_TAGS[media_type]}"'
+
+    def stats(self):
+        return {
+            "version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+holdings_cache = HoldingsCache()
@@ -1,201 +1,649 @@
 import yfinance as yf
-from fastapi import FastAPI, HTTPException, Query
-from pydantic import BaseModel
-import sys, os, requests
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import sys, os, time, json, asyncio, hashlib
+from datetime import date
+from functools import partial
 
 # 부모 폴더의 common 폴더를 참조하기 위한 설정
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from common.database import get_stock_holdings, add_trade
+from common.database import (get_holdings_as_of_async, add_trade_async, get_pool_stats,
+                             close_pool, run_db, create_position_snapshots, list_trades, get_trade_by_idempotency_key,
+                             rebuild_positions_if_needed, PositionsNotReady)
+from api.quote_cache import quote_cache
+from api.executors import run_upstream, UpstreamTimeout, get_executor_stats
+from api.upstream import yahoo, UpstreamUnavailable
+from api.fx import fx_service, FX_REFRESH_SECONDS, DEFAULT_USD_KRW
+from api.schemas import TradeCreate
+from api.bulk_import import import_stream, detect_format, BulkImportError
+from api.symbol_meta import symbol_meta
+from api.symbol_master import symbol_master, normalize as normalize_query
+from api.market_data import fetch_single_quote, get_quotes, refresh_shared_quotes, QUOTE_STORE_REFRESH_SECONDS
+from api.quote_store import quote_store
+from api.quote_stream import quote_hub
+from api.scheduler import scheduler
+from api.trending import trending_board, TRENDING_REFRESH_SECONDS, TRENDING_QUOTE_SECONDS
+from api.history import get_history, HISTORY_SYNC_TTL
+from api.analytics import portfolio_analytics, sync_portfolio_history
+from api.dashboard import build_dashboard
+from api.columnar import columnar_response
+from api.holdings_cache import holdings_cache, HOLDING_COLUMNS, etag_matches, not_modified
+from api.trade_queue import trade_queue, TRADE_INGEST, TRADE_QUEUE_COMMIT_SECONDS
+from api.trade_history import encode_cursor, decode_cursor, InvalidCursor, stream_export, EXPORT_MEDIA_TYPES
+from common.lots import LOT_METHODS, process_lots, get_realized_pnl, get_open_lots
+from common.metrics import (registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, HTTP_REQUEST_SECONDS, FX_RATE_LOOKUPS,
+                            start_request_timings)
 
-app = FastAPI(title="Stock Asset Manager API")
 
-# 매수 요청을 받을 때 사용할 데이터 규격
-class TradeCreate(BaseModel):
-    stock_code: str
-    quantity: float
-    price: float
-    currency: str
+SNAPSHOT_CHECK_SECONDS = 3600  # 잔고 스냅샷이 밀렸는지 확인하는 주기(초)
+POSITIONS_CHECK_SECONDS = 60   # positions를 다시 계산해야 하는지(008 마이그레이션 직후 등) 확인하는 주기(초)
+LOT_PROCESS_SECONDS = 60       # 로트 대기열을 처리하는 주기(초), 이 프로세스에서 거래를 저장하면 바로 처리
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")  # 응답에 Server-Timing 헤더를 붙일지
+
+
+async def make_position_snapshots():
+    """SNAPSHOT_INTERVAL_DAYS마다 잔고 스냅샷을 만듭니다. (서버가 꺼져 있던 동안 밀린 것도 채움)"""
+    created = await run_db(create_position_snapshots)
+    if created:
+        print(f"잔고 스냅샷 생성: {created[0]} ~ {created[-1]} ({len(created)}개)")
+
+
+async def rebuild_stale_positions():
+    """마이그레이션이 positions 재계산을 요청해 두었으면 다시 계산합니다. (그 전까지 /holdings는 503)"""
+    count = await run_db(rebuild_positions_if_needed)
+    if count is not None:
+        holdings_cache.invalidate()
+        print(f"positions 재계산 완료: {count}개 종목")
+
+
+async def process_pending_lots():
+    """로트 대기열(lot_pending)에 쌓인 거래를 방식별로 로트/실현손익에 반영합니다."""
+    for method in LOT_METHODS:
+        await run_db(process_lots, method)
+
+
+async def load_fx_snapshot():
+    await run_db(fx_service.load)
+
+
+# 주기 작업: positions 재계산 확인, 로트 처리, 환율 스냅샷, 잔고 스냅샷, 트렌딩 종목 목록과 시세, 분석용 시세 이력
+scheduler.add("positions-rebuild", POSITIONS_CHECK_SECONDS, rebuild_stale_positions)
+scheduler.add("lots", LOT_PROCESS_SECONDS, process_pending_lots)
+scheduler.add("fx-snapshot", FX_REFRESH_SECONDS, load_fx_snapshot)
+scheduler.add("position-snapshots", SNAPSHOT_CHECK_SECONDS, make_position_snapshots)
+scheduler.add("trending-universe", TRENDING_REFRESH_SECONDS, trending_board.rebuild_universe)
+scheduler.add("trending-quotes", TRENDING_QUOTE_SECONDS, trending_board.refresh_quotes,
+              initial_delay=TRENDING_QUOTE_SECONDS)
+scheduler.add("portfolio-history", HISTORY_SYNC_TTL, sync_portfolio_history)
+if quote_store is not None:
+    # 여러 워커가 시세를 공유할 때만: 리더 워커가 자주 조회되는 종목의 시세를 미리 갱신
+    scheduler.add("shared-quotes", QUOTE_STORE_REFRESH_SECONDS, refresh_shared_quotes)
+
+
+async def commit_queued_trades():
+    if await trade_queue.commit_pending():
+        holdings_cache.invalidate()
+        scheduler.trigger("lots")
+
+
+if TRADE_INGEST == "queue":
+    # 거래 대기열 모드일 때만: 접수된 거래를 묶음으로 DB에 저장 (새 거래가 들어오면 바로 깨움)
+    scheduler.add("trade-queue", TRADE_QUEUE_COMMIT_SECONDS, commit_queued_trades)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 백그라운드 작업: 스케줄러의 주기 작업, 웹소켓 시세 폴러
+    if TRADE_INGEST == "queue":
+        trade_queue.open()
+    scheduler.start()
+    hub_task = asyncio.create_task(quote_hub.run())
+    yield
+    hub_task.cancel()
+    await scheduler.stop()
+    if TRADE_INGEST == "queue":
+        # 종료 전에 대기열에 남은 거래를 한 번 더 저장해 봅니다. (실패해도 다음 시작 때 이어서 저장)
+        try:
+            await trade_queue.commit_pending()
+        except Exception as e:
+            print(f"거래 대기열 저장 실패 (다음 시작 때 다시 시도): {e}")
+        trade_queue.close()
+    # 서버 종료 시 풀에 남은 DB 커넥션 정리
+    close_pool()
+
+
+app = FastAPI(title="Stock Asset Manager API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """라우트별 응답 시간을 쌓고, SERVER_TIMING이 켜져 있으면 DB/업스트림 구간 시간을 헤더로 붙입니다."""
+    timings = start_request_timings()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if SERVER_TIMING:
+            response.headers["Server-Timing"] = timings.header()
+        return response
+    finally:
+        # 경로 변수가 들어간 실제 주소 대신 라우트 템플릿(/market/price/{symbol})으로 묶습니다.
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - timings.started, method=request.method,
+                                     route=getattr(route, "path", "unmatched"), status=status)
+
+
+def _collect_runtime_metrics():
+    """다른 모듈이 세고 있는 통계(시세 캐시, DB 풀, 업스트림 동시 실행 수, 잔고 응답 캐시, 거래 대기열)를 /metrics 형식으로 옮깁니다."""
+    cache = quote_cache.stats()
+    pool = get_pool_stats()
+    upstreams = get_executor_stats()["upstreams"]
+    holdings = holdings_cache.stats()
+    trades = trade_queue.stats()
+    return [
+        ("quote_cache_lookups_total", "counter", "시세 캐시 조회 결과 (hit/miss/stale)",
+         [({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"]), ({"result": "stale"}, cache["stale"])]),
+        ("quote_cache_hit_ratio", "gauge", "시세 캐시 적중률", [({}, cache["hit_ratio"])]),
+        ("quote_cache_entries", "gauge", "시세 캐시에 들어 있는 종목 수", [({}, cache["size"])]),
+        ("quote_cache_coalesced_total", "counter", "다른 요청의 업스트림 호출 결과를 함께 받은 횟수", [({}, cache["coalesced"])]),
+        ("quote_cache_stale_served_total", "counter", "업스트림 실패로 만료된 시세를 대신 돌려준 횟수",
+         [({}, cache["stale_served"])]),
+        ("db_pool_connections", "gauge", "DB 커넥션 수 (state: in_use/idle)",
+         [({"state": "in_use"}, pool["in_use"]), ({"state": "idle"}, pool["idle"])]),
+        ("db_pool_waits_total", "counter", "빈 커넥션을 기다린 횟수", [({}, pool["waits"])]),
+        ("db_pool_timeouts_total", "counter", "커넥션을 얻지 못하고 시간 초과된 횟수", [({}, pool["timeouts"])]),
+        ("upstream_in_flight", "gauge", "업스트림별 실행 중인 호출 수",
+         [({"provider": name}, u["in_flight"]) for name, u in upstreams.items()]),
+        ("upstream_circuit_open", "gauge", "업스트림 서킷 브레이커가 열려 있으면 1 (half_open 포함)",
+         [({"provider": name}, int(u["client"]["breaker"]["state"] != "closed")) for name, u in upstreams.items()]),
+        ("upstream_retries_total", "counter", "일시적 오류로 업스트림 호출을 다시 시도한 횟수",
+         [({"provider": name}, u["client"]["retried"]) for name, u in upstreams.items()]),
+        ("upstream_rejected_total", "counter", "업스트림을 부르지 않고 돌려보낸 횟수 (reason: open/rate_limited)",
+         [({"provider": name, "reason": reason}, count)
+          for name, u in upstreams.items() for reason, count in u["client"]["rejected"].items()]),
+        ("holdings_cache_requests_total", "counter", "현재 잔고 응답 (result: hit/miss/not_modified)",
+         [({"result": "hit"}, holdings["hits"]), ({"result": "miss"}, holdings["misses"]),
+          ({"result": "not_modified"}, holdings["not_modified"])]),
+        ("trade_queue_trades_total", "counter", "거래 대기열 건수 (stage: accepted/committed)",
+         [({"stage": "accepted"}, trades["accepted"]), ({"stage": "committed"}, trades["committed"])]),
+        ("trade_queue_fsyncs_total", "counter", "거래 대기열 fsync 횟수 (여러 거래를 한 번에 기록하면 accepted보다 작음)",
+         [({}, trades["fsyncs"])]),
+    ]
+
+
+registry.register_collector(_collect_runtime_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 형식 메트릭 (라우트/업스트림/DB 시간 히스토그램, 캐시 적중률, 환율 응답 단계)"""
+    return PlainTextResponse(registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "자산 관리 API 서버가 가동 중입니다."}
 
+@app.get("/monitor/db-pool")
+async def db_pool_stats():
+    """DB 커넥션 풀 상태 (사용 중 커넥션, 대기 횟수, 체크아웃 지연 시간)"""
+    return get_pool_stats()
+
 # 1. 전체 종목 리스트 (필요하신 전체 리스트를 여기 정의하세요)
 @app.get("/market/list")
-def get_market_list():
-    return [
-        {"code": "AAPL", "name": "애플 (Apple)", "currency": "USD"},
-        {"code": "NVDA", "name": "엔비디아 (Nvidia)", "currency": "USD"},
-        {"code": "TSLA", "name": "테슬라 (Tesla)", "currency": "USD"},
-        {"code": "005930.KS", "name": "삼성전자", "currency": "KRW"},
-        {"code": "000660.KS", "name": "SK하이닉스", "currency": "KRW"},
-        {"code": "035420.KS", "name": "NAVER", "currency": "KRW"}
-    ]
+async def get_market_list(codes: str | None = None):
+    """종목 마스터 목록 (codes=AAPL,005930.KS를 주면 해당 종목의 이름/통화만)"""
+    code_list = [c.strip() for c in codes.split(",") if c.strip()] if codes else None
+    return symbol_master.catalog(code_list)
 
 # 2. 실시간 현재가 가져오기
+# 시세는 quote_cache를 거쳐서 가져오므로 같은 종목을 동시에/반복해서 요청해도 야후 호출은 TTL당 1번입니다.
+# 응답의 age는 시세를 가져온 지 몇 초가 지났는지를 나타냅니다.
 # 2-1. 단일 종목 조회 (쇼핑 탭에서 사용)
 @app.get("/market/price/{symbol}")
-def get_current_price(symbol: str):
-    try:
-        ticker = yf.Ticker(symbol)
-        # 종목명 가져오기 (없으면 심볼로 대체)
-        stock_name = ticker.info.get('longName') or ticker.info.get('shortName') or symbol
-        
-        data = ticker.history(period="2d")
-        if data.empty:
-            return {"symbol": symbol, "name": stock_name, "price": 0, "prev_close": 0}
-        
-        current_price = data['Close'].iloc[-1]
-        prev_close = data['Close'].iloc[-2] if len(data) > 1 else current_price
-        
-        return {
-            "symbol": symbol,
-            "name": stock_name, # 종목명 추가
-            "price": round(float(current_price), 2),
-            "prev_close": round(float(prev_close), 2)
-        }
+async def get_current_price(symbol: str):
+    try:
+        # 캐시를 보고 진행 중인 조회에 합류하는 것은 이벤트 루프에서, 야후 호출만 run_upstream 슬롯에서 합니다.
+        cached = await quote_cache.get_async(symbol, partial(run_upstream, "yahoo", fetch_single_quote))
+        if cached is None:
+            return {"symbol": symbol, "name": symbol, "price": 0, "prev_close": 0, "age": None}
+
+        quote, age = cached
+        return {"symbol": symbol, **quote, "age": round(age, 1)}
+    except UpstreamTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # 2-2. 다중 종목 조회 (잔고 탭 성능 최적화용 - 새로 추가)
+# Accept 헤더로 Arrow / MessagePack 열 단위 응답을 요청할 수 있습니다. (api/columnar.py)
+PRICE_COLUMNS = [("symbol", "str"), ("name", "str"), ("price", "f8"), ("prev_close", "f8"), ("age", "f8")]
+
 @app.get("/market/prices")
-def get_multiple_prices(symbols: str):
+async def get_multiple_prices(symbols: str, request: Request):
     symbol_list = symbols.split(",")
-    tickers = yf.Tickers(symbol_list)
+    cached = await get_quotes(symbol_list)
     result = {}
-    
+
     for symbol in symbol_list:
-        try:
-            t = tickers.tickers[symbol]
-            # info에서 이름을 못 가져올 경우를 대비해 fast_info나 기본 name 탐색
-            name = t.info.get('shortName') or t.info.get('longName') or symbol
-            
-            result[symbol] = {
-                "name": name,
-                "price": t.fast_info.last_price,
-                "prev_close": t.fast_info.previous_close
-            }
-        except:
-            result[symbol] = {"name": symbol, "price": 0, "prev_close": 0}
-    return result
+        if symbol in cached:
+            quote, age = cached[symbol]
+            result[symbol] = {**quote, "age": round(age, 1)}
+        else:
+            result[symbol] = {"name": symbol, "price": 0, "prev_close": 0, "age": None}
+    rows = [{"symbol": symbol, **quote} for symbol, quote in result.items()]
+    return columnar_response(request, result, rows, PRICE_COLUMNS)
 
-# 달러/원 환율 가져오기
+# 2-3. 과거 시세 (로컬 저장소에서 응답, 빠진 구간만 야후에서 보충)
+@app.get("/market/history/{symbol}")
+async def get_market_history(symbol: str, start: date | None = None, end: date | None = None,
+                             interval: str = Query("1d", pattern="^(1d|1wk|1mo)$")):
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start가 end보다 늦습니다.")
+    try:
+        bars = await get_history(symbol, start, end, interval)
+        return {"symbol": symbol, "interval": interval, "bars": bars}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 2-4. 실시간 시세 스트림 (웹소켓)
+# 연결 주소에 ?symbols=AAPL,TSLA 를 붙이면 연결과 동시에 구독합니다.
+@app.websocket("/ws/quotes")
+async def quotes_socket(websocket: WebSocket):
+    await websocket.accept()
+    try:
+        initial = websocket.query_params.get("symbols")
+        if initial:
+            await quote_hub.subscribe(websocket, [s for s in initial.split(",") if s])
+
+        while True:
+            # 잘못된 메시지 하나로 연결이 끊기지 않도록 직접 파싱하고, 형식이 틀리면 오류 프레임만 보냅니다.
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                await websocket.send_json({"type": "error", "message": "JSON 형식이 아닌 메시지입니다."})
+                continue
+            if not isinstance(message, dict) or not isinstance(message.get("symbols", []), list):
+                await websocket.send_json({"type": "error",
+                                           "message": '{"action": ..., "symbols": [...]} 형식이어야 합니다.'})
+                continue
+            symbols = [s for s in message.get("symbols", []) if isinstance(s, str) and s]
+            action = message.get("action")
+            if action == "subscribe":
+                await quote_hub.subscribe(websocket, symbols)
+            elif action == "unsubscribe":
+                quote_hub.unsubscribe(websocket, symbols)
+            else:
+                await websocket.send_json({"type": "error", "message": f"알 수 없는 action: {action}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        quote_hub.unsubscribe(websocket)
+
+@app.get("/monitor/quote-stream")
+async def quote_stream_stats():
+    """웹소켓 구독자 수, 구독 종목 수, 폴링 횟수"""
+    return quote_hub.stats()
+
+@app.get("/monitor/quote-cache")
+async def quote_cache_stats():
+    """시세 캐시 적중/미스/만료 통계"""
+    return quote_cache.stats()
+
+@app.get("/monitor/executors")
+async def executor_stats():
+    """업스트림별 동시 실행 수, 타임아웃/오류 횟수, 서킷 브레이커 상태와 요청 한도"""
+    return get_executor_stats()
+
+@app.get("/monitor/trade-queue")
+async def trade_queue_stats():
+    """거래 대기열(TRADE_INGEST=queue) 상태: 밀린 양, 접수/저장 건수, fsync/배치 횟수"""
+    return trade_queue.stats()
+
+@app.get("/monitor/scheduler")
+async def scheduler_stats():
+    """주기 작업별 실행 횟수, 실패 횟수, 마지막 실행 시간, 트렌딩 목록 상태"""
+    return {"jobs": scheduler.stats(), "trending": trending_board.stats()}
+
+# 환율 조회
+# DB(exchange_rates) 스냅샷에서 바로 계산하고, 없거나 오래된 경우에만 야후/Frankfurter를 동시에 조회합니다.
 @app.get("/market/exchange-rate")
-def get_exchange_rate():
-    # 1단계: yfinance (메인 소스)
-    try:
-        ticker = yf.Ticker("USDKRW=X")
-        data = ticker.history(period="1d")
-        if not data.empty:
-            rate = round(float(data['Close'].iloc[-1]), 2)
-            return {"rate": rate, "status": "success", "source": "yfinance"}
+async def get_exchange_rate(base: str = "USD", quote: str = "KRW"):
+    result = await fx_service.get_rate(base, quote)
+    if result is not None:
+        FX_RATE_LOOKUPS.inc(source=result["source"], status=result["status"])
+        return result
+
+    # 최후의 보루 (하드코딩된 기본값)
+    # 모든 소스가 실패할 경우에만 작동합니다.
+    if (base.upper(), quote.upper()) == ("USD", "KRW"):
+        FX_RATE_LOOKUPS.inc(source="default", status="fallback")
+        return {"rate": DEFAULT_USD_KRW, "status": "fallback", "source": "default", "as_of": None}
+    FX_RATE_LOOKUPS.inc(source="none", status="error")
+    raise HTTPException(status_code=503, detail=f"{base}/{quote} 환율을 가져올 수 없습니다.")
+
+@app.get("/market/exchange-rates")
+async def get_all_exchange_rates(base: str = "KRW"):
+    """스냅샷에 있는 모든 통화의 환율을 한 번에 돌려줍니다. (1 통화 = ? base)"""
+    result = fx_service.all_rates(base)
+    if result is None:
+        raise HTTPException(status_code=503, detail=f"{base} 기준 환율 스냅샷이 없습니다.")
+    return result
+
+
+@app.get("/holdings")
+async def fetch_holdings(request: Request, as_of: date | None = None):
+    """
+    DB에서 현재 잔고 목록을 가져옵니다.
+    as_of를 주면 그 날짜 장 마감 기준 잔고를 돌려줍니다. (증권사 잔고 대사용)
+    현재 잔고는 거래 버전으로 만든 ETag를 붙이고, If-None-Match가 같으면 304로 응답합니다.
+    """
+    try:
+        if as_of is None:
+            return await holdings_cache.response(request)
+        data = await get_holdings_as_of_async(as_of)
+    except PositionsNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return columnar_response(request, data, data, HOLDING_COLUMNS)
+
+def _dashboard_etag_source(dashboard):
+    # age(시세를 받은 지 몇 초)는 요청마다 달라지므로 빼고 해시합니다. 잔고/가격/환율이 같으면 같은 ETag
+    stable = {**dashboard, "holdings": [{k: v for k, v in row.items() if k != "age"} for row in dashboard["holdings"]]}
+    return json.dumps(stable, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+
+@app.get("/portfolio/dashboard")
+async def get_portfolio_dashboard(request: Request):
+    """
+    잔고 화면에 필요한 것을 한 번에 돌려줍니다.
+    종목별 잔고 + 현재가/종목명/평가손익, 통화별 합계(원화 환산 포함), 환율
+    시세가 섞여 있어 거래 버전만으로는 알 수 없으므로 내용 해시를 ETag로 씁니다. (같으면 304)
+    """
+    try:
+        dashboard = jsonable_encoder(await build_dashboard())
+    except PositionsNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        print(f"yfinance error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    body = json.dumps(dashboard, ensure_ascii=False, separators=(",", ":")).encode()
+    etag = f'"dashboard-{hashlib.blake2b(_dashboard_etag_source(dashboard), digest_size=12).hexdigest()}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
 
-    # 2단계: Frankfurter API (백업 소스)
+@app.get("/portfolio/analytics")
+async def get_portfolio_analytics(start: date | None = None, end: date | None = None, include_series: bool = False):
+    """
+    거래 내역과 로컬 시세 이력으로 기간 수익률(TWR/MWR), 변동성, 최대낙폭, 종목별 기여도, 상관계수를 계산합니다.
+    include_series=true면 일별 평가금액도 함께 돌려줍니다.
+    """
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start가 end보다 늦습니다.")
     try:
-        # 무료이며 인증키가 필요 없는 오픈 API입니다.
-        res = requests.get("https://api.frankfurter.app/latest?from=USD&to=KRW", timeout=3)
-        if res.status_code == 200:
-            rate = res.json()['rates']['KRW']
-            return {"rate": round(rate, 2), "status": "success", "source": "backup_api"}
+        result = await portfolio_analytics(start, end, include_series)
     except Exception as e:
-        print(f"Backup API error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="해당 기간에 분석할 거래 내역이 없습니다.")
+    return result
 
-    # 3단계: 최후의 보루 (하드코딩된 기본값)
-    # 1, 2단계 모두 실패할 경우에만 작동합니다.
-    return {"rate": 1400.0, "status": "fallback", "source": "default"}
+def _check_lot_method(method):
+    if method not in LOT_METHODS:
+        raise HTTPException(status_code=400, detail=f"method는 {', '.join(LOT_METHODS)} 중 하나여야 합니다.")
 
 
-@app.get("/holdings")
-def fetch_holdings():
-    """DB에서 현재 잔고 목록을 가져옵니다."""
+@app.get("/portfolio/realized")
+async def get_realized(method: str = "fifo", start: date | None = None, end: date | None = None,
+                       stock_code: str | None = None):
+    """
+    로트 기준 실현손익을 종목/통화별로 돌려줍니다. (거래 통화 기준)
+    로트 엔진은 스케줄러가 거래 저장 직후와 LOT_PROCESS_SECONDS마다 돌리므로 여기서는 결과 테이블만 읽습니다.
+    """
+    _check_lot_method(method)
+    try:
+        rows = await run_db(get_realized_pnl, method, start, end, stock_code)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    totals = {}
+    for row in rows:
+        totals[row["currency"]] = totals.get(row["currency"], 0) + (row["pnl"] or 0)
+    return {"method": method, "rows": rows, "totals": totals}
+
+
+@app.get("/portfolio/lots")
+async def get_lots(method: str = "fifo", stock_code: str | None = None):
+    """아직 팔지 않은 로트(매수 단위)별 잔량과 취득 단가 (get_realized와 같이 결과 테이블만 읽음)"""
+    _check_lot_method(method)
+    try:
+        return await run_db(get_open_lots, method, stock_code)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+TRADE_PAGE_MAX = 1000  # GET /trades 한 페이지 최대 행 수
+
+
+def _trade_list_filters(stock_code, currency, trade_type, start, end):
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start가 end보다 늦습니다.")
+    return {
+        "stock_code": stock_code,
+        "currency": currency.upper() if currency else None,
+        "trade_type": trade_type,
+        "start": start,
+        "end": end,
+    }
+
+
+@app.get("/trades")
+async def list_trade_history(cursor: str | None = None, limit: int = Query(100, ge=1, le=TRADE_PAGE_MAX),
+                             stock_code: str | None = None, currency: str | None = None,
+                             trade_type: str | None = Query(None, alias="type", pattern="^(BUY|SELL)$"),
+                             start: date | None = None, end: date | None = None,
+                             order: str = Query("desc", pattern="^(asc|desc)$")):
+    """
+    거래 기록 목록 (기본 최신순). 응답의 next_cursor를 cursor로 넘기면 다음 페이지를 받습니다. (없으면 마지막 페이지)
+    다음 페이지를 받을 때는 처음과 같은 필터/order를 그대로 보내야 합니다.
+    """
+    filters = _trade_list_filters(stock_code, currency, trade_type, start, end)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        data = get_stock_holdings()
-        return data
+        rows, has_more = await run_db(list_trades, after, limit, order == "desc", **filters)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return {"trades": rows, "next_cursor": encode_cursor(rows[-1]) if has_more else None}
+
+
+@app.get("/trades/export")
+async def export_trade_history(format: str = Query("csv", pattern="^(csv|ndjson)$"),
+                               stock_code: str | None = None, currency: str | None = None,
+                               trade_type: str | None = Query(None, alias="type", pattern="^(BUY|SELL)$"),
+                               start: date | None = None, end: date | None = None):
+    """조건에 맞는 거래 기록 전체를 오래된 순으로 CSV 또는 NDJSON 파일로 내려받습니다. (스트리밍)"""
+    filters = _trade_list_filters(stock_code, currency, trade_type, start, end)
+    return StreamingResponse(
+        stream_export(format, **filters),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="trades.{format}"'},
+    )
+
+
+async def _save_trade(response, stock_code, quantity, price, currency, trade_type, idempotency_key):
+    """
+    거래 하나를 저장합니다. TRADE_INGEST=queue면 대기열에 기록하고 202, 아니면 바로 DB에 저장합니다.
+    (status, 멱등 키, trade_id)를 돌려줍니다.
+    """
+    if TRADE_INGEST == "queue":
+        key, state = await trade_queue.submit(stock_code, quantity, price, currency, trade_type, idempotency_key)
+        scheduler.trigger("trade-queue")
+        if state["status"] == "failed":
+            # 같은 키로 보냈던 거래를 DB가 거부했으면 다시 보내도 같은 결과라 그 사유를 돌려줍니다.
+            raise ValueError(state["error"])
+        # 같은 키로 이미 저장된 거래면 200, 대기열에 기록만 됐으면 202
+        response.status_code = 202 if state["status"] == "queued" else 200
+        return state["status"], key, state["trade_id"]
+    trade_id = await add_trade_async(stock_code, quantity, price, currency, trade_type, idempotency_key)
+    holdings_cache.invalidate()
+    scheduler.trigger("lots")
+    return "success", idempotency_key, trade_id
 
 @app.post("/trades")
-def record_trade(trade: TradeCreate):
-    """새로운 주식 매수 기록을 DB에 저장합니다."""
+async def record_trade(trade: TradeCreate, response: Response,
+                       idempotency_key: str | None = Header(None, max_length=64)):
+    """
+    새로운 주식 매수 기록을 DB에 저장합니다.
+    Idempotency-Key 헤더를 주면 같은 키로 다시 보낸 요청은 한 번만 저장됩니다.
+    """
     try:
-        add_trade(
+        status, key, trade_id = await _save_trade(
+            response,
             trade.stock_code, 
             trade.quantity, 
             trade.price, 
-            trade.currency
+            trade.currency,
+            None,
+            idempotency_key,
         )
-        return {"status": "success", "message": f"{trade.stock_code} 매수 기록 완료"}
+        message = f"{trade.stock_code} 매수 기록 접수" if status == "queued" else f"{trade.stock_code} 매수 기록 완료"
+        return {"status": status, "message": message, "idempotency_key": key, "trade_id": trade_id}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     
 @app.post("/trades/sell")
-def record_sell_trade(trade: TradeCreate):
+async def record_sell_trade(trade: TradeCreate, response: Response,
+                            idempotency_key: str | None = Header(None, max_length=64)):
     """주식 매도 기록을 DB에 저장합니다. (수량을 음수로 변환)"""
     try:
         # 매도이므로 수량을 음수(negative)로 강제로 변환
         # abs()를 써서 양수로 만든 뒤 -를 붙이는 방식
         sell_quantity = -abs(trade.quantity)
 
-        add_trade(
+        status, key, trade_id = await _save_trade(
+            response,
             trade.stock_code, 
             sell_quantity, 
             trade.price, 
-            trade.currency
+            trade.currency,
+            "SELL",
+            idempotency_key,
         )
-        return {"status": "success", "message": f"{trade.stock_code} {trade.quantity}주 매도 기록 완료"}
+        message = (f"{trade.stock_code} {trade.quantity}주 매도 기록 접수" if status == "queued"
+                   else f"{trade.stock_code} {trade.quantity}주 매도 기록 완료")
+        return {"status": status, "message": message, "idempotency_key": key, "trade_id": trade_id}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/trades/status/{idempotency_key}")
+async def get_trade_status(idempotency_key: str):
+    """
+    멱등 키로 거래 처리 상태를 조회합니다.
+    queued: 대기열에 기록됨(아직 DB 저장 전), committed: DB에 저장됨(trade_id 포함),
+    failed: DB가 거부해 데드레터 파일로 옮김(error 포함)
+    """
+    try:
+        if TRADE_INGEST == "queue":
+            state = await trade_queue.status(idempotency_key)
+        else:
+            row = await run_db(get_trade_by_idempotency_key, idempotency_key)
+            state = {"status": "committed", "trade_id": row["id"]} if row else None
     except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"{idempotency_key} 키로 접수된 거래가 없습니다.")
+    return {"idempotency_key": idempotency_key, **state}
+
+@app.post("/trades/bulk")
+async def bulk_import_trades(request: Request, format: str | None = Query(None, pattern="^(csv|jsonl)$")):
+    """
+    CSV 또는 JSON Lines 거래 내역을 업로드 받아 한 트랜잭션으로 저장합니다.
+    잘못된 줄은 건너뛰고 줄 번호와 사유를 rejects로 돌려줍니다.
+    """
+    try:
+        fmt = detect_format(request.headers.get("content-type"), format)
+        result = await import_stream(request.stream(), fmt)
+        holdings_cache.invalidate()
+        scheduler.trigger("lots")
+        return result
+    except (BulkImportError, UnicodeDecodeError) as e:
+        # 업로드 내용의 문제 (헤더 누락, 지원하지 않는 형식, UTF-8이 아닌 파일)
         raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        # DB 오류 등 서버 쪽 문제는 클라이언트가 고칠 수 없으므로 500
+        raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/market-list")
-def get_market_catalog():
-    """구경하기 화면에서 보여줄 전체 종목 리스트"""
-    # 나중에는 DB에서 가져오게 확장 가능합니다.
-    return [
-        {"code": "AAPL", "name": "Apple"},
-        {"code": "NVDA", "name": "Nvidia"},
-        {"code": "TSLA", "name": "Tesla"},
-        {"code": "005930.KS", "name": "삼성전자"},
-        {"code": "000660.KS", "name": "SK하이닉스"}
-    ]
+async def get_market_catalog():
+    """구경하기 화면에서 보여줄 전체 종목 리스트 (종목 마스터와 같은 목록)"""
+    return symbol_master.catalog()
+
+SEARCH_LIMIT = 10
+SEARCH_LOCAL_HIT = 0.8          # 로컬 결과에 이 점수 이상(코드/이름 접두어 일치)이 없을 때만 야후 검색으로 보충
+SEARCH_UPSTREAM_TTL = 86400     # 같은 검색어로 야후를 다시 부르지 않는 시간(초)
+_upstream_searched = {}         # 정규화한 검색어 -> 야후 검색 시각
+
+
+def _search_quotes(query):
+    search = yahoo.call(yf.Search, query, max_results=10, session=yahoo.session)
+
+    results = []
+    for quote in search.quotes:
+        if quote.get('quoteType') in ['EQUITY', 'ETF']:
+            symbol = quote['symbol']
+            # 웹 앱에서 기대하는 'currency' 필드를 여기서 생성
+            currency = "KRW" if (".KS" in symbol or ".KQ" in symbol) else "USD"
+
+            results.append({
+                "code": symbol,
+                "name": quote.get('shortname') or quote.get('longname') or symbol,
+                "exchange": quote.get('exchDisp') or quote.get('exchange') or "",
+                "currency": currency  # 이 필드가 있어야 웹 앱의 'Currency' 섹션이 작동함
+            })
+    # 검색 결과에 딸려 온 종목명은 메타데이터 캐시에 넣어 두어 시세 조회 때 .info 호출을 줄입니다.
+    symbol_meta.remember_many({r["code"]: r["name"] for r in results})
+    return results
 
 @app.get("/market/search")
-def search_global_stocks(query: str):  # 'q' 대신 'query'로 변경하여 웹 앱과 매칭
-    try:
-        search = yf.Search(query, max_results=10)
-        
-        results = []
-        for quote in search.quotes:
-            if quote.get('quoteType') in ['EQUITY', 'ETF']:
-                symbol = quote['symbol']
-                # 웹 앱에서 기대하는 'currency' 필드를 여기서 생성
-                currency = "KRW" if (".KS" in symbol or ".KQ" in symbol) else "USD"
-                
-                results.append({
-                    "code": symbol,
-                    "name": quote.get('shortname') or quote.get('longname') or symbol,
-                    "currency": currency  # 이 필드가 있어야 웹 앱의 'Currency' 섹션이 작동함
-                })
+async def search_global_stocks(query: str):  # 'q' 대신 'query'로 변경하여 웹 앱과 매칭
+    """
+    종목 마스터(코드/영문명/한글명)에서 먼저 찾고, 결과가 부족할 때만 야후 검색으로 보충합니다.
+    야후에서 찾은 종목은 종목 마스터에 저장되어 다음부터는 로컬에서 바로 찾습니다.
+    """
+    results = symbol_master.search(query, SEARCH_LIMIT)
+    key = normalize_query(query)
+    if any(r["score"] >= SEARCH_LOCAL_HIT for r in results) or len(key) < 2:
+        return results
+    if time.time() - _upstream_searched.get(key, 0) < SEARCH_UPSTREAM_TTL:
         return results
+
+    try:
+        found = await run_upstream("yahoo", _search_quotes, query)
+        _upstream_searched[key] = time.time()
     except Exception as e:
         print(f"Search Error: {e}")
-        return []
+        return results
+    await asyncio.to_thread(symbol_master.merge, found)
+    results = symbol_master.search(query, SEARCH_LIMIT)
+    # 로컬 색인의 점수로는 걸리지 않았지만 야후가 돌려준 종목도 함께 보여줍니다.
+    codes = {r["code"] for r in results}
+    extra = [r for r in symbol_master.catalog([f["code"] for f in found]) if r["code"] not in codes]
+    return (results + extra)[:SEARCH_LIMIT]
 
 
-    
+TRENDING_COLUMNS = [("code", "str"), ("name", "str"), ("price", "f8"), ("prev_close", "f8"),
+                    ("change_pct", "f8"), ("currency", "str"), ("age", "f8")]
+
 @app.get("/market/trending")
-def get_trending_stocks():
-    try:
-        # 1. 'stocks' 키워드로 검색하여 실제 활발한 종목들 추출
-        search = yf.Search("stocks", max_results=30)
-        trending_tickers = [q['symbol'] for q in search.quotes if q.get('quoteType') == 'EQUITY' or q.get('quoteType') == 'ETF']
-        
-        # 2. 만약 검색 결과가 적다면 미국 우량주 강제 포함 (보험용)
-        top_us = ["AAPL", "TSLA", "NVDA", "MSFT", "GOOGL", "AMZN", "META", "AMD"]
-        
-        # 중복 제거 후 리턴
-        return list(set(trending_tickers + top_us))
-    except Exception as e:
-        # 에러 발생 시 미국 대표 종목 리턴
-        return ["AAPL", "TSLA", "NVDA", "MSFT", "AMZN"]
\ No newline at end of file
+async def get_trending_stocks(request: Request):
+    """
+    트렌딩 종목과 시세/등락률 (등락률 내림차순)
+    스케줄러가 미리 만들어 둔 목록을 그대로 돌려주므로 야후를 호출하지 않습니다.
+    """
+    rows = await trending_board.rows()
+    return columnar_response(request, rows, rows, TRENDING_COLUMNS)
@@ -0,0 +1,101 @@
+"""
+시세 조회 공통 모듈
+
+/market/price(s), 웹소켓 시세 스트림 등 시세가 필요한 곳은 모두 이 모듈을 거칩니다.
+quote_cache를 먼저 보고, 빠진 종목만 market 스레드에서 yf.download 한 번으로 가져옵니다.
+"""
+import os
+import time
+import asyncio
+from functools import partial
+import yfinance as yf
+import pandas as pd
+
+from api.quote_cache import quote_cache, ttl_for
+from api.executors import run_upstream, UpstreamTimeout
+from api.upstream import yahoo, UpstreamUnavailable, UpstreamEmpty
+from api.symbol_meta import symbol_meta
+from api.quote_store import SHARED_FX_PREFIX
+
+QUOTE_STORE_REFRESH_SECONDS = float(os.getenv("QUOTE_STORE_REFRESH_SECONDS", "5"))  # 공유 저장소 선갱신 확인 주기(초)
+SHARED_REFRESH_BATCH = 200   # 선갱신 때 yf.download 한 번에 넣는 종목 수
+
+
+def fetch_single_quote(symbol):
+    return fetch_quotes([symbol]).get(symbol)
+
+
+def _download_quotes(symbol_list):
+    data = yf.download(symbol_list, period="5d", interval="1d", group_by="ticker",
+                       auto_adjust=False, progress=False, threads=True, session=yahoo.session)
+    if data is None or data.empty:
+        raise UpstreamEmpty("야후 시세 응답이 비어 있습니다.")
+    return data
+
+
+def fetch_quotes(symbol_list):
+    """
+    여러 종목의 현재가/전일 종가를 yf.download 한 번으로 가져옵니다.
+    종목명은 .info를 종목마다 호출하지 않고 symbol_meta 캐시에서 채웁니다.
+    """
+    result = {}
+    try:
+        data = yahoo.call(_download_quotes, symbol_list, cost=len(symbol_list))
+    except UpstreamEmpty:
+        return result
+
+    for symbol in symbol_list:
+        try:
+            # 종목별 컬럼은 (티커, 항목) 형태이며 티커는 대문자로 정규화되어 있습니다.
+            if isinstance(data.columns, pd.MultiIndex):
+                closes = data[symbol.upper()]['Close'].dropna()
+            else:
+                closes = data['Close'].dropna()
+            if closes.empty:
+                continue
+            current_price = closes.iloc[-1]
+            prev_close = closes.iloc[-2] if len(closes) > 1 else current_price
+            result[symbol] = {
+                "price": round(float(current_price), 2),
+                "prev_close": round(float(prev_close), 2)
+            }
+        except KeyError:
+            # 다운로드 결과에 없는 종목은 캐시하지 않고 다음 요청에서 다시 시도합니다.
+            pass
+
+    names = symbol_meta.resolve_names(list(result))
+    for symbol, quote in result.items():
+        quote["name"] = names.get(symbol, symbol)
+    return result
+
+
+async def get_quotes(symbol_list):
+    """
+    {symbol: (quote, age)}를 돌려줍니다. 구하지 못한 종목은 빠집니다.
+    캐시에 있는 종목은 바로 쓰고, 빠진 종목만 market 스레드에서 한 번에 가져옵니다.
+    다른 요청이 가져오는 중인 종목은 이벤트 루프에서 기다리므로 야후 동시 실행 슬롯을 차지하지 않습니다.
+    야후가 늦거나 서킷이 열려 있으면 만료된 값이라도 있는 종목은 그 값으로 응답합니다. (quote_cache가 처리)
+    """
+    try:
+        return await quote_cache.get_many_async(symbol_list, partial(run_upstream, "yahoo", fetch_quotes))
+    except (UpstreamTimeout, UpstreamUnavailable) as e:
+        print(f"시세 조회 지연: {e}")
+    except Exception as e:
+        print(f"시세 조회 실패: {e}")
+    return {}
+
+
+async def refresh_shared_quotes():
+    """
+    공유 시세 저장소(QUOTE_STORE)를 쓸 때 리더로 뽑힌 워커만 일합니다.
+    최근 조회된 종목 중 TTL의 절반이 지난 시세를 미리 다시 받아 두어, 다른 워커들은 저장소에서 바로 읽게 합니다.
+    """
+    store = quote_cache.store
+    if store is None or not await asyncio.to_thread(store.try_lead):
+        return
+    due = [symbol for symbol, age in await asyncio.to_thread(store.due_symbols)
+           if not symbol.startswith(SHARED_FX_PREFIX) and age > ttl_for(symbol) / 2]
+    for i in range(0, len(due), SHARED_REFRESH_BATCH):
+        batch = due[i:i + SHARED_REFRESH_BATCH]
+        fetched = await run_upstream("yahoo", fetch_quotes, batch)
+        await asyncio.to_thread(store.put_many, fetched, time.time())
@@ -0,0 +1,324 @@
+"""
+프로세스 내 시세 캐시
+
+- 종목별 TTL: 장중에는 짧게, 장이 닫혀 있으면 길게 (시세가 바뀌지 않으므로)
+- 동시 요청 합치기(single-flight): 같은 종목을 동시에 여러 명이 요청해도 야후에는 한 번만 요청
+  (이벤트 루프에서는 get_many_async: 기다리는 요청은 업스트림 슬롯을 잡지 않고, 직접 가져오는 요청만 run_upstream을 거침)
+- 최대 개수 제한 + LRU 방식으로 오래 안 쓰인 종목부터 제거
+- 적중/미스/만료 횟수 통계
+- store(api.quote_store)가 있으면 다른 워커와 공유하는 저장소를 함께 보고, 더 최근 값을 씁니다.
+  직접 가져온 시세는 저장소에도 써서 다른 워커가 야후를 다시 부르지 않게 합니다.
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime, time as dtime
+from zoneinfo import ZoneInfo
+
+from api.quote_store import quote_store, run_store
+
+QUOTE_TTL_OPEN = float(os.getenv("QUOTE_TTL_OPEN", "15"))        # 장중 캐시 유지 시간(초)
+QUOTE_TTL_CLOSED = float(os.getenv("QUOTE_TTL_CLOSED", "600"))   # 장 마감 후 캐시 유지 시간(초)
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", "2000"))    # 최대 보관 종목 수
+QUOTE_WAIT_TIMEOUT = 30.0  # 다른 요청이 가져오는 중인 시세를 기다리는 최대 시간(초)
+
+# 거래소별 정규장 시간 (현지 시각 기준, 주말 휴장)
+MARKET_HOURS = {
+    "KRX": (ZoneInfo("Asia/Seoul"), dtime(9, 0), dtime(15, 30)),
+    "US": (ZoneInfo("America/New_York"), dtime(9, 30), dtime(16, 0)),
+}
+
+
+def market_of(symbol):
+    """심볼로 거래소를 추정합니다. (환율 심볼 'USDKRW=X' 등은 24시간 시장으로 취급)"""
+    if symbol.endswith("=X"):
+        return None
+    if ".KS" in symbol or ".KQ" in symbol:
+        return "KRX"
+    return "US"
+
+
+def is_market_open(symbol, now=None):
+    market = market_of(symbol)
+    if market is None:
+        return True
+    tz, open_at, close_at = MARKET_HOURS[market]
+    local = (now or datetime.now(tz)).astimezone(tz)
+    if local.weekday() >= 5:
+        return False
+    return open_at <= local.time() <= close_at
+
+
+def ttl_for(symbol):
+    return QUOTE_TTL_OPEN if is_market_open(symbol) else QUOTE_TTL_CLOSED
+
+
+class _Flight:
+    """진행 중인 업스트림 요청 하나. 같은 종목을 기다리는 요청들이 이 결과를 함께 씁니다."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None   # (value, fetched_at)
+        self.error = None
+        self.waiters = []   # 이벤트 루프에서 기다리는 요청의 (loop, future)
+
+    def finish(self):
+        """기다리는 스레드와 코루틴을 모두 깨웁니다. (QuoteCache._lock을 잡은 채로 호출)"""
+        self.event.set()
+        for loop, future in self.waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        self.waiters = []
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class QuoteCache:
+    def __init__(self, maxsize=QUOTE_CACHE_SIZE, ttl_func=ttl_for, store=None):
+        self.maxsize = maxsize
+        self.ttl_func = ttl_func
+        self.store = store              # 워커 간 공유 저장소 (None이면 프로세스 안에서만 캐시)
+        self._entries = OrderedDict()   # symbol -> (value, fetched_at)
+        self._inflight = {}             # symbol -> _Flight
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0          # 캐시에 있었지만 TTL이 지나 다시 가져온 횟수
+        self.stale_served = 0   # 업스트림 실패로 만료된 값을 대신 돌려준 횟수
+        self.coalesced = 0      # 다른 요청의 업스트림 호출 결과를 함께 받은 횟수
+        self.evictions = 0
+        self.errors = 0
+        self.shared_hits = 0    # 다른 워커가 공유 저장소에 넣어 둔 값을 쓴 횟수
+        self.store_errors = 0
+
+    def _store_locked(self, symbol, value, fetched_at):
+        self._entries[symbol] = (value, fetched_at)
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _read_shared(self, symbols):
+        """공유 저장소의 {symbol: (value, fetched_at)}. 저장소가 없거나 읽기에 실패하면 빈 dict"""
+        if self.store is None:
+            return {}
+        try:
+            return self.store.get_many(dict.fromkeys(symbols))
+        except Exception as e:
+            self.store_errors += 1
+            print(f"공유 시세 저장소 읽기 실패: {e}")
+            return {}
+
+    def _write_shared(self, values, fetched_at):
+        if self.store is None or not values:
+            return
+        try:
+            self.store.put_many(values, fetched_at)
+        except Exception as e:
+            self.store_errors += 1
+            print(f"공유 시세 저장소 쓰기 실패: {e}")
+
+    def _entry_locked(self, symbol, shared):
+        """로컬 캐시와 공유 저장소 중 더 최근 값. 공유 쪽이 더 최근이면 로컬에도 넣어 둡니다."""
+        entry = self._entries.get(symbol)
+        other = shared.get(symbol)
+        if other is not None and (entry is None or other[1] > entry[1]):
+            self._store_locked(symbol, *other)
+            self.shared_hits += 1
+            return other
+        return entry
+
+    def peek(self, symbol):
+        """업스트림 호출 없이 캐시에 있는 값만 (value, age)로 돌려줍니다. 없으면 None"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+        if entry is None:
+            return None
+        value, fetched_at = entry
+        return value, time.time() - fetched_at
+
+    def get_fresh(self, symbols):
+        """
+        TTL 안의 캐시 값만 {symbol: (value, age)}로 돌려줍니다. 업스트림 호출도, 기다림도 없습니다.
+        빠진 종목만 get_many로 가져오면 됩니다.
+        """
+        shared = self._read_shared(symbols)
+        now = time.time()
+        result = {}
+        with self._lock:
+            for symbol in dict.fromkeys(symbols):
+                entry = self._entry_locked(symbol, shared)
+                if entry is not None and now - entry[1] < self.ttl_func(symbol):
+                    self.hits += 1
+                    self._entries.move_to_end(symbol)
+                    result[symbol] = (entry[0], now - entry[1])
+        return result
+
+    def _claim(self, symbols, shared):
+        """
+        TTL 안의 값은 entries로 모으고, 나머지는 직접 가져올 종목(leader)과
+        다른 요청이 가져오는 중인 종목(waiting: {symbol: _Flight})으로 나눕니다.
+        """
+        now = time.time()
+        entries = {}
+        leader = []     # 이 요청이 직접 가져올 종목
+        waiting = {}    # 다른 요청이 가져오는 중인 종목
+
+        with self._lock:
+            for symbol in dict.fromkeys(symbols):
+                entry = self._entry_locked(symbol, shared)
+                if entry is not None and now - entry[1] < self.ttl_func(symbol):
+                    self.hits += 1
+                    self._entries.move_to_end(symbol)
+                    entries[symbol] = entry
+                    continue
+                if entry is None:
+                    self.misses += 1
+                else:
+                    self.stale += 1
+                flight = self._inflight.get(symbol)
+                if flight is not None:
+                    self.coalesced += 1
+                    waiting[symbol] = flight
+                else:
+                    self._inflight[symbol] = _Flight()
+                    leader.append(symbol)
+        return entries, leader, waiting
+
+    def _settle(self, leader, fetched, error):
+        """
+        leader 종목의 결과를 캐시(와 공유 저장소)에 넣고 기다리던 요청을 깨웁니다.
+        가져오지 못한 종목은 만료된 값이라도 있으면 그 값을 씁니다. {symbol: (value, fetched_at)}를 돌려줍니다.
+        """
+        fetched_at = time.time()
+        self._write_shared({s: v for s, v in fetched.items() if s in leader and v is not None}, fetched_at)
+        entries = {}
+        with self._lock:
+            for symbol in leader:
+                flight = self._inflight.pop(symbol)
+                value = fetched.get(symbol)
+                if value is not None:
+                    self._store_locked(symbol, value, fetched_at)
+                    flight.entry = (value, fetched_at)
+                else:
+                    self.errors += 1
+                    old = self._entries.get(symbol)
+                    if old is not None:
+                        self.stale_served += 1
+                        flight.entry = old
+                    flight.error = error
+                flight.finish()
+                if flight.entry is not None:
+                    entries[symbol] = flight.entry
+        return entries
+
+    @staticmethod
+    def _with_age(entries):
+        now = time.time()
+        return {symbol: (value, now - fetched_at) for symbol, (value, fetched_at) in entries.items()}
+
+    def get_many(self, symbols, fetch_many):
+        """
+        여러 종목의 시세를 {symbol: (value, age)} 형태로 돌려줍니다.
+        캐시에 없거나 만료된 종목만 모아서 fetch_many(symbols) -> {symbol: value}를 한 번 호출합니다.
+        가져오지 못한 종목은 결과에서 빠집니다. (만료된 값이라도 있으면 그 값을 대신 돌려줌)
+        이벤트 루프에서는 get_many_async를 쓰세요.
+        """
+        entries, leader, waiting = self._claim(symbols, self._read_shared(symbols))
+        if leader:
+            error = None
+            try:
+                fetched = fetch_many(leader) or {}
+            except Exception as e:
+                fetched = {}
+                error = e
+            entries.update(self._settle(leader, fetched, error))
+            if error is not None and not entries and not waiting:
+                raise error
+
+        for symbol, flight in waiting.items():
+            if flight.event.wait(QUOTE_WAIT_TIMEOUT) and flight.entry is not None:
+                entries[symbol] = flight.entry
+        return self._with_age(entries)
+
+    async def _wait_async(self, flight):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if flight.event.is_set():
+                return flight.entry
+            flight.waiters.append((loop, future))
+        try:
+            await asyncio.wait_for(future, QUOTE_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        return flight.entry
+
+    async def get_many_async(self, symbols, fetch_many):
+        """
+        이벤트 루프에서 부르는 get_many. fetch_many(symbols)는 {symbol: value}를 돌려주는 async 함수입니다.
+        업스트림 호출(run_upstream)은 직접 가져올 종목이 있을 때 fetch_many 안에서만 일어나고,
+        다른 요청이 가져오는 중인 종목은 이벤트 루프에서 기다리므로 업스트림 동시 실행 슬롯이나 스레드를 잡지 않습니다.
+        """
+        shared = await run_store(self.store, self._read_shared, symbols)
+        entries, leader, waiting = self._claim(symbols, shared)
+        if leader:
+            error = None
+            try:
+                fetched = await fetch_many(leader) or {}
+            except Exception as e:
+                fetched = {}
+                error = e
+            except BaseException as e:
+                # 요청이 취소돼도 이 종목을 기다리던 요청들이 QUOTE_WAIT_TIMEOUT까지 묶이지 않게 바로 끝냅니다.
+                self._settle(leader, {}, e)
+                raise
+            entries.update(await run_store(self.store, self._settle, leader, fetched, error))
+            if error is not None and not entries and not waiting:
+                raise error
+
+        if waiting:
+            for symbol, entry in zip(waiting, await asyncio.gather(*map(self._wait_async, waiting.values()))):
+                if entry is not None:
+                    entries[symbol] = entry
+        return self._with_age(entries)
+
+    def get(self, symbol, fetch):
+        """단일 종목 버전. 값을 전혀 구할 수 없으면 None (업스트림 예외는 그대로 전달)"""
+        result = self.get_many([symbol], lambda syms: {s: fetch(s) for s in syms})
+        return result.get(symbol)
+
+    async def get_async(self, symbol, fetch):
+        """get의 async 버전. fetch(symbol)는 async 함수입니다."""
+        async def fetch_many(symbols):
+            return {s: await fetch(s) for s in symbols}
+        return (await self.get_many_async([symbol], fetch_many)).get(symbol)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "inflight": len(self._inflight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "stale_served": self.stale_served,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "shared_hits": self.shared_hits,
+                "store_errors": self.store_errors,
+                "store": self.store.stats() if self.store is not None else None,
+            }
+
+
+# API 서버 전체가 함께 쓰는 시세 캐시
+quote_cache = QuoteCache(store=quote_store)
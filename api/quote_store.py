@@ -0,0 +1,314 @@
+"""
+워커 간 공유 시세 저장소
+
+uvicorn을 --workers N으로 띄우면 프로세스마다 quote_cache가 따로 생겨 야후 호출이 N배가 되고,
+같은 순간에도 워커마다 다른 값을 돌려줄 수 있습니다. QUOTE_STORE를 설정하면 quote_cache가
+프로세스 안의 캐시보다 이 저장소를 먼저 보고, 가져온 시세도 여기에 씁니다.
+
+- local (기본값): 공유하지 않음. 워커 1개일 때와 같음
+- mmap: 같은 호스트의 워커들이 파일 하나(/dev/shm)를 메모리에 매핑해 함께 씁니다.
+  고정 크기 레코드의 해시 테이블이며, 레코드마다 시퀀스 번호(seqlock)를 두어
+  읽는 쪽은 락 없이 레코드를 제자리에서 읽고(struct.unpack_from), 쓰는 중이었으면 다시 읽습니다.
+  쓰기는 flock으로 한 번에 한 프로세스만 합니다.
+- redis://...: 여러 호스트가 함께 쓰는 Redis (redis 패키지 필요)
+
+어느 백엔드든 워커 중 하나가 리더로 뽑혀(mmap: 리더 파일 flock, redis: SET NX 키) 최근에 조회된 종목의 시세를
+만료 전에 미리 다시 받아 둡니다(api.market_data.refresh_shared_quotes). 리더가 죽으면 다음 주기에 다른 워커가 이어받습니다.
+"""
+import os
+import json
+import asyncio
+import time
+import mmap
+import struct
+import threading
+import zlib
+
+from api.symbol_meta import DATA_DIR
+
+QUOTE_STORE = os.getenv("QUOTE_STORE", "local")                         # local / mmap / redis://host:6379/0
+QUOTE_STORE_SLOTS = int(os.getenv("QUOTE_STORE_SLOTS", "4096"))          # mmap 저장소의 최대 종목 수
+QUOTE_STORE_IDLE_SECONDS = float(os.getenv("QUOTE_STORE_IDLE_SECONDS", "300"))  # 이 시간 동안 조회가 없던 종목은 미리 갱신하지 않음(초)
+QUOTE_STORE_PATH = os.getenv(
+    "QUOTE_STORE_PATH",
+    "/dev/shm/stock-asset-quotes" if os.path.isdir("/dev/shm") else os.path.join(DATA_DIR, "quote_store.bin"),
+)
+
+SHARED_FX_PREFIX = "fx:"   # 실시간 환율도 같은 저장소에 "fx:USDKRW" 키로 넣습니다. (price = 환율, name = 출처)
+
+# --- mmap 레이아웃 ---
+# 헤더: 매직, 레코드 수, 레코드 크기
+_HEADER = struct.Struct("<8sII")
+_MAGIC = b"QSTORE01"
+_HEADER_SIZE = 64
+# 레코드: seq, 종목코드, 종목명, 현재가, 전일 종가, 가져온 시각 | 마지막 조회 시각 (seqlock 밖에서 읽는 쪽이 갱신)
+_RECORD = struct.Struct("<I4x24s64sddd")
+_SEQ = struct.Struct("<I")
+_REQUESTED = struct.Struct("<d")
+_REQUESTED_OFFSET = _RECORD.size
+_RECORD_SIZE = 128
+_PROBE_LIMIT = 16     # 해시 충돌 시 이어서 살펴보는 최대 칸 수
+_READ_RETRIES = 100   # 쓰는 중인 레코드를 다시 읽는 최대 횟수
+
+
+class QuoteStoreError(Exception):
+    """공유 저장소를 열 수 없거나 설정이 다른 워커와 맞지 않을 때 발생합니다."""
+
+
+def _encode(text, size):
+    # 잘린 UTF-8 바이트는 읽을 때 버려지므로 길이만 맞추면 됩니다.
+    return text.encode("utf-8")[:size]
+
+
+class MmapQuoteStore:
+    name = "mmap"
+    blocking = False   # 메모리에서 바로 읽고 쓰므로 이벤트 루프에서 불러도 됨
+
+    def __init__(self, path=QUOTE_STORE_PATH, slots=QUOTE_STORE_SLOTS):
+        try:
+            import fcntl
+        except ImportError:
+            raise QuoteStoreError("mmap 저장소는 flock을 지원하는 OS(리눅스/macOS)에서만 쓸 수 있습니다.")
+        self._fcntl = fcntl
+        self.path = path
+        self.slots = slots
+        size = _HEADER_SIZE + slots * _RECORD_SIZE
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_lock = threading.Lock()   # flock은 같은 프로세스의 스레드끼리는 막지 못하므로 함께 씁니다.
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            # 여러 워커가 동시에 떠도 초기화는 한 번만 됩니다.
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(_MAGIC, slots, _RECORD_SIZE), 0)
+            magic, file_slots, record_size = _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0))
+            if magic != _MAGIC or file_slots != slots or record_size != _RECORD_SIZE:
+                raise QuoteStoreError(f"{path}의 형식이 현재 설정(QUOTE_STORE_SLOTS={slots})과 다릅니다. "
+                                      f"모든 워커를 멈추고 파일을 지운 뒤 다시 시작하세요.")
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._mm = mmap.mmap(self._fd, size)
+        self._leader_fd = None
+
+        self.reads = 0
+        self.retries = 0
+        self.writes = 0
+
+    def _offset(self, index):
+        return _HEADER_SIZE + (index % self.slots) * _RECORD_SIZE
+
+    def _candidates(self, key):
+        start = zlib.crc32(key)
+        return (self._offset(start + probe) for probe in range(_PROBE_LIMIT))
+
+    def _read_record(self, offset):
+        """seqlock 읽기: 쓰는 중(seq 홀수)이거나 읽는 동안 seq가 바뀌었으면 다시 읽습니다."""
+        mm = self._mm
+        for _ in range(_READ_RETRIES):
+            seq = _SEQ.unpack_from(mm, offset)[0]
+            if not seq & 1:
+                record = _RECORD.unpack_from(mm, offset)
+                if _SEQ.unpack_from(mm, offset)[0] == seq:
+                    return record
+            self.retries += 1
+        return None
+
+    def get_many(self, symbols):
+        """{symbol: (quote, fetched_at)} (없는 종목은 빠짐). 락을 잡지 않습니다."""
+        now = time.time()
+        result = {}
+        for symbol in symbols:
+            key = _encode(symbol, 24)
+            for offset in self._candidates(key):
+                record = self._read_record(offset)
+                if record is None:
+                    break
+                _, code, name, price, prev_close, fetched_at = record
+                code = code.rstrip(b"\0")
+                if not code:
+                    break
+                if code != key:
+                    continue
+                result[symbol] = ({
+                    "price": price,
+                    "prev_close": prev_close,
+                    "name": name.rstrip(b"\0").decode("utf-8", "ignore") or symbol,
+                }, fetched_at)
+                # 리더가 미리 갱신할 종목을 고를 수 있도록 조회 시각을 남깁니다. (1초에 한 번만 씀)
+                if now - _REQUESTED.unpack_from(self._mm, offset + _REQUESTED_OFFSET)[0] > 1:
+                    _REQUESTED.pack_into(self._mm, offset + _REQUESTED_OFFSET, now)
+                break
+        self.reads += len(symbols)
+        return result
+
+    def put_many(self, quotes, fetched_at):
+        """{symbol: quote}를 씁니다. 자리가 없으면 살펴본 칸 중 가장 오래된 종목을 밀어냅니다."""
+        fcntl = self._fcntl
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for symbol, quote in quotes.items():
+                    self._write_locked(symbol, quote, fetched_at)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _write_locked(self, symbol, quote, fetched_at):
+        mm = self._mm
+        key = _encode(symbol, 24)
+        target, oldest, new = None, None, False
+        for offset in self._candidates(key):
+            code = _RECORD.unpack_from(mm, offset)[1].rstrip(b"\0")
+            if code == key:
+                target = offset
+                break
+            if not code:
+                target, new = offset, True
+                break
+            fetched = _RECORD.unpack_from(mm, offset)[5]
+            if oldest is None or fetched < oldest[0]:
+                oldest = (fetched, offset)
+        if target is None:
+            target, new = oldest[1], True
+
+        seq = _SEQ.unpack_from(mm, target)[0]
+        _SEQ.pack_into(mm, target, (seq + 1) & 0xFFFFFFFF)    # 홀수: 쓰는 중
+        _RECORD.pack_into(mm, target, (seq + 1) & 0xFFFFFFFF, key, _encode(quote.get("name") or "", 64),
+                          float(quote["price"]), float(quote["prev_close"]), fetched_at)
+        if new:
+            _REQUESTED.pack_into(mm, target + _REQUESTED_OFFSET, fetched_at)
+        _SEQ.pack_into(mm, target, (seq + 2) & 0xFFFFFFFF)
+        self.writes += 1
+
+    def due_symbols(self, idle_seconds=QUOTE_STORE_IDLE_SECONDS):
+        """최근 idle_seconds 안에 조회된 종목의 [(symbol, age)]"""
+        now = time.time()
+        due = []
+        for index in range(self.slots):
+            offset = self._offset(index)
+            record = self._read_record(offset)
+            if record is None or not record[1].rstrip(b"\0"):
+                continue
+            requested = _REQUESTED.unpack_from(self._mm, offset + _REQUESTED_OFFSET)[0]
+            if now - requested < idle_seconds:
+                due.append((record[1].rstrip(b"\0").decode(), now - record[5]))
+        return due
+
+    def try_lead(self):
+        """리더 파일에 flock을 잡으면 이 프로세스가 리더입니다. (프로세스가 끝나면 OS가 풀어 줌)"""
+        if self._leader_fd is not None:
+            return True
+        fcntl = self._fcntl
+        fd = os.open(self.path + ".leader", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._leader_fd = fd
+        return True
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "slots": self.slots,
+            "leader": self._leader_fd is not None,
+            "reads": self.reads,
+            "read_retries": self.retries,
+            "writes": self.writes,
+        }
+
+
+class RedisQuoteStore:
+    name = "redis"
+    blocking = True    # 호출마다 네트워크 왕복이 있으므로 이벤트 루프에서는 스레드로 넘김 (run_store)
+    LEADER_TTL = 30   # 리더가 이 시간(초) 안에 갱신하지 못하면 다른 워커가 이어받음
+
+    def __init__(self, url, prefix="quote:"):
+        try:
+            import redis
+        except ImportError:
+            raise QuoteStoreError("QUOTE_STORE에 redis 주소를 쓰려면 redis 패키지를 설치하세요. (pip install redis)")
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._worker_id = f"{os.uname().nodename if hasattr(os, 'uname') else 'host'}:{os.getpid()}"
+        self._leader = False
+        self.reads = 0
+        self.writes = 0
+
+    def _mget(self, symbols):
+        """조회 시각(requested)은 건드리지 않고 저장된 시세만 읽습니다. {symbol: (quote, fetched_at)}"""
+        values = self._redis.mget([self.prefix + s for s in symbols])
+        result = {}
+        for symbol, raw in zip(symbols, values):
+            if raw is not None:
+                entry = json.loads(raw)
+                result[symbol] = (entry["quote"], entry["fetched_at"])
+        return result
+
+    def get_many(self, symbols):
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        result = self._mget(symbols)
+        if result:
+            now = time.time()
+            self._redis.zadd(self.prefix + "requested", {symbol: now for symbol in result})
+        self.reads += len(symbols)
+        return result
+
+    def put_many(self, quotes, fetched_at):
+        pipe = self._redis.pipeline(transaction=False)
+        for symbol, quote in quotes.items():
+            # 오래 아무도 갱신하지 않은 종목은 Redis가 알아서 지우게 합니다.
+            pipe.set(self.prefix + symbol, json.dumps({"quote": quote, "fetched_at": fetched_at}),
+                     ex=int(QUOTE_STORE_IDLE_SECONDS * 2) + 600)
+        pipe.execute()
+        self.writes += len(quotes)
+
+    def due_symbols(self, idle_seconds=QUOTE_STORE_IDLE_SECONDS):
+        now = time.time()
+        key = self.prefix + "requested"
+        self._redis.zremrangebyscore(key, 0, now - idle_seconds)
+        symbols = [s.decode() for s in self._redis.zrange(key, 0, -1)]
+        # 리더의 갱신 작업이 읽는 것은 조회가 아니므로 get_many를 쓰지 않습니다. (쓰면 아무도 보지 않는 종목도 계속 갱신됨)
+        stored = self._mget(symbols) if symbols else {}
+        return [(s, now - stored[s][1] if s in stored else float("inf")) for s in symbols]
+
+    def try_lead(self):
+        key = self.prefix + "leader"
+        if self._redis.set(key, self._worker_id, nx=True, ex=self.LEADER_TTL):
+            self._leader = True
+        else:
+            current = self._redis.get(key)
+            self._leader = current is not None and current.decode() == self._worker_id
+            if self._leader:
+                self._redis.expire(key, self.LEADER_TTL)
+        return self._leader
+
+    def stats(self):
+        return {"backend": self.name, "leader": self._leader, "reads": self.reads, "writes": self.writes}
+
+
+async def run_store(store, func, *args):
+    """이벤트 루프에서 저장소를 쓰는 func(*args)를 부릅니다. 네트워크를 타는 저장소(redis)면 스레드에서 실행합니다."""
+    if store is not None and store.blocking:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+def create_store(spec=QUOTE_STORE):
+    """QUOTE_STORE 값으로 저장소를 만듭니다. local이면 None (공유하지 않음)"""
+    if not spec or spec == "local":
+        return None
+    if spec == "mmap":
+        return MmapQuoteStore()
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQuoteStore(spec)
+    raise QuoteStoreError(f"알 수 없는 QUOTE_STORE 값입니다: {spec} (local / mmap / redis://...)")
+
+
+# API 서버 전체가 함께 쓰는 공유 저장소 (QUOTE_STORE=local이면 None)
+quote_store = create_store()
@@ -0,0 +1,130 @@
+"""
+웹소켓 실시간 시세 스트림 (/ws/quotes)
+
+클라이언트가 관심 종목을 구독하면, 서버의 폴러 하나가 모든 구독 종목의 시세를 주기적으로 가져와
+값이 바뀐 종목만 해당 종목을 구독한 클라이언트에게 보냅니다(delta).
+대시보드가 몇 개 열려 있든 야후 호출량은 구독 종목 수와 QUOTE_STREAM_INTERVAL로만 정해집니다.
+
+클라이언트 -> 서버
+    {"action": "subscribe", "symbols": ["AAPL", "005930.KS"]}
+    {"action": "unsubscribe", "symbols": ["AAPL"]}
+서버 -> 클라이언트
+    {"type": "snapshot", "quotes": {...}}   # 구독 직후, 이미 알고 있는 시세
+    {"type": "delta", "quotes": {...}}      # 바뀐 종목만
+    {"type": "error", "message": "..."}
+"""
+import os
+import time
+import asyncio
+
+from api.market_data import get_quotes
+
+QUOTE_STREAM_INTERVAL = float(os.getenv("QUOTE_STREAM_INTERVAL", "5"))  # 폴링 주기(초)
+MAX_SYMBOLS_PER_CLIENT = 200
+SEND_TIMEOUT = 5.0   # 느린 클라이언트 하나가 전체 전송을 막지 않도록 하는 제한(초)
+
+
+def _message(quotes):
+    return {
+        symbol: {**quote, "age": round(age, 1)}
+        for symbol, (quote, age) in quotes.items()
+    }
+
+
+class QuoteHub:
+    def __init__(self, interval=QUOTE_STREAM_INTERVAL):
+        self.interval = interval
+        self._subs = {}        # websocket -> set(symbol)
+        self._last = {}        # symbol -> (quote, fetched_at) 마지막으로 내보낸 값
+        self._wakeup = asyncio.Event()
+        self.polls = 0
+        self.deltas_sent = 0
+
+    def _symbols(self):
+        symbols = set()
+        for subs in self._subs.values():
+            symbols |= subs
+        return symbols
+
+    async def subscribe(self, websocket, symbols):
+        subs = self._subs.setdefault(websocket, set())
+        new = [s for s in symbols if s not in subs]
+        if len(subs) + len(new) > MAX_SYMBOLS_PER_CLIENT:
+            await websocket.send_json({"type": "error", "message": f"구독은 최대 {MAX_SYMBOLS_PER_CLIENT}종목까지 가능합니다."})
+            return
+        subs.update(new)
+
+        now = time.time()
+        known = {s: (self._last[s][0], now - self._last[s][1]) for s in new if s in self._last}
+        await websocket.send_json({"type": "snapshot", "quotes": _message(known)})
+        if len(known) < len(new):
+            # 처음 보는 종목은 다음 주기를 기다리지 않고 바로 가져오도록 폴러를 깨웁니다.
+            self._wakeup.set()
+
+    def unsubscribe(self, websocket, symbols=None):
+        if symbols is None:
+            self._subs.pop(websocket, None)
+        elif websocket in self._subs:
+            self._subs[websocket].difference_update(symbols)
+        # 아무도 구독하지 않는 종목은 비교 기준에서도 뺍니다.
+        active = self._symbols()
+        for symbol in list(self._last):
+            if symbol not in active:
+                del self._last[symbol]
+
+    async def _send(self, websocket, payload):
+        try:
+            await asyncio.wait_for(websocket.send_json(payload), SEND_TIMEOUT)
+        except Exception:
+            # 끊어졌거나 너무 느린 클라이언트는 구독 목록에서 제외합니다.
+            self.unsubscribe(websocket)
+
+    async def poll_once(self):
+        symbols = self._symbols()
+        if not symbols:
+            return
+        self.polls += 1
+        quotes = await get_quotes(sorted(symbols))
+
+        now = time.time()
+        changed = {}
+        for symbol, (quote, age) in quotes.items():
+            last = self._last.get(symbol)
+            if last is None or last[0]["price"] != quote["price"] or last[0]["prev_close"] != quote["prev_close"]:
+                changed[symbol] = (quote, age)
+            self._last[symbol] = (quote, now - age)
+        if not changed:
+            return
+
+        sends = []
+        for websocket, subs in list(self._subs.items()):
+            delta = {s: changed[s] for s in subs if s in changed}
+            if delta:
+                sends.append(self._send(websocket, {"type": "delta", "quotes": _message(delta)}))
+        self.deltas_sent += len(sends)
+        await asyncio.gather(*sends)
+
+    async def run(self):
+        """서버가 떠 있는 동안 도는 단일 폴러"""
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.poll_once()
+            except Exception as e:
+                print(f"시세 스트림 폴링 실패: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        return {
+            "clients": len(self._subs),
+            "symbols": len(self._symbols()),
+            "interval": self.interval,
+            "polls": self.polls,
+            "deltas_sent": self.deltas_sent,
+        }
+
+
+quote_hub = QuoteHub()
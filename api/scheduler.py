@@ -0,0 +1,91 @@
+"""
+API 서버 안의 주기 작업 스케줄러
+
+환율 스냅샷, 잔고 스냅샷, 트렌딩 종목처럼 요청과 상관없이 주기적으로 돌아야 하는 작업을 한곳에서 관리합니다.
+작업마다 따로 루프를 돌리므로 느린 작업(야후 검색 등)이 다른 작업을 늦추지 않으며,
+같은 작업은 이전 실행이 끝난 뒤 interval만큼 쉬었다가 다시 실행되어 겹쳐 돌지 않습니다.
+실행 현황은 /monitor/scheduler에서 볼 수 있습니다.
+"""
+import time
+import asyncio
+
+
+class Job:
+    def __init__(self, name, interval, func, initial_delay=0.0):
+        self.name = name
+        self.interval = interval
+        self.func = func                  # 인자 없는 async 함수
+        self.initial_delay = initial_delay
+        self.runs = 0
+        self.failures = 0
+        self.last_started = None
+        self.last_duration = None
+        self.last_error = None
+        self._wakeup = asyncio.Event()
+
+    async def run_once(self):
+        self.last_started = time.time()
+        started = time.monotonic()
+        try:
+            await self.func()
+            self.last_error = None
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"[스케줄러] {self.name} 실패: {e}")
+        finally:
+            self.runs += 1
+            self.last_duration = time.monotonic() - started
+
+    async def loop(self):
+        if self.initial_delay:
+            await asyncio.sleep(self.initial_delay)
+        while True:
+            self._wakeup.clear()
+            await self.run_once()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def trigger(self):
+        """다음 주기를 기다리지 않고 바로 한 번 더 실행하게 합니다."""
+        self._wakeup.set()
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started": self.last_started,
+            "last_duration": round(self.last_duration, 3) if self.last_duration is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self._jobs = {}
+        self._tasks = []
+
+    def add(self, name, interval, func, initial_delay=0.0):
+        self._jobs[name] = Job(name, interval, func, initial_delay)
+
+    def trigger(self, name):
+        self._jobs[name].trigger()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(job.loop(), name=f"job-{job.name}") for job in self._jobs.values()]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self):
+        return {name: job.stats() for name, job in self._jobs.items()}
+
+
+# API 서버 전체가 함께 쓰는 스케줄러
+scheduler = Scheduler()
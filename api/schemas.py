@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+
+
+# 매수 요청을 받을 때 사용할 데이터 규격
+# 길이 제한은 trades 테이블 컬럼(VARCHAR(20), VARCHAR(3))과 같습니다. 대기열 모드는 응답한 뒤에 저장하므로 미리 걸러야 합니다.
+class TradeCreate(BaseModel):
+    stock_code: str = Field(min_length=1, max_length=20)
+    quantity: float = Field(allow_inf_nan=False)
+    price: float = Field(allow_inf_nan=False)
+    currency: str = Field(min_length=3, max_length=3)
+
+
+# 대량 가져오기(/trades/bulk, api/bulk_import.py)의 한 줄 규격
+# 증권사 거래내역을 옮겨 오는 용도라 거래 시각과 매수/매도 구분을 함께 받습니다.
+class TradeImportRow(TradeCreate):
+    trade_type: Optional[Literal["BUY", "SELL"]] = None  # 없으면 수량 부호로 판단 (음수 = 매도)
+    trade_date: Optional[datetime] = None                 # 없으면 가져온 시각으로 기록
+
+    @model_validator(mode="after")
+    def normalize(self):
+        if self.quantity == 0:
+            raise ValueError("quantity는 0이 될 수 없습니다.")
+        if self.price < 0:
+            raise ValueError("price는 음수가 될 수 없습니다.")
+        if self.trade_type is None:
+            self.trade_type = "SELL" if self.quantity < 0 else "BUY"
+        # 저장 규칙은 /trades/sell과 같습니다: 매도는 음수 수량
+        self.quantity = -abs(self.quantity) if self.trade_type == "SELL" else abs(self.quantity)
+        self.currency = self.currency.upper()
+        return self
@@ -0,0 +1,238 @@
+"""
+종목 마스터와 로컬 검색 색인 (/market/search, /market/list)
+
+종목 정보(코드, 영문명, 한글명, 거래소, 통화)는 두 곳에서 읽습니다.
+- api/symbols_seed.csv: 저장소에 함께 들어 있는 기본 종목 목록
+- data/symbol_master.json: 야후 검색 등으로 새로 알게 된 종목 (서버가 자동으로 추가/저장)
+
+메모리에는 정렬된 접두어 색인과 2-gram 색인을 두어, 야후를 부르지 않고
+코드/영문명/한글명의 접두어 검색과 오타가 섞인 유사 검색을 1ms 이내로 처리합니다.
+"""
+import os
+import csv
+import json
+import bisect
+import heapq
+import threading
+import unicodedata
+from collections import Counter
+
+from api.symbol_meta import DATA_DIR
+
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "symbols_seed.csv")
+LEARNED_FILE = os.path.join(DATA_DIR, "symbol_master.json")
+FIELDS = ("code", "name", "name_ko", "exchange", "currency")
+
+PREFIX_SCAN_LIMIT = 500   # 짧은 접두어(예: "a")에서 살펴볼 최대 후보 수
+FUZZY_MIN_SCORE = 0.4     # 유사 검색으로 인정하는 최소 2-gram 일치도 (0~1)
+FUZZY_CANDIDATES = 200    # 유사도를 자세히 계산할 최대 후보 수 (2-gram이 많이 겹치는 순)
+
+
+def normalize(text):
+    """검색 비교용 문자열: 소문자, 전각/반각 통일, 공백과 기호 제거 (한글은 그대로)"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def _grams(text):
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class SymbolMaster:
+    def __init__(self, seed_path=SEED_FILE, learned_path=LEARNED_FILE):
+        self.seed_path = seed_path
+        self.learned_path = learned_path
+        self._lock = threading.Lock()
+        self._entries = []        # id -> 종목 딕셔너리
+        self._by_code = {}        # 코드 -> id
+        self._learned = set()     # 파일로 저장할(시드에 없던) 종목 코드
+        self._prefix = []         # 정렬된 (검색 키, id) 목록
+        self._grams = {}          # 2-gram -> {id, ...}
+        self._key_grams = {}      # id -> [(검색 키, 2-gram 집합), ...]
+        self._code_keys = {}      # id -> 코드로 만든 검색 키 (접두어 점수 구분용)
+        self._load()
+
+    # --- 적재와 저장 ---
+    def _load(self):
+        try:
+            with open(self.seed_path, encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    self._add_locked(row)
+        except FileNotFoundError:
+            print(f"기본 종목 파일이 없습니다: {self.seed_path}")
+        try:
+            with open(self.learned_path, encoding="utf-8") as f:
+                for row in json.load(f):
+                    if self._add_locked(row):
+                        self._learned.add(row["code"])
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"종목 마스터 파일 읽기 실패: {e}")
+
+    def _save(self):
+        with self._lock:
+            rows = [self._entries[self._by_code[code]] for code in sorted(self._learned)]
+        try:
+            os.makedirs(os.path.dirname(self.learned_path), exist_ok=True)
+            tmp = self.learned_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(rows, f, ensure_ascii=False)
+            os.replace(tmp, self.learned_path)
+        except Exception as e:
+            print(f"종목 마스터 저장 실패: {e}")
+
+    # --- 색인 ---
+    def _keys(self, entry):
+        """종목 하나의 검색 키: 코드, 거래소 접미사를 뗀 코드, 영문/한글 이름 전체와 단어별"""
+        code = entry["code"]
+        keys = {normalize(code), normalize(code.split(".")[0])}
+        for field in ("name", "name_ko"):
+            value = entry.get(field) or ""
+            keys.add(normalize(value))
+            keys.update(normalize(word) for word in value.split())
+        keys.discard("")
+        return keys
+
+    def _index_locked(self, entry_id):
+        entry = self._entries[entry_id]
+        self._key_grams[entry_id] = []
+        self._code_keys[entry_id] = {normalize(entry["code"]), normalize(entry["code"].split(".")[0])}
+        for key in self._keys(entry):
+            bisect.insort(self._prefix, (key, entry_id))
+            grams = _grams(key)
+            self._key_grams[entry_id].append((key, grams))
+            for gram in grams:
+                self._grams.setdefault(gram, set()).add(entry_id)
+
+    def _unindex_locked(self, entry_id):
+        for key in self._keys(self._entries[entry_id]):
+            i = bisect.bisect_left(self._prefix, (key, entry_id))
+            if i < len(self._prefix) and self._prefix[i] == (key, entry_id):
+                del self._prefix[i]
+            for gram in _grams(key):
+                ids = self._grams.get(gram)
+                if ids:
+                    ids.discard(entry_id)
+        self._key_grams.pop(entry_id, None)
+        self._code_keys.pop(entry_id, None)
+
+    def _add_locked(self, row):
+        """종목을 추가하거나 비어 있던 항목을 채웁니다. 바뀐 것이 있으면 True"""
+        code = (row.get("code") or "").strip()
+        if not code:
+            return False
+        entry = {field: (row.get(field) or "").strip() for field in FIELDS}
+        entry["code"] = code
+        entry_id = self._by_code.get(code)
+        if entry_id is None:
+            self._by_code[code] = len(self._entries)
+            self._entries.append(entry)
+            self._index_locked(len(self._entries) - 1)
+            return True
+
+        # 이미 있는 종목은 비어 있는 칸만 채웁니다. (시드의 한글명 등을 덮어쓰지 않음)
+        old = self._entries[entry_id]
+        merged = {field: old[field] or entry[field] for field in FIELDS}
+        if merged == old:
+            return False
+        self._unindex_locked(entry_id)
+        self._entries[entry_id] = merged
+        self._index_locked(entry_id)
+        return True
+
+    def merge(self, rows):
+        """야후 검색 결과 등 새로 알게 된 종목을 색인에 넣고 파일에 저장합니다."""
+        changed = False
+        with self._lock:
+            for row in rows:
+                if self._add_locked(row):
+                    self._learned.add(row["code"])
+                    changed = True
+        if changed:
+            self._save()
+        return changed
+
+    # --- 조회 ---
+    def get(self, code):
+        with self._lock:
+            entry_id = self._by_code.get(code)
+            return None if entry_id is None else self._result(self._entries[entry_id])
+
+    def catalog(self, codes=None):
+        """codes가 없으면 전체 종목, 있으면 그 종목들만 (모르는 코드는 코드만 채워서) 돌려줍니다."""
+        with self._lock:
+            if codes is None:
+                return [self._result(e) for e in self._entries]
+            return [
+                self._result(self._entries[self._by_code[code]]) if code in self._by_code
+                else {"code": code, "name": code, "name_en": "", "exchange": "", "currency": ""}
+                for code in codes
+            ]
+
+    @staticmethod
+    def _result(entry):
+        return {
+            "code": entry["code"],
+            "name": entry["name_ko"] or entry["name"] or entry["code"],
+            "name_en": entry["name"],
+            "exchange": entry["exchange"],
+            "currency": entry["currency"],
+        }
+
+    def search(self, query, limit=10):
+        """
+        점수 순으로 종목을 돌려줍니다. (각 결과의 score: 1.0 = 코드/이름 완전 일치)
+        코드/이름 완전 일치 > 코드 접두어 > 이름 접두어 > 2-gram 유사도 순입니다.
+        """
+        q = normalize(query)
+        if not q:
+            return []
+        scores = {}
+
+        def bump(entry_id, score):
+            if score > scores.get(entry_id, 0):
+                scores[entry_id] = score
+
+        with self._lock:
+            # 1. 접두어: 정렬된 키 목록에서 q로 시작하는 구간만 훑습니다.
+            i = bisect.bisect_left(self._prefix, (q,))
+            for key, entry_id in self._prefix[i:i + PREFIX_SCAN_LIMIT]:
+                if not key.startswith(q):
+                    break
+                if key == q:
+                    bump(entry_id, 1.0)
+                else:
+                    # 짧은 키일수록(검색어가 키의 더 많은 부분을 차지할수록) 높은 점수
+                    is_code = key in self._code_keys[entry_id]
+                    bump(entry_id, (0.9 if is_code else 0.8) + 0.09 * len(q) / len(key))
+
+            # 2. 유사 검색: 검색어와 2-gram이 많이 겹치는 키 (오타, 중간 단어)
+            #    접두어 결과(0.8점 이상)만으로 limit개가 차면 유사 결과(0.7점 이하)는 순위에 들 수 없으므로 생략합니다.
+            if len(q) >= 2 and len(scores) < limit:
+                q_grams = _grams(q)
+                overlap = Counter()
+                for gram in q_grams:
+                    overlap.update(self._grams.get(gram, ()))
+                candidates = heapq.nlargest(FUZZY_CANDIDATES, overlap.items(), key=lambda item: item[1])
+                for entry_id, count in candidates:
+                    if entry_id in scores or count * 2 < len(q_grams):
+                        continue
+                    best = max(2 * len(q_grams & grams) / (len(q_grams) + len(grams))
+                               for _, grams in self._key_grams[entry_id])
+                    if best >= FUZZY_MIN_SCORE:
+                        bump(entry_id, 0.7 * best)
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], len(self._entries[item[0]]["code"])))
+            return [{**self._result(self._entries[entry_id]), "score": round(score, 3)}
+                    for entry_id, score in ranked[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {"symbols": len(self._entries), "learned": len(self._learned), "keys": len(self._prefix)}
+
+
+# API 서버 전체가 함께 쓰는 종목 마스터
+symbol_master = SymbolMaster()
@@ -0,0 +1,145 @@
+"""
+종목 메타데이터(표시 이름) 캐시
+
+야후의 .info는 종목마다 무거운 HTTP 요청이 따로 나가므로 시세 요청마다 부르지 않습니다.
+한 번 알아낸 이름은 파일(data/symbol_meta.json)에 저장해 두고 재시작 후에도 재사용하며,
+META_REFRESH_DAYS가 지나면 기존 이름을 그대로 쓰면서 백그라운드에서 천천히 갱신합니다.
+파일은 종목마다 다시 쓰지 않고, 바뀐 것이 있으면 진행 중인 조회가 모두 끝났을 때(또는 META_FLUSH_SECONDS마다) 한 번에 씁니다.
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import yfinance as yf
+
+from api.upstream import yahoo
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+META_FILE = os.path.join(DATA_DIR, "symbol_meta.json")
+META_REFRESH_DAYS = float(os.getenv("META_REFRESH_DAYS", "7"))   # 이름을 다시 확인하는 주기(일)
+META_WORKERS = int(os.getenv("META_WORKERS", "8"))               # .info 조회에 쓰는 최대 스레드 수
+META_WAIT_TIMEOUT = float(os.getenv("META_WAIT_TIMEOUT", "2"))   # 응답 전에 새 이름을 기다리는 최대 시간(초)
+META_FLUSH_SECONDS = 5.0   # 조회가 계속 이어질 때도 이 간격(초)마다는 파일에 씀
+
+
+def _fetch_name(symbol):
+    info = yahoo.call(lambda: yf.Ticker(symbol, session=yahoo.session).info)
+    return info.get('shortName') or info.get('longName')
+
+
+class SymbolMetaCache:
+    def __init__(self, path=META_FILE, fetch_name=_fetch_name, workers=META_WORKERS):
+        self.path = path
+        self.fetch_name = fetch_name
+        self._meta = {}        # symbol -> {"name": ..., "updated": epoch}
+        self._pending = {}     # symbol -> Future (조회 중인 종목)
+        self._dirty = False    # 파일에 아직 쓰지 않은 변경이 있는지
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()   # 파일 쓰기는 한 번에 하나씩
+        self.writes = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="symbol-meta")
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._meta = json.load(f)
+        except FileNotFoundError:
+            self._meta = {}
+        except Exception as e:
+            print(f"종목 메타데이터 파일 읽기 실패: {e}")
+            self._meta = {}
+
+    def flush(self):
+        """바뀐 내용이 있으면 파일에 한 번 씁니다."""
+        with self._file_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = dict(self._meta)
+                self._dirty = False
+                self._flushed_at = time.monotonic()
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp = self.path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+                self.writes += 1
+            except Exception as e:
+                print(f"종목 메타데이터 저장 실패: {e}")
+                with self._lock:
+                    self._dirty = True
+
+    def remember(self, symbol, name, save=True):
+        """검색 결과 등 다른 경로로 알게 된 이름을 캐시에 넣습니다."""
+        if not name or name == symbol:
+            return
+        with self._lock:
+            self._meta[symbol] = {"name": name, "updated": time.time()}
+            self._dirty = True
+        if save:
+            self.flush()
+
+    def remember_many(self, names):
+        for symbol, name in names.items():
+            self.remember(symbol, name, save=False)
+        self.flush()
+
+    def _refresh(self, symbol):
+        try:
+            name = self.fetch_name(symbol)
+            with self._lock:
+                # 이름이 없는 종목도 심볼로 기록해 두어 매번 다시 조회하지 않게 합니다.
+                self._meta[symbol] = {"name": name or symbol, "updated": time.time()}
+                self._dirty = True
+            return name
+        except Exception as e:
+            print(f"{symbol} 종목명 조회 실패: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(symbol, None)
+                # 함께 조회하던 종목이 모두 끝났거나 마지막으로 쓴 지 오래됐으면 한 번에 씁니다.
+                due = not self._pending or time.monotonic() - self._flushed_at >= META_FLUSH_SECONDS
+            if due:
+                self.flush()
+
+    def _schedule_locked(self, symbol):
+        future = self._pending.get(symbol)
+        if future is None:
+            future = self._executor.submit(self._refresh, symbol)
+            self._pending[symbol] = future
+        return future
+
+    def resolve_names(self, symbols, timeout=META_WAIT_TIMEOUT):
+        """
+        {symbol: name}을 돌려줍니다.
+        처음 보는 종목은 워커 풀에서 동시에 조회하고 timeout까지만 기다립니다.
+        그 안에 못 구한 이름은 심볼로 대신하고, 조회는 백그라운드에서 계속되어 다음 요청부터 반영됩니다.
+        """
+        names = {}
+        missing = {}
+        stale_before = time.time() - META_REFRESH_DAYS * 86400
+        with self._lock:
+            for symbol in symbols:
+                meta = self._meta.get(symbol)
+                if meta is None:
+                    missing[symbol] = self._schedule_locked(symbol)
+                    continue
+                names[symbol] = meta["name"]
+                if meta["updated"] < stale_before:
+                    self._schedule_locked(symbol)
+
+        if missing:
+            wait(list(missing.values()), timeout=timeout)
+            for symbol, future in missing.items():
+                name = future.result() if future.done() else None
+                names[symbol] = name or symbol
+        return names
+
+
+# API 서버 전체가 함께 쓰는 메타데이터 캐시
+symbol_meta = SymbolMetaCache()
@@ -0,0 +1,74 @@
+"""
+거래 기록 조회와 내보내기 (GET /trades, GET /trades/export)
+
+목록은 (trade_date, id) 키셋 페이지네이션입니다. 응답의 next_cursor를 다음 요청의 cursor로 넘기면
+마지막으로 받은 행 다음부터 이어서 읽으므로, 페이지가 뒤로 가도 OFFSET처럼 앞 행을 다시 훑지 않습니다.
+
+내보내기는 서버 측 커서(common.database.iter_trades)에서 묶음 단위로 읽어 CSV / NDJSON으로 바로 흘려보내므로
+거래가 수백만 건이어도 메모리에는 한 묶음만 올라옵니다. DB 읽기는 DB 스레드 풀에서 합니다.
+"""
+import io
+import csv
+import json
+import base64
+from datetime import datetime
+from decimal import Decimal
+
+from common.database import TRADE_COLUMNS, iter_trades, run_db
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class InvalidCursor(Exception):
+    """cursor 값을 해석할 수 없을 때 발생합니다."""
+
+
+def encode_cursor(row):
+    """목록의 마지막 행으로 다음 페이지 cursor를 만듭니다. (클라이언트는 값을 해석하지 않고 그대로 돌려주면 됨)"""
+    raw = f"{row['trade_date'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """cursor -> (trade_date, id)"""
+    try:
+        trade_date, trade_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(trade_date), int(trade_id)
+    except Exception:
+        raise InvalidCursor("cursor 값이 올바르지 않습니다.")
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__}는 JSON으로 바꿀 수 없습니다.")
+
+
+def _format_chunk(rows, fmt):
+    if fmt == "ndjson":
+        return "".join(json.dumps(dict(zip(TRADE_COLUMNS, row)), default=_json_value) + "\n" for row in rows)
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerows((*row[:-1], row[-1].isoformat()) for row in rows)
+    return out.getvalue()
+
+
+async def stream_export(fmt, **filters):
+    """조건에 맞는 거래를 오래된 순으로 fmt(csv/ndjson) 텍스트 조각으로 내보내는 async 제너레이터"""
+    chunks = iter_trades(**filters)
+    try:
+        if fmt == "csv":
+            yield ",".join(TRADE_COLUMNS) + "\n"
+        while True:
+            rows = await run_db(next, chunks, None)
+            if rows is None:
+                break
+            yield _format_chunk(rows, fmt)
+    finally:
+        # 다운로드가 중간에 끊겨도 서버 측 커서와 커넥션을 바로 정리합니다.
+        await run_db(chunks.close)
@@ -0,0 +1,423 @@
+"""
+거래 저장 대기열 (TRADE_INGEST=queue일 때만 사용)
+
+기본(sync)은 POST /trades 요청마다 DB에 저장하고 커밋합니다. 자동 매매 전략의 체결 내역처럼 거래가 몰려 들어올 때는
+queue 모드로 켜서, 거래를 먼저 로컬 대기열 파일(JSON Lines, 추가만 함)에 쓰고 디스크에 확실히 기록(fsync)되면 202로 응답합니다.
+동시에 들어온 요청들은 fsync 한 번으로 함께 기록되고, 스케줄러 작업(trade-queue)이 대기열을 TRADE_QUEUE_BATCH개씩
+트랜잭션 하나로 DB에 저장합니다. (common.database.insert_trades_batch)
+
+- 거래마다 멱등 키(Idempotency-Key 헤더, 없으면 서버가 만듦)가 붙고 trades.idempotency_key가 UNIQUE라서
+  클라이언트 재시도나 서버가 죽었다 살아나며 대기열을 다시 처리해도 같은 거래가 두 번 저장되지 않습니다.
+- 응답한 뒤에 저장하므로 컬럼 길이 같은 제약은 대기열에 넣기 전에 확인합니다. (check_record)
+  그래도 DB가 거부한 묶음은 한 건씩 다시 저장해 보고, 끝내 거부된 거래만 데드레터 파일(queue-N.dead.jsonl)로 옮긴 뒤
+  failed 상태로 남깁니다. 잘못된 거래 하나가 대기열 전체를 막지 않습니다. (DB 연결 오류는 다음 주기에 다시 시도)
+- 어디까지 저장했는지는 .offset 파일에 기록하고, 모두 저장되면 대기열 파일을 비웁니다.
+- uvicorn 워커마다 잠글 수 있는 슬롯 파일(queue-N.jsonl)을 하나씩 쓰고, 재시작하면 남아 있던 거래부터 저장합니다.
+  워커 수가 줄어 아무도 잠그지 않은 슬롯에 거래가 남아 있으면, 시작할 때와 TRADE_QUEUE_ORPHAN_SECONDS마다
+  그 슬롯을 잠깐 잠가 대신 저장합니다.
+- 처리 상태는 GET /trades/status/{key}로 확인합니다. (queued: 대기열에 있음, committed: DB에 저장됨, failed: DB가 거부함)
+  다른 워커가 받은 거래는 DB에 저장된 뒤부터 보입니다.
+"""
+import os
+import glob
+import json
+import math
+import time
+import uuid
+import fcntl
+import asyncio
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from common.database import insert_trades_batch, get_trade_by_idempotency_key, run_db, ROW_REJECTED_ERRORS
+from api.symbol_meta import DATA_DIR
+
+TRADE_INGEST = os.getenv("TRADE_INGEST", "sync").lower()                              # sync: 요청마다 저장 / queue: 대기열
+TRADE_QUEUE_DIR = os.getenv("TRADE_QUEUE_DIR", os.path.join(DATA_DIR, "trade_queue"))  # 대기열 파일 위치
+TRADE_QUEUE_BATCH = int(os.getenv("TRADE_QUEUE_BATCH", "500"))                       # 트랜잭션 하나에 저장하는 거래 수
+TRADE_QUEUE_COMMIT_SECONDS = float(os.getenv("TRADE_QUEUE_COMMIT_SECONDS", "1"))     # 새 거래가 없어도 대기열을 확인하는 주기(초)
+TRADE_QUEUE_ORPHAN_SECONDS = float(os.getenv("TRADE_QUEUE_ORPHAN_SECONDS", "30"))    # 주인 없는 슬롯을 찾아 저장하는 주기(초)
+TRADE_QUEUE_SLOTS = 64        # 동시에 대기열을 쓸 수 있는 최대 워커 수
+TRADE_STATUS_KEEP = 100_000   # 메모리에 기억해 두는 최근 처리 결과(committed/failed) 수. queued는 저장될 때까지 모두 기억함
+
+# trades 테이블 컬럼 길이 (schemas.TradeCreate와 같은 제한)
+STOCK_CODE_MAX = 20
+CURRENCY_LENGTH = 3
+
+
+def check_record(stock_code, quantity, price, currency):
+    """DB가 거부할 거래를 대기열에 넣기 전에 걸러 냅니다. 잘못되면 ValueError"""
+    if not stock_code or len(stock_code) > STOCK_CODE_MAX:
+        raise ValueError(f"stock_code는 1~{STOCK_CODE_MAX}자여야 합니다: {stock_code!r}")
+    if not currency or len(currency) != CURRENCY_LENGTH:
+        raise ValueError(f"currency는 {CURRENCY_LENGTH}자여야 합니다: {currency!r}")
+    if not (math.isfinite(quantity) and math.isfinite(price)):
+        raise ValueError("quantity와 price는 유한한 숫자여야 합니다.")
+
+
+class _Slot:
+    """슬롯 하나의 파일들 (대기열, 저장 위치, 잠금, 데드레터)"""
+
+    def __init__(self, directory, number):
+        base = os.path.join(directory, f"queue-{number}")
+        self.number = number
+        self.queue_path = base + ".jsonl"
+        self.offset_path = base + ".offset"
+        self.lock_path = base + ".lock"
+        self.dead_path = base + ".dead.jsonl"
+        self.offset = 0              # DB 저장이 끝난 위치 (바이트)
+        self._lock_file = None
+
+    def try_lock(self):
+        """다른 프로세스가 잡고 있지 않으면 잠그고 True (프로세스가 끝나면 풀림)"""
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def unlock(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def size(self):
+        try:
+            return os.path.getsize(self.queue_path)
+        except FileNotFoundError:
+            return 0
+
+    def load(self):
+        """저장 위치를 읽고, 쓰는 도중에 죽어 끝에 남은 반쪽 줄을 잘라 냅니다. 저장되지 않은 부분을 돌려줍니다."""
+        try:
+            with open(self.offset_path) as f:
+                self.offset = int(f.read().strip() or 0)
+        except FileNotFoundError:
+            self.offset = 0
+        try:
+            with open(self.queue_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            # 응답하지 않은 거래이므로 클라이언트가 다시 보냅니다.
+            os.truncate(self.queue_path, complete)
+        if self.offset > complete:
+            self.offset = 0
+        return data[self.offset:complete]
+
+    def read_batch(self, batch_size):
+        """저장되지 않은 줄을 최대 batch_size개 읽어 (줄 묶음, 그 다음 위치)를 돌려줍니다."""
+        with open(self.queue_path, "rb") as f:
+            f.seek(self.offset)
+            lines = []
+            end = self.offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break   # 아직 쓰는 중인 줄
+                lines.append(line)
+                end += len(line)
+                if len(lines) >= batch_size:
+                    break
+        return b"".join(lines), end
+
+    def write_offset(self, offset):
+        # fsync는 하지 않습니다. 위치가 뒤로 돌아가도 이미 저장된 거래는 멱등 키로 걸러집니다.
+        tmp = self.offset_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def advance(self, end):
+        """end까지 저장됐다고 기록합니다. (이 슬롯에 거래를 추가하는 쪽과 겹치지 않게 불러야 함)"""
+        self.offset = end
+        if self.size() == end:
+            # 모두 저장됐으면 파일을 비웁니다. 위치를 먼저 0으로 써 두어야 중간에 죽어도 거래를 건너뛰지 않습니다.
+            self.write_offset(0)
+            os.truncate(self.queue_path, 0)
+            self.offset = 0
+        else:
+            self.write_offset(end)
+
+    def dead_letter(self, record, error):
+        line = json.dumps({"record": record, "error": error, "failed_at": datetime.now().isoformat()},
+                          ensure_ascii=False) + "\n"
+        with open(self.dead_path, "ab") as f:
+            f.write(line.encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class TradeQueue:
+    def __init__(self, directory=TRADE_QUEUE_DIR, batch_size=TRADE_QUEUE_BATCH):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.slot = None
+        self._slot = None            # 이 워커가 잠근 슬롯
+        self._file = None            # 추가 전용으로 연 대기열 파일
+        self._write_lock = threading.Lock()
+        self._pending = []           # fsync를 기다리는 (줄, future)
+        self._flush_task = None
+        self._queued = {}                # key -> 상태 (DB에 저장될 때까지 지우지 않음)
+        self._finished = OrderedDict()   # key -> 상태 (committed/failed, 최근 TRADE_STATUS_KEEP개)
+        self._orphans_checked_at = 0.0
+
+        self.accepted = 0
+        self.committed = 0
+        self.duplicates = 0          # 같은 키로 다시 들어와 대기열에 넣지 않은 요청
+        self.fsyncs = 0
+        self.batches = 0
+        self.corrupt = 0             # 읽을 수 없어 건너뛴 줄
+        self.dead_lettered = 0       # DB가 거부해 데드레터 파일로 옮긴 거래
+        self.orphans_drained = 0     # 주인 없는 슬롯에서 대신 저장한 거래
+        self.last_error = None
+
+    def open(self):
+        """잠글 수 있는 첫 슬롯의 대기열 파일을 열고, 저장되지 않고 남은 거래를 다시 queued로 표시합니다."""
+        os.makedirs(self.directory, exist_ok=True)
+        for number in range(TRADE_QUEUE_SLOTS):
+            slot = _Slot(self.directory, number)
+            if slot.try_lock():
+                self.slot, self._slot = number, slot
+                break
+        else:
+            raise RuntimeError(f"사용할 수 있는 거래 대기열 슬롯이 없습니다. ({TRADE_QUEUE_SLOTS}개 모두 사용 중)")
+
+        self._file = open(self._slot.queue_path, "ab")
+        for record in self._parse(self._slot.load()):
+            self._remember(record["idempotency_key"], "queued")
+        self._load_dead_letters()
+        self._orphans_checked_at = 0.0   # 첫 저장 주기에 주인 없는 슬롯부터 확인
+
+    def _load_dead_letters(self):
+        # 재시작한 뒤에도 DB가 거부한 거래의 상태를 failed로 조회할 수 있게 합니다.
+        for path in sorted(glob.glob(os.path.join(self.directory, "queue-*.dead.jsonl"))):
+            with open(path, "rb") as f:
+                for entry in self._parse(f.read()):
+                    self._remember(entry["record"]["idempotency_key"], "failed", error=entry["error"])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._slot.unlock()
+            self._file = None
+
+    def _remember(self, key, status, trade_id=None, error=None):
+        state = {"status": status, "trade_id": trade_id}
+        if error is not None:
+            state["error"] = error
+        if status == "queued":
+            self._queued[key] = state
+            return
+        self._queued.pop(key, None)
+        self._finished[key] = state
+        self._finished.move_to_end(key)
+        while len(self._finished) > TRADE_STATUS_KEEP:
+            self._finished.popitem(last=False)
+
+    def _known(self, key):
+        return self._queued.get(key) or self._finished.get(key)
+
+    # --- 받기: 대기열 파일에 쓰고 fsync ---
+    def _append(self, lines):
+        with self._write_lock:
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+
+    async def _flush(self):
+        # fsync가 도는 동안 들어온 요청은 다음 fsync에 함께 실립니다. (그룹 커밋)
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._append, [line for line, _ in batch])
+                error = None
+            except Exception as e:
+                error = e
+            for _, future in batch:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+        self._flush_task = None
+
+    async def submit(self, stock_code, quantity, price, currency, trade_type, idempotency_key=None):
+        """
+        거래를 대기열에 넣고 디스크에 기록될 때까지 기다립니다. (key, 상태 dict)를 돌려줍니다.
+        같은 키가 이미 대기열에 있거나 처리됐다면 다시 넣지 않고 그 상태를 돌려줍니다.
+        DB가 거부할 거래(컬럼 길이 초과 등)는 ValueError로 받지 않습니다.
+        """
+        key = idempotency_key or uuid.uuid4().hex
+        known = self._known(key)
+        if known is not None:
+            self.duplicates += 1
+            return key, dict(known)
+        check_record(stock_code, quantity, price, currency)
+
+        record = {
+            "idempotency_key": key,
+            "stock_code": stock_code,
+            "quantity": quantity,
+            "price": price,
+            "currency": currency,
+            "trade_type": trade_type or ("SELL" if quantity < 0 else "BUY"),
+            "trade_date": datetime.now().isoformat(),
+        }
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((json.dumps(record, ensure_ascii=False) + "\n").encode(), future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush())
+        await future
+        self.accepted += 1
+        if self._known(key) is None:
+            # 기록된 직후 저장 작업이 먼저 돌아 committed가 됐을 수 있습니다.
+            self._remember(key, "queued")
+        return key, dict(self._known(key))
+
+    # --- 저장: 대기열에서 묶음으로 읽어 DB에 ---
+    def _parse(self, data):
+        records = []
+        for line in data.splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                self.corrupt += 1
+                print(f"거래 대기열의 읽을 수 없는 줄을 건너뜁니다: {line[:80]!r}")
+        return records
+
+    def _advance(self, slot, end):
+        if slot is self._slot:
+            # 내 슬롯은 요청 처리 중에 계속 추가되므로 추가와 겹치지 않게 잠급니다.
+            with self._write_lock:
+                slot.advance(end)
+        else:
+            slot.advance(end)   # 주인 없는 슬롯은 잠가 두었으므로 아무도 추가하지 않음
+
+    async def _save(self, slot, records):
+        """거래 묶음을 저장합니다. 묶음이 실패하면 한 건씩 다시 저장하고, DB가 거부한 거래는 데드레터로 옮깁니다."""
+        # 같은 묶음 안의 중복 키는 먼저 들어온 것만 저장합니다.
+        seen = set()
+        unique = []
+        for record in records:
+            if record["idempotency_key"] not in seen:
+                seen.add(record["idempotency_key"])
+                unique.append(record)
+        try:
+            trade_ids = await run_db(insert_trades_batch, unique)
+            self.batches += 1
+        except Exception as e:
+            print(f"거래 묶음 저장 실패, 한 건씩 다시 저장합니다: {e}")
+            trade_ids = {}
+            for record in unique:
+                key = record["idempotency_key"]
+                try:
+                    trade_ids.update(await run_db(insert_trades_batch, [record]))
+                except ROW_REJECTED_ERRORS as row_error:
+                    error = str(row_error).strip()
+                    await asyncio.to_thread(slot.dead_letter, record, error)
+                    self._remember(key, "failed", error=error)
+                    self.dead_lettered += 1
+                    print(f"DB가 거부한 거래를 데드레터로 옮깁니다 ({key}): {error}")
+                except Exception as retry_error:
+                    # 연결 오류 등은 데이터 문제가 아니므로 위치를 옮기지 않고 다음 주기에 다시 시도합니다.
+                    self.last_error = str(retry_error)
+                    raise
+        self.last_error = None
+        for key, trade_id in trade_ids.items():
+            self._remember(key, "committed", trade_id)
+        self.committed += len(trade_ids)
+        return len(trade_ids)
+
+    async def _drain(self, slot):
+        saved = 0
+        while True:
+            data, end = await asyncio.to_thread(slot.read_batch, self.batch_size)
+            if end == slot.offset:
+                break
+            records = self._parse(data)
+            if records:
+                saved += await self._save(slot, records)
+            await asyncio.to_thread(self._advance, slot, end)
+        return saved
+
+    def _orphan_slots(self):
+        """잠겨 있지 않고 저장되지 않은 거래가 남은 다른 슬롯들 (잠근 채로 돌려주므로 다 쓰면 unlock)"""
+        orphans = []
+        for number in range(TRADE_QUEUE_SLOTS):
+            if number == self.slot:
+                continue
+            slot = _Slot(self.directory, number)
+            if slot.size() == 0 or not slot.try_lock():
+                continue
+            slot.load()
+            if slot.offset < slot.size():
+                orphans.append(slot)
+            else:
+                slot.unlock()
+        return orphans
+
+    async def _drain_orphans(self):
+        saved = 0
+        for slot in await asyncio.to_thread(self._orphan_slots):
+            try:
+                print(f"주인 없는 거래 대기열 슬롯 {slot.number}의 남은 거래를 저장합니다.")
+                drained = await self._drain(slot)
+                self.orphans_drained += drained
+                saved += drained
+            finally:
+                slot.unlock()
+        return saved
+
+    async def commit_pending(self):
+        """대기열에 남은 거래를 batch_size개씩 트랜잭션 하나로 저장합니다. 저장한 거래 수를 돌려줍니다."""
+        if self._file is None:
+            return 0
+        saved = await self._drain(self._slot)
+        now = time.monotonic()
+        if now - self._orphans_checked_at >= TRADE_QUEUE_ORPHAN_SECONDS:
+            self._orphans_checked_at = now
+            saved += await self._drain_orphans()
+        return saved
+
+    async def status(self, key):
+        """멱등 키로 처리 상태를 찾습니다. 이 워커가 모르는 키는 DB에서 찾고, 없으면 None"""
+        known = self._known(key)
+        if known is not None:
+            return dict(known)
+        row = await run_db(get_trade_by_idempotency_key, key)
+        if row is None:
+            return None
+        self._remember(key, "committed", row["id"])
+        return dict(self._finished[key])
+
+    def stats(self):
+        backlog = None
+        if self._file is not None:
+            backlog = os.fstat(self._file.fileno()).st_size - self._slot.offset
+        return {
+            "mode": TRADE_INGEST,
+            "slot": self.slot,
+            "backlog_bytes": backlog,
+            "queued": len(self._queued),
+            "accepted": self.accepted,
+            "committed": self.committed,
+            "duplicates": self.duplicates,
+            "fsyncs": self.fsyncs,
+            "batches": self.batches,
+            "corrupt": self.corrupt,
+            "dead_lettered": self.dead_lettered,
+            "orphans_drained": self.orphans_drained,
+            "last_error": self.last_error,
+        }
+
+
+# API 서버 전체가 함께 쓰는 거래 대기열 (TRADE_INGEST=queue일 때 lifespan에서 엽니다)
+trade_queue = TradeQueue()
@@ -0,0 +1,100 @@
+"""
+트렌딩 종목 보드 (/market/trending)
+
+스케줄러가 TRENDING_REFRESH_SECONDS마다 야후에서 트렌딩 종목 목록(유니버스)을 다시 만들고,
+TRENDING_QUOTE_SECONDS마다 그 종목들의 시세를 quote_cache를 거쳐 받아 응답을 미리 만들어 둡니다.
+요청은 만들어 둔 목록을 그대로 돌려주므로 탭을 열 때 야후 호출이 없습니다.
+행마다 시세를 받은 시각을 기억해 두고, age(받은 지 몇 초)는 요청 시점에 계산합니다.
+"""
+import os
+import time
+import asyncio
+import yfinance as yf
+
+from api.executors import run_upstream
+from api.upstream import yahoo
+from api.market_data import get_quotes
+from api.symbol_master import symbol_master
+
+TRENDING_REFRESH_SECONDS = float(os.getenv("TRENDING_REFRESH_SECONDS", "1800"))  # 트렌딩 종목 목록 갱신 주기(초)
+TRENDING_QUOTE_SECONDS = float(os.getenv("TRENDING_QUOTE_SECONDS", "15"))        # 트렌딩 종목 시세 갱신 주기(초)
+
+# 검색 결과가 적거나 실패해도 항상 보여줄 종목 (미국 우량주 + 국내 대표주)
+DEFAULT_US = ["AAPL", "TSLA", "NVDA", "MSFT", "GOOGL", "AMZN", "META", "AMD"]
+DEFAULT_KR = ["005930.KS", "000660.KS", "035420.KS", "005380.KS", "035720.KS",
+              "373220.KS", "000270.KS", "207940.KS", "105560.KS", "247540.KQ"]
+
+
+def _search_trending():
+    # 'stocks' 키워드로 검색하여 실제 활발한 종목들 추출
+    search = yahoo.call(yf.Search, "stocks", max_results=30, session=yahoo.session)
+    return [q['symbol'] for q in search.quotes if q.get('quoteType') in ('EQUITY', 'ETF')]
+
+
+def _currency(code):
+    entry = symbol_master.get(code)
+    if entry and entry["currency"]:
+        return entry["currency"]
+    return "KRW" if code.endswith((".KS", ".KQ")) else "USD"
+
+
+class TrendingBoard:
+    def __init__(self):
+        self._universe = list(dict.fromkeys(DEFAULT_US + DEFAULT_KR))
+        self._rows = []             # 미리 만들어 둔 응답 (등락률 내림차순), 행마다 (행, 시세를 받은 시각)
+        self.updated_at = None
+        self._lock = asyncio.Lock()
+
+    async def rebuild_universe(self):
+        """야후 트렌딩 검색으로 종목 목록을 새로 만들고 시세도 바로 갱신합니다."""
+        try:
+            found = await run_upstream("yahoo", _search_trending)
+            self._universe = list(dict.fromkeys(found + DEFAULT_US + DEFAULT_KR))
+        except Exception as e:
+            # 검색이 실패하면 이전 목록을 그대로 씁니다.
+            print(f"트렌딩 종목 검색 실패: {e}")
+        await self.refresh_quotes()
+
+    async def refresh_quotes(self):
+        """유니버스 종목의 시세를 받아 응답 목록을 통째로 교체합니다. (quote_cache도 함께 데워짐)"""
+        async with self._lock:
+            await self._refresh_locked()
+
+    async def _refresh_locked(self):
+        universe = list(self._universe)
+        quotes = await get_quotes(universe)
+        rows = []
+        now = time.time()
+        for code in universe:
+            if code not in quotes:
+                continue
+            quote, age = quotes[code]
+            entry = symbol_master.get(code)
+            price, prev = quote["price"], quote["prev_close"]
+            rows.append(({
+                "code": code,
+                "name": entry["name"] if entry else quote.get("name") or code,
+                "price": price,
+                "prev_close": prev,
+                "change_pct": round((price - prev) / prev * 100, 2) if prev else 0.0,
+                "currency": _currency(code),
+            }, now - age))
+        rows.sort(key=lambda r: r[0]["change_pct"], reverse=True)
+        self._rows = rows
+        self.updated_at = time.time()
+
+    async def rows(self):
+        """미리 만들어 둔 목록에 지금 기준 age를 붙여 돌려줍니다. 서버가 막 떠서 아직 없으면 한 번만 만듭니다."""
+        if self.updated_at is None:
+            async with self._lock:
+                # 동시에 들어온 첫 요청들은 한 번의 갱신을 함께 기다립니다.
+                if self.updated_at is None:
+                    await self._refresh_locked()
+        now = time.time()
+        return [{**row, "age": round(now - fetched_at, 1)} for row, fetched_at in self._rows]
+
+    def stats(self):
+        return {"universe": len(self._universe), "rows": len(self._rows), "updated_at": self.updated_at}
+
+
+trending_board = TrendingBoard()
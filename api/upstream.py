@@ -0,0 +1,218 @@
+"""
+업스트림(야후, Frankfurter) 호출 정책
+
+시세, 환율, 검색, 이력, 종목명 조회처럼 외부로 나가는 호출은 모두 이 모듈의 클라이언트 call()을 거칩니다.
+(executors.run_upstream의 동시 실행 수 제한과 타임아웃 안쪽, market 스레드에서 실행)
+
+- 요청 한도(토큰 버킷): 업스트림별 초당 요청 수를 제한합니다. UPSTREAM_RATE_MAX_WAIT 안에 차례가 오지 않으면 부르지 않습니다.
+- 서킷 브레이커: 일시적 오류(네트워크 오류, 429)가 UPSTREAM_BREAKER_FAILURES번 이어지면
+  UPSTREAM_BREAKER_RESET_SECONDS 동안 호출하지 않고 바로 UpstreamUnavailable을 냅니다.
+  그 뒤 시험 호출 한 번이 성공하면 다시 닫힙니다. 호출하는 쪽(quote_cache, 환율, 검색, 이력)은 이때
+  마지막으로 받아 둔 값으로 응답하므로, 업스트림 장애 중에도 응답마다 타임아웃을 기다리지 않습니다.
+- 재시도: 일시적 오류는 지터를 준 지수 백오프로 UPSTREAM_RETRIES번까지 다시 시도합니다.
+- 세션: 업스트림마다 연결을 재사용하는 세션 하나 (야후는 yfinance가 쓰는 curl_cffi 세션)
+
+한도와 서킷 상태는 프로세스(워커)마다 따로 셉니다.
+"""
+import os
+import time
+import random
+import threading
+
+import requests
+from curl_cffi import requests as curl_requests
+from yfinance.exceptions import YFRateLimitError
+
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))                                  # 일시적 오류 재시도 횟수
+UPSTREAM_RETRY_BASE = 0.5                                                                  # 첫 재시도 대기 상한(초), 이후 2배씩
+UPSTREAM_RETRY_MAX = 4.0                                                                   # 재시도 대기 상한(초)
+UPSTREAM_RATE_MAX_WAIT = float(os.getenv("UPSTREAM_RATE_MAX_WAIT", "2"))                   # 요청 한도 차례를 기다리는 최대 시간(초)
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))               # 서킷을 여는 연속 실패 수
+UPSTREAM_BREAKER_RESET_SECONDS = float(os.getenv("UPSTREAM_BREAKER_RESET_SECONDS", "30"))  # 서킷을 열어 두는 시간(초)
+
+# 업스트림별 요청 한도: (초당 요청 수, 한 번에 몰아 쓸 수 있는 양). 0이면 제한 없음
+UPSTREAM_RATES = {
+    "yahoo": (float(os.getenv("YAHOO_RATE", "5")), int(os.getenv("YAHOO_BURST", "10"))),
+    "frankfurter": (float(os.getenv("FRANKFURTER_RATE", "5")), int(os.getenv("FRANKFURTER_BURST", "5"))),
+}
+
+# 다시 시도해 볼 만한 오류 (연결 실패, 시간 초과, 429 등). 그 밖의 예외는 응답은 온 것으로 보고 그대로 올립니다.
+TRANSIENT_ERRORS = (requests.RequestException, curl_requests.RequestsError, ConnectionError, TimeoutError,
+                    YFRateLimitError)
+
+
+class UpstreamUnavailable(Exception):
+    """서킷이 열려 있거나 요청 한도 차례가 오지 않아 업스트림을 부르지 않았을 때 발생합니다."""
+
+
+class UpstreamEmpty(Exception):
+    """응답은 왔지만 데이터가 하나도 없을 때 호출 함수가 냅니다. (야후는 요청을 막을 때 오류 대신 빈 결과를 주기도 함)"""
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, cost=1, max_wait=UPSTREAM_RATE_MAX_WAIT):
+        """
+        토큰 cost개를 씁니다. 모자라면 차례를 예약하고 그만큼 기다립니다. (먼저 온 호출부터 순서대로)
+        기다려야 할 시간이 max_wait보다 길면 예약하지 않고 False
+        """
+        if self.rate <= 0:
+            return True
+        cost = min(cost, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(cost - self._tokens, 0) / self.rate
+            if wait > max_wait:
+                return False
+            self._tokens -= cost
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def available(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._updated
+            return round(min(self.capacity, self._tokens + elapsed * self.rate), 2) if self.rate > 0 else None
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures=UPSTREAM_BREAKER_FAILURES, reset_seconds=UPSTREAM_BREAKER_RESET_SECONDS):
+        self.threshold = failures
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._failures = 0        # 연속 실패 수
+        self._opened_at = 0.0
+        self._probing = False     # HALF_OPEN에서 시험 호출이 나가 있는지
+        self._lock = threading.Lock()
+        self.opened = 0           # 서킷이 열린 횟수
+
+    def allow(self):
+        """지금 호출해도 되면 True. 열린 지 reset_seconds가 지났으면 시험 호출 하나만 허용합니다."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state, self._probing = self.HALF_OPEN, False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return self.state != self.OPEN
+
+    def release(self):
+        """허용받은 호출을 하지 않았을 때 시험 호출 자리를 돌려놓습니다."""
+        with self._lock:
+            self._probing = False
+
+    def success(self):
+        with self._lock:
+            self.state, self._failures, self._probing = self.CLOSED, 0, False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failures >= self.threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def stats(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self._failures, "opened": self.opened}
+
+
+def _backoff(attempt):
+    # 풀 지터: 0 ~ min(상한, 기본값 * 2^attempt) 사이에서 고르게 골라 여러 요청이 한꺼번에 다시 몰리지 않게 합니다.
+    return random.uniform(0, min(UPSTREAM_RETRY_MAX, UPSTREAM_RETRY_BASE * 2 ** attempt))
+
+
+class UpstreamClient:
+    def __init__(self, name, session_factory, rate, burst, retries=UPSTREAM_RETRIES):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+        self.retries = retries
+        self._session_factory = session_factory
+        self._session = None
+        self._session_lock = threading.Lock()
+
+        self.retried = 0
+        self.rejected = {"open": 0, "rate_limited": 0}
+
+    @property
+    def session(self):
+        """이 업스트림 호출이 함께 쓰는 HTTP 세션 (처음 쓸 때 만듦)"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._session_factory()
+        return self._session
+
+    def call(self, func, *args, cost=1, **kwargs):
+        """
+        func(*args, **kwargs)를 요청 한도, 서킷 브레이커, 재시도 정책에 따라 실행합니다. (블로킹)
+        cost: 이 호출이 실제로 보내는 요청 수 (여러 종목을 한 번에 받는 호출 등)
+        부르지 못하면 UpstreamUnavailable, 재시도까지 실패하면 마지막 오류를 그대로 올립니다.
+        """
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.rejected["open"] += 1
+                raise UpstreamUnavailable(f"{self.name} 서킷이 열려 있어 호출하지 않았습니다.")
+            if not self.bucket.acquire(cost):
+                self.breaker.release()
+                self.rejected["rate_limited"] += 1
+                raise UpstreamUnavailable(f"{self.name} 요청 한도를 넘어 호출하지 않았습니다.")
+            try:
+                result = func(*args, **kwargs)
+            except TRANSIENT_ERRORS:
+                self.breaker.failure()
+                if attempt == self.retries:
+                    raise
+                self.retried += 1
+                time.sleep(_backoff(attempt))
+                continue
+            except UpstreamEmpty:
+                # 빈 결과는 잘못된 종목일 수도 있으므로 다시 시도하지 않고, 연속되면 서킷을 엽니다.
+                self.breaker.failure()
+                raise
+            except Exception:
+                # 응답을 받은 뒤의 처리 오류는 업스트림 장애가 아닙니다.
+                self.breaker.success()
+                raise
+            self.breaker.success()
+            return result
+
+    def stats(self):
+        return {
+            "breaker": self.breaker.stats(),
+            "rate": self.bucket.rate,
+            "tokens": self.bucket.available(),
+            "retried": self.retried,
+            "rejected": dict(self.rejected),
+        }
+
+
+def _yahoo_session():
+    # yfinance는 curl_cffi 세션만 받습니다. 브라우저처럼 보이도록 impersonate를 켭니다.
+    return curl_requests.Session(impersonate="chrome")
+
+
+def _frankfurter_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=8)
+    session.mount("https://", adapter)
+    return session
+
+
+yahoo = UpstreamClient("yahoo", _yahoo_session, *UPSTREAM_RATES["yahoo"])
+frankfurter = UpstreamClient("frankfurter", _frankfurter_session, *UPSTREAM_RATES["frankfurter"])
+upstream_clients = {"yahoo": yahoo, "frankfurter": frankfurter}
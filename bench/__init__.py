@@ -0,0 +1 @@
+"""벤치마크 도구 (가짜 시세 제공자, 벤치마크 DB 준비, 실행기, 결과 비교)"""
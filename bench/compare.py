@@ -0,0 +1,64 @@
+"""
+벤치마크 결과 비교
+
+두 결과 JSON(bench.run이 저장한 파일)을 시나리오별로 나란히 놓고 변화율을 보여줍니다.
+p50/p99가 threshold(기본 10%)보다 느려졌거나 처리량이 그만큼 줄었으면 회귀로 표시하고 종료 코드 1을 돌려줍니다.
+
+사용법:
+    python -m bench.compare bench/results/이전.json bench/results/이번.json --threshold 0.1
+"""
+import sys
+import json
+import argparse
+
+# (지표, 값이 클수록 나쁜지)
+METRICS = [("p50_ms", True), ("p99_ms", True), ("throughput_rps", False)]
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(base, head, threshold=0.1):
+    """시나리오별 지표 변화를 (scenario, metric, before, after, change, regressed) 목록으로 돌려줍니다."""
+    rows = []
+    for scenario, after in head["results"].items():
+        before = base["results"].get(scenario)
+        if not before:
+            continue
+        for metric, higher_is_worse in METRICS:
+            b, a = before.get(metric), after.get(metric)
+            if not b or a is None:
+                continue
+            change = (a - b) / b
+            regressed = change > threshold if higher_is_worse else change < -threshold
+            rows.append((scenario, metric, b, a, change, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="벤치마크 결과 JSON 두 개 비교")
+    parser.add_argument("base", help="기준 결과 (이전 커밋)")
+    parser.add_argument("head", help="비교할 결과 (이번 커밋)")
+    parser.add_argument("--threshold", type=float, default=0.1, help="회귀로 볼 변화율 (기본 0.1 = 10%%)")
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    print(f"기준: {base['meta'].get('git_commit')} ({base['meta'].get('timestamp')})")
+    print(f"비교: {head['meta'].get('git_commit')} ({head['meta'].get('timestamp')})")
+
+    rows = compare(base, head, args.threshold)
+    for scenario, metric, b, a, change, regressed in rows:
+        mark = "❌ 회귀" if regressed else ""
+        print(f"{scenario:15s} {metric:15s} {b:10.2f} -> {a:10.2f}  {change:+7.1%}  {mark}")
+
+    regressions = [r for r in rows if r[5]]
+    if regressions:
+        print(f"\n{len(regressions)}개 지표가 {args.threshold:.0%} 넘게 나빠졌습니다.")
+        sys.exit(1)
+    print("\n회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
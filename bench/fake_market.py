@@ -0,0 +1,171 @@
+"""
+벤치마크용 가짜 시세 제공자
+
+yfinance(download, Ticker, Search)와 Frankfurter HTTP 응답을 같은 모양의 가짜로 바꿔 끼웁니다.
+가짜는 yfinance 함수와 requests 전송 어댑터 자리에만 들어가므로, api.upstream의 요청 한도, 서킷 브레이커,
+재시도와 api.fx의 응답 처리는 실제 코드 그대로 돕니다.
+가격은 종목 코드로 시드를 정한 랜덤워크라 같은 설정이면 항상 같은 값이 나오고,
+호출마다 지연(latency + jitter)과 실패(failure_rate 확률로 예외, Frankfurter는 HTTP 503)를 흉내 낼 수 있습니다.
+
+    market = FakeMarket(latency_ms=80, jitter_ms=40, failure_rate=0.02)
+    market.install()     # 이후 api 모듈의 yf.* 호출과 Frankfurter 요청은 모두 가짜로 감
+"""
+import json
+import time
+import random
+import threading
+import zlib
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+import requests
+
+
+class UpstreamError(ConnectionError):
+    """failure_rate로 주입한 업스트림 실패 (네트워크 오류처럼 재시도/서킷 브레이커 대상)"""
+
+
+# Frankfurter/야후 환율 대신 쓰는 기준 환율 (1 통화 = ? KRW)
+KRW_RATES = {"USD": 1380.0, "EUR": 1500.0, "JPY": 9.2, "CNY": 190.0, "GBP": 1750.0, "KRW": 1.0}
+
+
+class FakeMarket:
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, failure_rate=0.0, seed=42):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {}      # 종류별 호출 수 (download, history, info, search, fx)
+        self.failures = 0
+
+    # --- 지연/실패 주입 ---
+    def _upstream_call(self, kind):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            delay = max(self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000
+            fail = self._rng.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        time.sleep(delay)
+        if fail:
+            raise UpstreamError(f"주입된 {kind} 실패")
+
+    # --- 가격 생성 ---
+    @staticmethod
+    def _series(symbol, days):
+        """종목별로 항상 같은 일봉 종가 (최근 days 영업일)"""
+        rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+        volatility = 0.015
+        if symbol.endswith("=X"):
+            # 환율 심볼(USDKRW=X): 기준 환율 근처에서 조금만 움직임
+            start, volatility = KRW_RATES[symbol[:3]] / KRW_RATES[symbol[3:6]], 0.001
+        elif symbol.endswith((".KS", ".KQ")):
+            start = 50_000
+        else:
+            start = 100.0
+        closes = start * np.exp(np.cumsum(rng.normal(0, volatility, 2000)))
+        index = pd.bdate_range(end=date.today(), periods=2000)
+        return pd.Series(closes, index=index).iloc[-days:]
+
+    def _frame(self, symbol, days):
+        close = self._series(symbol, days)
+        return pd.DataFrame({
+            "Open": close * 0.995, "High": close * 1.01, "Low": close * 0.99,
+            "Close": close, "Adj Close": close, "Volume": 1_000_000,
+        })
+
+    # --- yfinance 대체 ---
+    def download(self, tickers, period="5d", interval="1d", group_by="ticker", **kwargs):
+        self._upstream_call("download")
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        days = 5 if period in ("1d", "5d") else 30
+        frames = {s.upper(): self._frame(s, days) for s in symbols}
+        return pd.concat(frames, axis=1)
+
+    def Ticker(self, symbol, session=None):
+        return _FakeTicker(self, symbol)
+
+    def Search(self, query, max_results=10, **kwargs):
+        self._upstream_call("search")
+        universe = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "META", "GOOGL", "AMD", "NFLX", "INTC",
+                    "005930.KS", "000660.KS", "035420.KS", "035720.KS"]
+        q = query.upper()
+        hits = [s for s in universe if q in s] or universe
+        return _FakeSearch([{"symbol": s, "shortname": s, "quoteType": "EQUITY", "exchDisp": "FAKE"}
+                            for s in hits[:max_results]])
+
+    def install(self):
+        """
+        yfinance 모듈 함수를 가짜로 바꾸고, Frankfurter 세션에 가짜 전송 어댑터를 붙입니다. (api 모듈 import 전후 모두 가능)
+        야후 환율은 yf.Ticker("USDKRW=X").history로, Frankfurter 환율은 HTTP 응답으로 흉내 냅니다.
+        """
+        import yfinance
+        from api.upstream import frankfurter
+        yfinance.download = self.download
+        yfinance.Ticker = self.Ticker
+        yfinance.Search = self.Search
+        frankfurter.session.mount("https://api.frankfurter.app/", _FrankfurterAdapter(self))
+        return self
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "failures": self.failures}
+
+
+class _FakeTicker:
+    def __init__(self, market, symbol):
+        self._market = market
+        self.ticker = symbol
+
+    @property
+    def info(self):
+        self._market._upstream_call("info")
+        return {"shortName": self.ticker, "longName": self.ticker}
+
+    def history(self, period=None, start=None, end=None, interval="1d", **kwargs):
+        self._market._upstream_call("history")
+        if start is not None:
+            end = end or date.today() + timedelta(days=1)
+            days = max(np.busday_count(pd.Timestamp(start).date(), pd.Timestamp(end).date()), 1)
+        else:
+            days = 1 if period == "1d" else 30
+        frame = self._market._frame(self.ticker, min(days, 2000))
+        if start is not None:
+            frame = frame[(frame.index >= pd.Timestamp(start)) & (frame.index < pd.Timestamp(end))]
+        return frame
+
+
+class _FakeSearch:
+    def __init__(self, quotes):
+        self.quotes = quotes
+
+
+class _FrankfurterAdapter(requests.adapters.BaseAdapter):
+    """requests 세션에 붙이는 가짜 Frankfurter 서버 (/latest?from=USD&to=KRW)"""
+
+    def __init__(self, market):
+        super().__init__()
+        self._market = market
+
+    def send(self, request, **kwargs):
+        query = parse_qs(urlsplit(request.url).query)
+        base, quote = query["from"][0], query["to"][0]
+        try:
+            self._market._upstream_call("fx")
+            status, body = 200, {"amount": 1.0, "base": base, "date": date.today().isoformat(),
+                                 "rates": {quote: KRW_RATES[base] / KRW_RATES[quote]}}
+        except UpstreamError as e:
+            status, body = 503, {"message": str(e)}
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,196 @@
+"""
+API 벤치마크 실행기
+
+FastAPI 앱을 같은 프로세스 안에서(httpx ASGITransport) 띄우고, 시나리오별로 정해진 수의 요청을
+동시에 보내 지연 시간 분포(p50/p90/p99)와 처리량을 잽니다. 야후/Frankfurter는 bench.fake_market으로,
+DB는 BENCH_DATABASE_URL의 전용 PostgreSQL로 대신하므로 실행할 때마다 같은 조건에서 비교할 수 있습니다.
+
+사용법 (프로젝트 루트에서):
+    BENCH_DATABASE_URL=postgresql://localhost/stock_bench python -m bench.run --rows 100000
+    python -m bench.run --scenarios prices,exchange-rate      # DB 없이 시세/환율만
+    python -m bench.compare bench/results/이전.json bench/results/이번.json
+
+결과는 bench/results/<시각>_<커밋>.json에 저장됩니다.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import itertools
+import subprocess
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+
+def _prices_request(rng):
+    symbols = rng.sample(PRICE_UNIVERSE, 5)
+    return "GET", "/market/prices?symbols=" + ",".join(symbols), None
+
+
+def _trade_request(rng):
+    code = rng.choice(PRICE_UNIVERSE)
+    krw = code.endswith((".KS", ".KQ"))
+    body = {
+        "stock_code": code,
+        "quantity": rng.randint(1, 10),
+        "price": round(rng.uniform(30_000, 200_000)) if krw else round(rng.uniform(20, 500), 2),
+        "currency": "KRW" if krw else "USD",
+    }
+    return "POST", "/trades", body
+
+
+PRICE_UNIVERSE = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "META", "GOOGL", "AMD", "NFLX", "INTC",
+                  "005930.KS", "000660.KS", "035420.KS", "035720.KS", "247540.KQ"]
+
+# 시나리오 이름 -> (DB 필요 여부, 요청 생성 함수)
+SCENARIOS = {
+    "holdings": (True, lambda rng: ("GET", "/holdings", None)),
+    "prices": (False, _prices_request),
+    "trades": (True, _trade_request),
+    "exchange-rate": (False, lambda rng: ("GET", "/market/exchange-rate?base=USD&quote=KRW", None)),
+}
+
+
+def summarize(latencies, statuses, wall):
+    ms = np.array(latencies) * 1000
+    ok = sum(n for code, n in statuses.items() if 200 <= code < 400)
+    return {
+        "requests": len(latencies),
+        "errors": len(latencies) - ok,
+        "status": {str(code): n for code, n in sorted(statuses.items())},
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall > 0 else None,
+    }
+
+
+async def run_scenario(client, make_request, requests, concurrency, seed):
+    """concurrency개의 작업자가 requests개의 요청을 나눠 보냅니다."""
+    rng = random.Random(seed)
+    counter = itertools.count()
+    latencies, statuses = [], Counter()
+
+    async def worker():
+        while next(counter) < requests:
+            method, url, body = make_request(rng)
+            started = time.perf_counter()
+            try:
+                res = await client.request(method, url, json=body)
+                statuses[res.status_code] += 1
+            except Exception:
+                statuses[0] += 1   # 응답 자체를 못 받은 요청
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - started)
+
+
+def git_revision():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True).stdout.strip())
+        return sha, dirty
+    except Exception:
+        return None, None
+
+
+async def main_async(args):
+    # api 모듈이 import될 때 설정을 읽으므로 환경 변수와 가짜 시세를 먼저 준비합니다.
+    has_db = bool(os.getenv("BENCH_DATABASE_URL"))
+    if has_db:
+        os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+    os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="stock-bench-"))
+
+    from bench.fake_market import FakeMarket
+    market = FakeMarket(args.latency_ms, args.jitter_ms, args.failure_rate, args.seed).install()
+
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"알 수 없는 시나리오: {', '.join(unknown)} (가능: {', '.join(SCENARIOS)})")
+    skipped = [s for s in scenarios if SCENARIOS[s][0] and not has_db]
+    scenarios = [s for s in scenarios if s not in skipped]
+    if skipped:
+        print(f"⚠️ BENCH_DATABASE_URL이 없어 건너뜁니다: {', '.join(skipped)}")
+
+    trades = None
+    if has_db and args.rows:
+        from bench.seed import seed
+        started = time.perf_counter()
+        trades = seed(args.rows, args.reset)
+        print(f"trades {trades:,}건 준비 ({time.perf_counter() - started:.1f}s)")
+
+    import httpx
+    from api.main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            for i, name in enumerate(scenarios):
+                make_request = SCENARIOS[name][1]
+                if args.warmup:
+                    await run_scenario(client, make_request, args.warmup, args.concurrency, args.seed + i)
+                results[name] = await run_scenario(client, make_request, args.requests, args.concurrency, args.seed + i)
+                r = results[name]
+                print(f"{name:15s} p50 {r['p50_ms']:8.2f}ms  p99 {r['p99_ms']:8.2f}ms  "
+                      f"{r['throughput_rps']:8.1f} req/s  errors {r['errors']}")
+
+    sha, dirty = git_revision()
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": sha,
+            "git_dirty": dirty,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "trades": trades,
+            "args": vars(args),
+            "fake_market": market.stats(),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}_{sha or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"결과 저장: {out}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stock Asset Manager API 벤치마크")
+    parser.add_argument("--scenarios", default=None, help=f"쉼표로 구분 (기본: 전체 = {','.join(SCENARIOS)})")
+    parser.add_argument("--requests", type=int, default=500, help="시나리오별 요청 수")
+    parser.add_argument("--concurrency", type=int, default=16, help="동시에 보내는 요청 수")
+    parser.add_argument("--warmup", type=int, default=20, help="측정 전에 버리는 요청 수")
+    parser.add_argument("--rows", type=int, default=0, help="trades를 이 건수까지 채운 뒤 측정 (BENCH_DATABASE_URL 필요)")
+    parser.add_argument("--reset", action="store_true", help="채우기 전에 벤치마크 DB를 비움")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="가짜 업스트림 평균 지연(ms)")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="가짜 업스트림 지연 편차(ms)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="가짜 업스트림 실패 확률 (0~1)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="결과 JSON 경로")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    main()
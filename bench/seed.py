@@ -0,0 +1,121 @@
+"""
+벤치마크용 DB 준비
+
+BENCH_DATABASE_URL이 가리키는 전용 PostgreSQL에 기본 테이블(trades, exchange_rates)과 마이그레이션을 적용하고,
+가짜 거래 기록을 원하는 건수(1천~100만 건)만큼 COPY로 넣습니다. 운영 DB를 건드리지 않도록
+DATABASE_URL이 아니라 BENCH_DATABASE_URL만 사용합니다.
+
+사용법 (프로젝트 루트에서):
+    BENCH_DATABASE_URL=postgresql://localhost/stock_bench python -m bench.seed --rows 100000 --reset
+"""
+import os
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# 여기서 정한 주소로 common.database의 커넥션 풀이 만들어지므로 import보다 먼저 설정합니다.
+if os.getenv("BENCH_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+
+from common.database import db_connection, apply_migrations, copy_trades
+
+# 원래 n8n/수동으로 만들어 쓰던 기본 테이블 (마이그레이션에는 없음)
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id          BIGSERIAL   PRIMARY KEY,
+    stock_code  VARCHAR(20) NOT NULL,
+    quantity    NUMERIC     NOT NULL,
+    price       NUMERIC     NOT NULL,
+    currency    VARCHAR(3)  NOT NULL,
+    trade_type  VARCHAR(4),
+    trade_date  TIMESTAMP   NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS exchange_rates (
+    id            SERIAL      PRIMARY KEY,
+    currency_code VARCHAR(3)  NOT NULL,
+    country_name  VARCHAR(50),
+    rate          NUMERIC     NOT NULL,
+    rate_date     DATE        NOT NULL
+);
+"""
+
+SYMBOLS_US = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN", "META", "GOOGL", "AMD", "NFLX", "INTC",
+              "AVGO", "QCOM", "ORCL", "CRM", "ADBE", "CSCO", "PYPL", "UBER", "DIS", "KO"]
+SYMBOLS_KR = ["005930.KS", "000660.KS", "035420.KS", "005380.KS", "035720.KS",
+              "373220.KS", "000270.KS", "207940.KS", "105560.KS", "247540.KQ"]
+FX_ROWS = [("USD", "미국", 1380.0), ("EUR", "유럽연합", 1500.0), ("JPY", "일본", 9.2), ("CNY", "중국", 190.0)]
+
+
+def require_bench_db():
+    if not os.getenv("BENCH_DATABASE_URL"):
+        raise SystemExit("BENCH_DATABASE_URL(벤치마크 전용 DB 주소)을 설정해 주세요.")
+
+
+def generate_trades(rows, symbols=None, years=5, seed=7):
+    """(stock_code, quantity, price, currency, trade_type, trade_date)를 시간순으로 rows건 만듭니다."""
+    rng = random.Random(seed)
+    symbols = symbols or SYMBOLS_US + SYMBOLS_KR
+    start = datetime.now() - timedelta(days=365 * years)
+    step = timedelta(days=365 * years) / max(rows, 1)
+    held = {s: 0 for s in symbols}
+    for i in range(rows):
+        code = rng.choice(symbols)
+        krw = code.endswith((".KS", ".KQ"))
+        price = round(rng.uniform(30_000, 200_000)) if krw else round(rng.uniform(20, 500), 2)
+        # 보유 수량 안에서만 팔도록 해서 잔고가 음수로 가지 않게 합니다.
+        if held[code] > 0 and rng.random() < 0.3:
+            qty = -rng.randint(1, held[code])
+        else:
+            qty = rng.randint(1, 20)
+        held[code] += qty
+        yield (code, qty, price, "KRW" if krw else "USD", "SELL" if qty < 0 else "BUY", start + step * i)
+
+
+def seed(rows, reset=False):
+    require_bench_db()
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(BASE_SCHEMA)
+            conn.commit()
+        finally:
+            cur.close()
+    apply_migrations()
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            if reset:
+                cur.execute("""
+                TRUNCATE trades, positions, lots, realized_pnl, lot_pending, position_snapshot_index, position_snapshots,
+                         exchange_rates RESTART IDENTITY;
+                """)
+            cur.execute("SELECT COUNT(*) FROM exchange_rates;")
+            if cur.fetchone()[0] == 0:
+                today = datetime.now().date()
+                cur.executemany(
+                    "INSERT INTO exchange_rates (currency_code, country_name, rate, rate_date) VALUES (%s, %s, %s, %s);",
+                    [(code, name, rate, today) for code, name, rate in FX_ROWS])
+            cur.execute("SELECT COUNT(*) FROM trades;")
+            existing = cur.fetchone()[0]
+            conn.commit()
+        finally:
+            cur.close()
+
+    if existing >= rows:
+        return existing
+    inserted = copy_trades(generate_trades(rows - existing, seed=existing))
+    return existing + inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="벤치마크 DB에 가짜 거래 기록 채우기")
+    parser.add_argument("--rows", type=int, default=10_000, help="trades 목표 건수 (이미 있으면 부족한 만큼만 추가)")
+    parser.add_argument("--reset", action="store_true", help="기존 trades/positions/exchange_rates를 비우고 시작")
+    args = parser.parse_args()
+    total = seed(args.rows, args.reset)
+    print(f"✅ trades {total:,}건 준비 완료")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt6.QtGui import QColor
+
+# (헤더, 행 딕셔너리의 키, 표시 형식)
+COLUMNS = [
+    ("종목", "code", "{}"),
+    ("수량", "qty", "{:,.2f}"),
+    ("평단가", "avg_price", "{:,.2f}"),
+    ("현재가", "curr_price", "{:,.2f}"),
+    ("평가금액(원)", "eval_krw", "{:,.0f}원"),
+    ("수익률", "profit_rate", "{:+.2f}%"),
+    ("통화", "currency", "{}"),
+]
+PROFIT_COLUMN = 5
+
+
+class HoldingsTableModel(QAbstractTableModel):
+    """
+    잔고 테이블 모델
+    새로고침 때마다 모든 셀을 다시 만들지 않고, (종목, 통화) 기준으로 행을 맞춰
+    값이 바뀐 셀만 dataChanged로 알립니다. 종목이 수백 개여도 화면 갱신 비용은 바뀐 만큼만 듭니다.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []     # 행 딕셔너리 목록
+        self._index = {}    # (code, currency) -> 행 번호
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section][0]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self._rows[index.row()]
+        _, key, fmt = COLUMNS[index.column()]
+        value = row[key]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            return fmt.format(value)
+        if role == Qt.ItemDataRole.ForegroundRole and index.column() == PROFIT_COLUMN:
+            if value > 0:
+                return QColor("red")
+            if value < 0:
+                return QColor("blue")
+        if role == Qt.ItemDataRole.TextAlignmentRole and isinstance(value, (int, float)):
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def update_rows(self, rows):
+        """새 잔고 목록을 반영합니다. 없어진 종목은 삭제, 새 종목은 추가, 나머지는 바뀐 셀만 갱신"""
+        new_keys = {(r["code"], r["currency"]) for r in rows}
+
+        # 1. 없어진 종목 삭제 (뒤에서부터 지워야 행 번호가 어긋나지 않음)
+        for i in range(len(self._rows) - 1, -1, -1):
+            if (self._rows[i]["code"], self._rows[i]["currency"]) not in new_keys:
+                self.beginRemoveRows(QModelIndex(), i, i)
+                del self._rows[i]
+                self.endRemoveRows()
+        self._index = {(r["code"], r["currency"]): i for i, r in enumerate(self._rows)}
+
+        # 2. 기존 종목은 바뀐 셀만 갱신, 새 종목은 끝에 추가
+        for row in rows:
+            key = (row["code"], row["currency"])
+            i = self._index.get(key)
+            if i is None:
+                position = len(self._rows)
+                self.beginInsertRows(QModelIndex(), position, position)
+                self._rows.append(dict(row))
+                self._index[key] = position
+                self.endInsertRows()
+                continue
+
+            old = self._rows[i]
+            for col, (_, field, _) in enumerate(COLUMNS):
+                if old[field] != row[field]:
+                    old[field] = row[field]
+                    cell = self.index(i, col)
+                    self.dataChanged.emit(cell, cell, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ForegroundRole])
@@ -1,12 +1,86 @@
 import sys
 import requests  # 서버와 통신하기 위해 필요합니다
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QTableWidget, 
-                             QTableWidgetItem, QVBoxLayout, QWidget, QLabel, QPushButton)
-from PyQt6.QtGui import QColor
+from PyQt6.QtCore import QObject, QThread, QTimer, pyqtSignal, pyqtSlot
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QTableWidget, QTableView, QHeaderView,
+                             QTableWidgetItem, QVBoxLayout, QHBoxLayout, QWidget, QLabel, QPushButton, QCheckBox)
 from PyQt6.QtWidgets import QDialog, QLineEdit, QFormLayout, QMessageBox
 from scraper import get_current_prices
+from holdings_model import HoldingsTableModel
+
+API_URL = "http://127.0.0.1:8000"
+AUTO_REFRESH_MS = 30_000  # 자동 새로고침 주기 (30초)
+
+
+class DataLoader(QObject):
+    """
+    잔고 조회(API)와 현재가 조회(yfinance)를 백그라운드 스레드에서 수행합니다.
+    결과는 시그널로 보내므로 GUI 스레드는 네트워크를 기다리며 멈추지 않습니다.
+    """
+    loaded = pyqtSignal(list, float)   # (행 목록, 총 평가금액)
+    failed = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.session = None
+        self.holdings = None        # 마지막으로 받은 잔고 목록
+        self.holdings_etag = None   # 그 응답의 ETag (다음 요청에 If-None-Match로 보냄)
+
+    @pyqtSlot()
+    def load(self):
+        try:
+            if self.session is None:
+                # 같은 스레드에서 연결을 재사용하기 위해 세션을 한 번만 만듭니다.
+                self.session = requests.Session()
+
+            # 1. API 서버에서 잔고 데이터 가져오기
+            # 잔고가 바뀌지 않았으면 서버가 본문 없이 304를 보내므로 지난번 목록을 그대로 씁니다.
+            headers = {"If-None-Match": self.holdings_etag} if self.holdings_etag and self.holdings is not None else {}
+            response = self.session.get(f"{API_URL}/holdings", headers=headers, timeout=10)
+            if response.status_code == 304:
+                holdings = self.holdings
+            elif response.status_code == 200:
+                holdings = response.json() # JSON 데이터를 파이썬 리스트로 변환
+                self.holdings, self.holdings_etag = holdings, response.headers.get("ETag")
+            else:
+                self.failed.emit("서버 연결 실패")
+                return
+
+            # 2. 실시간 주가 가져오기 (Scraper 활용)
+            stock_codes = [h['stock_code'] for h in holdings]
+            current_prices = get_current_prices(stock_codes)
+
+            # (임시) 환율 설정 - 나중에 이것도 API로 가져올 수 있습니다.
+            ex_rates = {"USD": 1450.0, "KRW": 1.0}
+
+            rows = []
+            total_eval_krw = 0.0
+            for data in holdings:
+                code = data['stock_code']
+                qty = float(data['total_quantity'])
+                avg_price = float(data['avg_buy_price'])
+                curr = data['currency']
+
+                curr_price = current_prices.get(code, 0)
+                rate = ex_rates.get(curr, 1.0)
+
+                eval_krw = qty * curr_price * rate
+                total_eval_krw += eval_krw
+                profit_rate = ((curr_price - avg_price) / avg_price) * 100 if avg_price > 0 else 0
+
+                rows.append({
+                    "code": code, "qty": qty, "avg_price": avg_price, "curr_price": curr_price,
+                    "eval_krw": eval_krw, "profit_rate": profit_rate, "currency": curr,
+                })
+            self.loaded.emit(rows, total_eval_krw)
+
+        except Exception as e:
+            print(f"오류 발생: {e}")
+            self.failed.emit("데이터를 불러오지 못했습니다.")
+
 
 class MyAssetManager(QMainWindow):
+    refresh_requested = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("나의 실시간 자산 관리자 (v2.0 - API 연결됨)")
@@ -21,79 +95,78 @@ class MyAssetManager(QMainWindow):
         self.summary_label.setStyleSheet("font-size: 18px; font-weight: bold; margin: 10px;")
         layout.addWidget(self.summary_label)
 
-        # 주식 테이블
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels(["종목", "수량", "평단가", "현재가", "평가금액(원)", "수익률", "통화"])
+        # 주식 테이블 (모델/뷰: 바뀐 셀만 다시 그림)
+        self.model = HoldingsTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         layout.addWidget(self.table)
 
-        # 데이터 새로고침 버튼
+        # 데이터 새로고침 버튼 + 자동 새로고침
+        refresh_row = QHBoxLayout()
         self.refresh_btn = QPushButton("새로고침")
         self.refresh_btn.clicked.connect(self.load_data)
-        layout.addWidget(self.refresh_btn)
+        refresh_row.addWidget(self.refresh_btn)
+        self.auto_refresh = QCheckBox(f"자동 새로고침 ({AUTO_REFRESH_MS // 1000}초)")
+        self.auto_refresh.toggled.connect(self.toggle_auto_refresh)
+        refresh_row.addWidget(self.auto_refresh)
+        layout.addLayout(refresh_row)
 
         self.market_btn = QPushButton("🛍️ 종목 구경하고 매수하기")
         self.market_btn.setStyleSheet("background-color: #4CAF50; color: white; padding: 10px;")
         self.market_btn.clicked.connect(self.open_market_window)
         layout.addWidget(self.market_btn)
 
+        # 백그라운드 로더 스레드
+        self.loading = False
+        self.loader_thread = QThread(self)
+        self.loader = DataLoader()
+        self.loader.moveToThread(self.loader_thread)
+        self.refresh_requested.connect(self.loader.load)
+        self.loader.loaded.connect(self.on_data_loaded)
+        self.loader.failed.connect(self.on_load_failed)
+        self.loader_thread.start()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(AUTO_REFRESH_MS)
+        self.timer.timeout.connect(self.load_data)
+
         self.load_data()
 
     def open_market_window(self):
         self.market_win = MarketWindow(self)
         self.market_win.show()    
 
-    def load_data(self):
-        try:
-            # 1. API 서버에서 잔고 데이터 가져오기
-            response = requests.get("http://127.0.0.1:8000/holdings")
-            if response.status_code != 200:
-                print("서버 연결 실패")
-                return
-            
-            holdings = response.json() # JSON 데이터를 파이썬 리스트로 변환
-
-            # 2. 실시간 주가 가져오기 (Scraper 활용)
-            stock_codes = [h['stock_code'] for h in holdings]
-            current_prices = get_current_prices(stock_codes)
-
-            # 3. 화면 업데이트
-            self.table.setRowCount(len(holdings))
-            total_eval_krw = 0
-            
-            # (임시) 환율 설정 - 나중에 이것도 API로 가져올 수 있습니다.
-            ex_rates = {"USD": 1450.0, "KRW": 1.0}
+    def toggle_auto_refresh(self, checked):
+        if checked:
+            self.timer.start()
+        else:
+            self.timer.stop()
 
-            for row, data in enumerate(holdings):
-                code = data['stock_code']
-                qty = float(data['total_quantity'])
-                avg_price = float(data['avg_buy_price'])
-                curr = data['currency']
-                
-                curr_price = current_prices.get(code, 0)
-                rate = ex_rates.get(curr, 1.0)
-
-                eval_krw = qty * curr_price * rate
-                total_eval_krw += eval_krw
-                profit_rate = ((curr_price - avg_price) / avg_price) * 100 if avg_price > 0 else 0
-
-                self.table.setItem(row, 0, QTableWidgetItem(code))
-                self.table.setItem(row, 1, QTableWidgetItem(f"{qty:,.2f}"))
-                self.table.setItem(row, 2, QTableWidgetItem(f"{avg_price:,.2f}"))
-                self.table.setItem(row, 3, QTableWidgetItem(f"{curr_price:,.2f}"))
-                self.table.setItem(row, 4, QTableWidgetItem(f"{int(eval_krw):,}원"))
-                
-                profit_item = QTableWidgetItem(f"{profit_rate:+.2f}%")
-                if profit_rate > 0: profit_item.setForeground(QColor("red"))
-                elif profit_rate < 0: profit_item.setForeground(QColor("blue"))
-                self.table.setItem(row, 5, profit_item)
-                self.table.setItem(row, 6, QTableWidgetItem(curr))
-
-            self.summary_label.setText(f"💰 총 자산 가치: {int(total_eval_krw):,} 원")
-
-        except Exception as e:
-            print(f"오류 발생: {e}")
-            self.summary_label.setText("데이터를 불러오지 못했습니다.")
+    def load_data(self):
+        """백그라운드 스레드에 새로고침을 요청합니다. (이미 불러오는 중이면 무시)"""
+        if self.loading:
+            return
+        self.loading = True
+        self.refresh_btn.setEnabled(False)
+        self.refresh_requested.emit()
+
+    def on_data_loaded(self, rows, total_eval_krw):
+        self.loading = False
+        self.refresh_btn.setEnabled(True)
+        self.model.update_rows(rows)
+        self.summary_label.setText(f"💰 총 자산 가치: {int(total_eval_krw):,} 원")
+
+    def on_load_failed(self, message):
+        self.loading = False
+        self.refresh_btn.setEnabled(True)
+        self.summary_label.setText(message)
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.loader_thread.quit()
+        self.loader_thread.wait()
+        super().closeEvent(event)
 
 # 매수 수량을 입력받는 팝업창 클래스
 class BuyDialog(QDialog):
@@ -132,7 +205,7 @@ class MarketWindow(QDialog):
 
     def load_market_list(self):
         # API 서버에서 카탈로그 목록 가져오기
-        res = requests.get("http://127.0.0.1:8000/market-list")
+        res = requests.get(f"{API_URL}/market-list")
         if res.status_code == 200:
             stocks = res.json()
             self.market_table.setRowCount(len(stocks))
@@ -156,8 +229,8 @@ class MarketWindow(QDialog):
                 "price": float(price),
                 "currency": "USD" if ".KS" not in stock_code else "KRW"
             }
-            res = requests.post("http://127.0.0.1:8000/trades", json=trade_data)
-            if res.status_code == 200:
+            res = requests.post(f"{API_URL}/trades", json=trade_data)
+            if res.status_code in (200, 202):   # 202: 서버 거래 대기열에 접수됨
                 QMessageBox.information(self, "완료", f"{stock_code} 매수 기록이 저장되었습니다!")
                 self.parent().load_data() # 메인 화면 새로고침        
 
@@ -1,38 +1,112 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, TimeoutError as FutureTimeout
 import yfinance as yf
 import pandas as pd
 
-def get_current_prices(stock_codes):
+# 최근에 조회한 현재가를 잠깐 재사용하기 위한 캐시 { 종목코드: (가격, 조회 시각) }
+_price_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _download_prices(codes):
+    """yf.download 한 번으로 여러 종목의 최신 종가를 가져옵니다."""
+    data = yf.download(codes, period="1d", group_by="ticker", auto_adjust=False,
+                       progress=False, threads=True)
+    prices = {}
+    if data is None or data.empty:
+        return prices
+
+    for code in codes:
+        try:
+            if isinstance(data.columns, pd.MultiIndex):
+                closes = data[code.upper()]['Close'].dropna()
+            else:
+                closes = data['Close'].dropna()
+            if not closes.empty:
+                # 'Close' 열의 마지막 행 값이 현재가입니다.
+                prices[code] = float(closes.iloc[-1])
+        except KeyError:
+            pass
+    return prices
+
+
+def _fetch_one(code):
+    # history(period="1d")는 현재 시장의 가장 최신 봉 데이터를 가져옵니다.
+    # 실시간 가격(또는 15분 지연된 현재가)을 가져오는 가장 안정적인 방법입니다.
+    data = yf.Ticker(code).history(period="1d")
+    if data.empty:
+        return None
+    return float(data['Close'].iloc[-1])
+
+
+def get_current_prices(stock_codes, timeout=10.0, cache_ttl=30.0, max_workers=8):
     """
-    yfinance를 사용하여 리스트에 담긴 모든 종목의 현재가를 
+    yfinance를 사용하여 리스트에 담긴 모든 종목의 현재가를
     딕셔너리 형태로 반환합니다.
+
+    - 먼저 yf.download 한 번으로 전체를 받고, 빠진 종목만 최대 max_workers개 스레드로 개별 조회합니다.
+    - timeout(초) 안에 끝나지 않은 종목은 기다리지 않고, 캐시에 남은 이전 값(없으면 0.0)으로 채웁니다.
+    - cache_ttl(초) 안에 조회한 적이 있는 종목은 다시 요청하지 않습니다. (0이면 캐시 사용 안 함)
     """
     price_dict = {}
-    
+
     if not stock_codes:
         return price_dict
 
-    for code in stock_codes:
+    deadline = time.monotonic() + timeout
+    now = time.time()
+    pending = []
+    with _cache_lock:
+        for code in dict.fromkeys(stock_codes):
+            cached = _price_cache.get(code)
+            if cache_ttl and cached and now - cached[1] < cache_ttl:
+                price_dict[code] = cached[0]
+            else:
+                pending.append(code)
+
+    fetched = {}
+    if pending:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
         try:
-            # Ticker 객체 생성
-            ticker = yf.Ticker(code)
-            
-            # history(period="1d")는 현재 시장의 가장 최신 봉 데이터를 가져옵니다.
-            # 실시간 가격(또는 15분 지연된 현재가)을 가져오는 가장 안정적인 방법입니다.
-            data = ticker.history(period="1d")
-            
-            if not data.empty:
-                # 'Close' 열의 마지막 행 값이 현재가입니다.
-                current_price = data['Close'].iloc[-1]
-                price_dict[code] = float(current_price)
-                print(f"✅ {code} 조회 성공: {current_price:.2f}")
+            # 1. 일괄 다운로드
+            try:
+                fetched = executor.submit(_download_prices, pending).result(timeout=max(deadline - time.monotonic(), 0))
+            except FutureTimeout:
+                print("⚠️ 일괄 조회 시간 초과, 개별 조회로 넘어갑니다.")
+            except Exception as e:
+                print(f"❌ 일괄 조회 중 오류 발생: {e}")
+
+            # 2. 일괄 결과에 빠진 종목만 개별 조회
+            missing = [code for code in pending if code not in fetched]
+            futures = {executor.submit(_fetch_one, code): code for code in missing}
+            done, _ = wait(futures, timeout=max(deadline - time.monotonic(), 0))
+            for future in done:
+                code = futures[future]
+                try:
+                    price = future.result()
+                    if price is not None:
+                        fetched[code] = price
+                except Exception as e:
+                    print(f"❌ {code} 조회 중 오류 발생: {e}")
+        finally:
+            # 시간 초과된 작업은 기다리지 않고 버립니다.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    now = time.time()
+    with _cache_lock:
+        for code, price in fetched.items():
+            _price_cache[code] = (price, now)
+        for code in pending:
+            if code in fetched:
+                price_dict[code] = fetched[code]
             else:
-                print(f"⚠️ {code}: 데이터를 찾을 수 없습니다.")
-                price_dict[code] = 0.0
-                
-        except Exception as e:
-            print(f"❌ {code} 조회 중 오류 발생: {e}")
-            price_dict[code] = 0.0
-            
+                # 이번에 못 가져온 종목은 이전 값이 있으면 그 값을, 없으면 0.0을 씁니다.
+                cached = _price_cache.get(code)
+                price_dict[code] = cached[0] if cached else 0.0
+
+    failed = [code for code in pending if code not in fetched]
+    print(f"✅ {len(price_dict) - len(failed)}개 종목 조회 성공" + (f", ⚠️ 실패/지연: {', '.join(failed)}" if failed else ""))
     return price_dict
 
 # --- 테스트 코드 ---
@@ -42,4 +116,4 @@ if __name__ == "__main__":
     results = get_current_prices(test_list)
     print("\n[최종 결과]")
     for code, price in results.items():
-        print(f"{code}: {price:,.2f}")
\ No newline at end of file
+        print(f"{code}: {price:,.2f}")
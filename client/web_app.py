@@ -1,7 +1,19 @@
+import json
 import streamlit as st
 import requests
+import numpy as np
 import pandas as pd
 
+# 설치되어 있으면 표 데이터를 열 단위 형식으로 받아 JSON 파싱 없이 DataFrame을 만듭니다. (없으면 JSON)
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 # 소수점 포맷팅 함수 정의 (둘째자리까지 있거나, 정수거나)
 def format_number(val):
     if val == int(val):
@@ -11,6 +23,106 @@ def format_number(val):
 st.set_page_config(page_title="Stock Asset Web", layout="centered")
 API_URL = "http://127.0.0.1:8000"
 
+
+# 서버와의 연결(keep-alive)을 재실행 사이에도 재사용하는 세션 (Streamlit 프로세스에 하나)
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# ETag를 주는 응답(/holdings, /portfolio/dashboard)의 마지막 본문 (Streamlit 프로세스에 하나)
+# 다음 요청에 If-None-Match로 보내서 서버가 304를 주면 본문을 다시 받지 않고 이것을 씁니다.
+@st.cache_resource
+def get_etag_store():
+    return {}
+
+
+def _conditional_get(path, params=None, headers=None):
+    """GET 응답 (status_code, content, headers). 304면 저장해 둔 응답을 돌려줍니다."""
+    key = (path, tuple(sorted((params or {}).items())), (headers or {}).get("Accept"))
+    store = get_etag_store()
+    cached = store.get(key)
+    request_headers = dict(headers or {})
+    if cached:
+        request_headers["If-None-Match"] = cached[0]
+    res = get_session().get(f"{API_URL}{path}", params=params or None, headers=request_headers, timeout=30)
+    if res.status_code == 304 and cached:
+        return 200, cached[1], cached[2]
+    if res.status_code == 200 and res.headers.get("ETag"):
+        store[key] = (res.headers["ETag"], res.content, res.headers)
+    return res.status_code, res.content, res.headers
+
+
+def api_get(path, **params):
+    """GET 결과(JSON)를 돌려줍니다. 실패하면 None"""
+    try:
+        status, content, _ = _conditional_get(path, params)
+    except requests.RequestException:
+        return None
+    return json.loads(content) if status == 200 else None
+
+
+def _frame_accept():
+    types = []
+    if pa is not None:
+        types.append("application/vnd.apache.arrow.stream")
+    if msgpack is not None:
+        types.append("application/x-msgpack;q=0.9")
+    types.append("application/json;q=0.5")
+    return ", ".join(types)
+
+
+def api_get_frame(path, **params):
+    """표 형태 응답(/market/trending, /market/prices, /holdings)을 DataFrame으로 받습니다. 실패하면 빈 DataFrame"""
+    try:
+        status, content, headers = _conditional_get(path, params, {"Accept": _frame_accept()})
+    except requests.RequestException:
+        return pd.DataFrame()
+    if status != 200:
+        return pd.DataFrame()
+    # gzip/zstd 압축은 requests가 Content-Encoding을 보고 풀어 줍니다.
+    media_type = headers.get("content-type", "").split(";")[0]
+    if media_type == "application/vnd.apache.arrow.stream":
+        return pa.ipc.open_stream(content).read_pandas()
+    if media_type == "application/x-msgpack":
+        payload = msgpack.unpackb(content)
+        return pd.DataFrame({
+            name: np.frombuffer(payload["data"][name], dtype="<f8") if payload["dtypes"][name] == "f8"
+            else payload["data"][name]
+            for name in payload["columns"]
+        }, columns=payload["columns"])
+    return pd.DataFrame(json.loads(content))
+
+
+def api_post(path, payload):
+    return get_session().post(f"{API_URL}{path}", json=payload, timeout=30)
+
+
+# 위젯을 조작할 때마다 스크립트가 처음부터 다시 실행되므로, 서버 응답은 TTL 동안 재사용합니다.
+# 매수/매도나 새로고침 버튼을 누르면 해당 캐시를 비웁니다.
+@st.cache_data(ttl=15, show_spinner=False)
+def fetch_dashboard():
+    return api_get("/portfolio/dashboard")
+
+
+@st.cache_data(ttl=15, show_spinner=False)
+def fetch_trending():
+    return api_get_frame("/market/trending")
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_search(query):
+    return api_get("/market/search", query=query) or []
+
+
+@st.cache_data(ttl=15, show_spinner=False)
+def fetch_price(code):
+    return api_get(f"/market/price/{code}")
+
 st.title("🚀 주식 자산 관리 웹 대시보드")
 
 # 탭 생성
@@ -23,59 +135,23 @@ with tab_wallet:
         st.subheader("나의 실시간 포트폴리오")
     with col_btn:
         if st.button("🔄 새로고침", key="refresh_final"):
+            fetch_dashboard.clear()
+            fetch_trending.clear()
             st.rerun()
 
-    # 1. 기초 데이터 로드 (보유종목, 전체종목리스트, 환율)
-    res = requests.get(f"{API_URL}/holdings")
-    market_res = requests.get(f"{API_URL}/market/list")
-    ex_res = requests.get(f"{API_URL}/market/exchange-rate")
-
-    if res.status_code == 200 and res.json():
-        holdings = res.json()
-        # DB 종목명 매칭용 딕셔너리 생성 { '005930.KS': '삼성전자' }
-        stock_name_map = {s['code']: s['name'] for s in market_res.json()} if market_res.status_code == 200 else {}
-        # 환율 데이터
-        ex_data = ex_res.json() if ex_res.status_code == 200 else {"rate": 1350.0, "source": "default"}
-        exchange_rate = ex_data['rate']
-
-        # 2. 실시간 시세 일괄 가져오기
-        all_symbols = ",".join([h['stock_code'] for h in holdings])
-        with st.spinner('시세 로딩 중...'):
-            prices_res = requests.get(f"{API_URL}/market/prices?symbols={all_symbols}")
-            all_prices = prices_res.json() if prices_res.status_code == 200 else {}
-
-        rows = []
-        for h in holdings:
-            code = h['stock_code']
-            p_data = all_prices.get(code, {"price": 0, "prev_close": 0})
-            
-            # [핵심] 이름은 우리 DB(stock_name_map)에서 먼저 찾고, 없으면 서버 데이터 사용
-            db_name = stock_name_map.get(code)  # 1순위: 우리 DB에 있는 한글명
-            yf_name = p_data.get('name')        # 2순위: 야후 파이낸스에서 가져온 이름
-            
-            if db_name:
-                display_name = db_name
-            elif yf_name and yf_name != code:   # 야후 이름이 코드(숫자)와 다를 때만 사용
-                display_name = yf_name
-            else:
-                display_name = code             # 마지막 수단: 종목 코드 그대로 노출
-            
-            cur_p = p_data['price']
-            prev_p = p_data['prev_close']
-            buy_p = h['avg_buy_price']
-            qty = h['total_quantity']
-            
-            eval_amt = cur_p * qty
-            buy_amt = buy_p * qty
-            pnl = eval_amt - buy_amt
-            pnl_r = (pnl / buy_amt * 100) if buy_amt != 0 else 0
-            day_r = ((cur_p - prev_p) / prev_p * 100) if prev_p != 0 else 0
-
-            rows.append({
-                "종목명": display_name, "평가손익": pnl, "수익률(%)": pnl_r,
-                "보유수량": qty, "평가금액": eval_amt, "매입단가": buy_p,
-                "현재가": cur_p, "전일가": prev_p, "등락률(%)": day_r, "통화": h['currency']
-            })
+    # 잔고 + 현재가 + 종목명 + 환율 + 통화별 합계를 한 번에 받습니다.
+    with st.spinner('시세 로딩 중...'):
+        dashboard = fetch_dashboard()
+    fx_rates = dashboard["fx"] if dashboard else {}
+    exchange_rate = (fx_rates.get("USD") or {}).get("rate") or 1350.0
+
+    if dashboard and dashboard["holdings"]:
+        holdings = dashboard["holdings"]
+        rows = [{
+            "종목명": h["name"], "평가손익": h["pnl"], "수익률(%)": h["pnl_pct"],
+            "보유수량": h["quantity"], "평가금액": h["market_value"], "매입단가": h["avg_cost"],
+            "현재가": h["price"], "전일가": h["prev_close"], "등락률(%)": h["day_change_pct"], "통화": h["currency"]
+        } for h in holdings]
 
         df = pd.DataFrame(rows)
 
@@ -88,15 +164,13 @@ with tab_wallet:
         # 3. 정렬된 순서대로 요약 및 테이블 출력
         for curr in sorted_currencies:
             curr_df = df[df['통화'] == curr].copy()
-            
-            t_buy = (curr_df['매입단가'] * curr_df['보유수량']).sum()
-            t_eval = curr_df['평가금액'].sum()
-            
-            # USD일 경우 요약만 원화 환산 (문구는 제거하고 계산만 수행)
-            if curr == "USD":
-                t_buy *= exchange_rate
-                t_eval *= exchange_rate
-            
+
+            # 통화별 합계는 서버가 원화로 환산해 둔 값을 씁니다. (환율을 못 구하면 현지 통화 그대로)
+            total = dashboard["totals"][curr]
+            summary = total["report"] or total
+            t_buy = summary["buy_amount"]
+            t_eval = summary["market_value"]
+
             t_pnl = t_eval - t_buy
             t_pnl_rate = (t_pnl / t_buy * 100) if t_buy != 0 else 0
             pnl_color = "#ef5350" if t_pnl >= 0 else "#42a5f5"
@@ -144,7 +218,7 @@ with tab_wallet:
                 
                 # 2. 선택된 종목의 코드를 먼저 찾습니다 (form 밖에서!)
                 target_idx = curr_df.index[curr_df['종목명'] == selected_stock_name][0]
-                target_code = holdings[target_idx]['stock_code']
+                target_code = holdings[target_idx]['code']
 
                 # 3. 이제 안전하게 target_code를 key에 넣어서 폼을 생성합니다.
                 with st.form(key=f"sell_form_{curr}_{target_code}"):
@@ -184,9 +258,11 @@ with tab_wallet:
                                 "price": s_price,
                                 "currency": curr
                             }
-                            s_res = requests.post(f"{API_URL}/trades/sell", json=sell_payload)
-                            if s_res.status_code == 200:
-                                st.success(f"{selected_stock_name} 매도 완료!")
+                            s_res = api_post("/trades/sell", sell_payload)
+                            # 202: 서버가 거래 대기열 모드(TRADE_INGEST=queue)라 접수만 된 상태
+                            if s_res.status_code in (200, 202):
+                                st.success(f"{selected_stock_name} 매도 {'완료' if s_res.status_code == 200 else '접수'}!")
+                                fetch_dashboard.clear()
                                 st.rerun() # 여기서만 새로고침 발생
                         else:
                             st.warning("매도 수량을 0보다 크게 입력해 주세요.")
@@ -200,39 +276,13 @@ with tab_market:
     st.subheader("🔥 Yahoo Finance 실시간 트렌딩 종목")
     
     with st.spinner('글로벌 인기 종목 정보를 불러오는 중...'):
-        # 1. 서버에서 트렌딩 티커 가져오기
-        trending_res = requests.get(f"{API_URL}/market/trending")
-        trending_codes = trending_res.json() if trending_res.status_code == 200 else []
-        
-        # 한국 주식도 항상 보고 싶다면 여기에 추가
-        kr_codes = ["005930.KS", "000660.KS", "035420.KS", "005380.KS", "035720.KS", "373220.KS", "000270.KS", "207940.KS", "105560.KS", "247540.KQ"]
-        total_codes = list(set(trending_codes + kr_codes))
-        
-        # 2. 상세 정보 호출
-        all_symbols = ",".join(total_codes)
-        prices_res = requests.get(f"{API_URL}/market/prices?symbols={all_symbols}")
-        live_data = prices_res.json() if prices_res.status_code == 200 else {}
-
-    # 데이터 정리
-    rows = []
-    for code, info in live_data.items():
-        # 이름이 비어있거나 티커와 같다면 재확인 (서버 보완 버전 활용)
-        display_name = info.get('name') or code
-        
-        cur_p = info['price']
-        prev_p = info['prev_close']
-        change_rate = ((cur_p - prev_p) / prev_p * 100) if prev_p != 0 else 0
-        currency = "KRW" if ".KS" in code or ".KQ" in code else "USD"
-        
-        rows.append({
-            "Official Name": display_name,
-            "Ticker": code,
-            "Price": cur_p,
-            "Change (%)": change_rate,
-            "Currency": currency
-        })
-    
-    df_market = pd.DataFrame(rows)
+        # 서버가 미리 만들어 둔 트렌딩 종목 + 시세 + 등락률을 한 번에 받습니다. (국내 대표주 포함)
+        trending = fetch_trending()
+
+    # 데이터 정리 (열 이름만 화면용으로 바꿈)
+    df_market = trending.rename(columns={
+        "name": "Official Name", "code": "Ticker", "price": "Price", "change_pct": "Change (%)", "currency": "Currency"
+    }).reindex(columns=["Official Name", "Ticker", "Price", "Change (%)", "Currency"])
 
     # 3. 출력 (KRW와 USD를 각각 확실히 출력)
     for curr in ["KRW", "USD"]:
@@ -257,17 +307,16 @@ with tab_buy:
     st.subheader("🛍️ 종목 통합 검색 및 매수")
     
     # 1. 통합 검색창 (하나만 남김)
-    search_query = st.text_input("종목명 또는 티커를 입력하세요", placeholder="예: QQQ, 005930.KS, NVDA", key="total_search")
+    search_query = st.text_input("종목명 또는 티커를 입력하세요", placeholder="예: 삼성전자, QQQ, 005930, NVDA", key="total_search")
 
     if search_query:
-        # 2글자 미만은 야후 API가 힘들어하므로 제한
+        # 2글자 미만은 결과가 너무 많으므로 제한
         if len(search_query) < 2:
             st.warning("정확한 검색을 위해 2글자 이상 입력해주세요.")
         else:
             with st.spinner(f"'{search_query}' 시세 데이터 조회 중..."):
-                # 바로 외부 API(yfinance 검색용 서버 엔드포인트)만 호출
-                api_res = requests.get(f"{API_URL}/market/search?query={search_query}")
-                combined_results = api_res.json() if api_res.status_code == 200 else []
+                # 서버의 종목 마스터에서 먼저 찾고, 없을 때만 서버가 야후 검색으로 보충
+                combined_results = fetch_search(search_query)
 
             if combined_results:
                 # 사용자가 선택할 수 있게 Selectbox 제공
@@ -277,9 +326,8 @@ with tab_buy:
 
                 # 2. 선택된 종목의 현재가 자동 로딩
                 with st.spinner('실시간 시세 확인 중...'):
-                    p_res = requests.get(f"{API_URL}/market/price/{selected_info['code']}")
-                    if p_res.status_code == 200:
-                        price_data = p_res.json()
+                    price_data = fetch_price(selected_info['code'])
+                    if price_data is not None:
                         live_price = price_data['price']
                         
                         st.markdown("---")
@@ -316,9 +364,10 @@ with tab_buy:
                                         "price": price_input,
                                         "currency": selected_info['currency']
                                     }
-                                    order_res = requests.post(f"{API_URL}/trades", json=trade_data)
-                                    if order_res.status_code == 200:
-                                        st.success(f"✅ {selected_info['name']} 매수 완료!")
+                                    order_res = api_post("/trades", trade_data)
+                                    if order_res.status_code in (200, 202):
+                                        st.success(f"✅ {selected_info['name']} 매수 {'완료' if order_res.status_code == 200 else '접수'}!")
+                                        fetch_dashboard.clear()
                                         st.balloons()
                                 else:
                                     st.warning("수량을 입력하세요.")
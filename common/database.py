@@ -1,92 +1,1157 @@
 import os
+import io
+import csv
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from datetime import date, timedelta
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.extras import RealDictCursor, execute_values
 from dotenv import load_dotenv
 
+from common.metrics import DB_QUERY_SECONDS, timed_function
+
 # .env 파일로드
 load_dotenv()
 
+# 커넥션 풀 설정 (.env에서 조정 가능)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))                  # 평소에 유지할 커넥션 수
+DB_POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")) # 부하가 몰릴 때 추가로 열 수 있는 커넥션 수
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))         # 빈 커넥션을 기다리는 최대 시간(초)
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # 이 시간 이상 놀고 있던 커넥션은 닫음(초)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")  # 꺼낼 때 SELECT 1로 상태 확인
+
+# 잔고 스냅샷 설정 (/holdings?as_of=는 가장 가까운 이전 스냅샷 이후의 거래만 다시 계산)
+SNAPSHOT_INTERVAL_DAYS = int(os.getenv("SNAPSHOT_INTERVAL_DAYS", "7"))  # 스냅샷 간격(일)
+SNAPSHOT_KEEP_DAYS = int(os.getenv("SNAPSHOT_KEEP_DAYS", "90"))         # 이보다 오래된 스냅샷은 정리 시 월말 것만 남김
+
+
 def get_db_connection():
+    """풀을 거치지 않는 새 커넥션을 엽니다. (풀 내부와 일회성 스크립트용)"""
     db_url = os.getenv("DATABASE_URL")
     return psycopg2.connect(db_url)
 
-def get_latest_exchange_rates():
-    """DB에서 각 통화별 최신 화율 정보를 가져오기"""
-    conn = get_db_connection()
-    # RealDictCursor를 사용하면 결과가 {'currency_code': 'USD', 'rate': 1470} 처럼 딕셔너리 형태로 나와서 다루기 편합니다.
-    cur = conn.cursor(cursor_factory=RealDictCursor)
 
+class PoolTimeout(Exception):
+    """DB_POOL_TIMEOUT 안에 빈 커넥션을 얻지 못했을 때 발생합니다."""
+
+
+class ConnectionPool:
+    """
+    psycopg2 커넥션을 재사용하는 스레드 안전 풀입니다.
+    요청마다 TCP 연결 + 인증을 새로 하지 않도록 size개의 커넥션을 유지하고,
+    부하가 몰리면 max_overflow개까지 임시로 더 열었다가 반납 시 닫습니다.
+    """
+
+    def __init__(self, size=DB_POOL_SIZE, max_overflow=DB_POOL_MAX_OVERFLOW, timeout=DB_POOL_TIMEOUT,
+                 idle_timeout=DB_POOL_IDLE_TIMEOUT, pre_ping=DB_POOL_PRE_PING, connect=get_db_connection):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self._connect = connect
+
+        self._idle = deque()  # (conn, 반납 시각) - 오른쪽이 가장 최근에 반납된 커넥션
+        self._cond = threading.Condition()
+        self._opened = 0      # 현재 열려 있는 커넥션 수 (idle + 사용 중)
+        self._in_use = 0
+        self._closed = False
+
+        # 모니터링용 통계
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _pop_idle_locked(self):
+        """idle 커넥션 하나를 꺼냅니다. 너무 오래 놀던 커넥션은 이 때 정리합니다."""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._opened -= 1
+            self._discarded += 1
+            self._close_quietly(conn)
+        if self._idle:
+            return self._idle.pop()[0]
+        return None
+
+    def _is_alive(self, conn):
+        if conn.closed:
+            return False
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = None
+        with self._cond:
+            if self._closed:
+                raise PoolTimeout("커넥션 풀이 이미 닫혔습니다.")
+            waited = False
+            while True:
+                conn = self._pop_idle_locked()
+                if conn is not None:
+                    break
+                if self._opened < self.size + self.max_overflow:
+                    # 새로 열 자리를 먼저 예약하고, 실제 연결은 락 밖에서 합니다.
+                    self._opened += 1
+                    break
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"{self.timeout}초 동안 사용 가능한 DB 커넥션이 없습니다.")
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+        try:
+            if conn is not None and self.pre_ping and not self._is_alive(conn):
+                # 끊어진 커넥션은 버리고 같은 자리에 새로 엽니다.
+                self._close_quietly(conn)
+                with self._cond:
+                    self._discarded += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+                with self._cond:
+                    self._created += 1
+        except Exception:
+            with self._cond:
+                self._opened -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_time_total += elapsed
+            self._checkout_time_max = max(self._checkout_time_max, elapsed)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            self._in_use -= 1
+            keep = not (discard or self._closed or conn.closed or len(self._idle) >= self.size)
+            if keep:
+                try:
+                    # 커밋/롤백하지 않고 반납된 트랜잭션은 정리한 뒤 재사용합니다.
+                    if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                        conn.rollback()
+                except psycopg2.Error:
+                    keep = False
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._opened -= 1
+                self._discarded += 1
+                self._close_quietly(conn)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._opened -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "avg_checkout_ms": round(self._checkout_time_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "max_checkout_ms": round(self._checkout_time_max * 1000, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """모든 DB 함수가 함께 쓰는 전역 커넥션 풀 (처음 사용할 때 생성)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool_stats():
+    """모니터링용 풀 상태 (사용 중/대기 횟수/체크아웃 지연 등)"""
+    return get_pool().stats()
+
+
+@contextmanager
+def db_connection():
+    """
+    풀에서 커넥션을 빌려 쓰고 자동으로 반납합니다.
+    사용법:
+        with db_connection() as conn:
+            cur = conn.cursor()
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    broken = False
     try:
-        # 각 통화(currency_code)별로 날짜(rate_date)가 가장 최신인 것 1개씩만 가져오는 SQL
-        query = """
-        SELECT DISTINCT ON (currency_code)
-                id, currency_code, country_name, rate, rate_date
-        FROM exchange_rates
-        ORDER BY currency_code, rate_date DESC;
-        """
-        cur.execute(query)
-        rates = cur.fetchall()
-        return rates
-    
-    except Exception as e:
-        print(f"환율 데이터 조회 실패 : {e}")
-    
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        # 연결 자체가 깨진 경우 풀에 되돌리지 않습니다.
+        broken = True
+        raise
     finally:
-        cur.close()
-        conn.close()
+        pool.putconn(conn, discard=broken)
 
-def get_stock_holdings():
-    """따로 테이블을 만들지 않고, trades 기록을 즉석에서 합산해 잔고를 계산합니다."""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 이 쿼리가 핵심입니다! 
-    # SUM(quantity)로 현재 총 수량을 계산하고,
-    # 평균 단가(총 매수금액 / 총 수량)를 구합니다.
-    query = """
-    SELECT 
-        stock_code, 
-        SUM(quantity) as total_quantity, 
-        AVG(price) as avg_buy_price, 
-        currency
-    FROM trades
-    GROUP BY stock_code, currency
-    HAVING SUM(quantity) > 0;
+
+# async def 라우트에서 쓰기 위한 DB 전용 스레드 풀
+# 풀의 최대 커넥션 수만큼만 스레드를 두어 커넥션을 기다리며 잠드는 스레드가 생기지 않게 합니다.
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW, thread_name_prefix="db")
+
+
+async def run_db(func, *args, **kwargs):
+    """동기 DB 함수를 DB 전용 스레드 풀에서 실행하고 결과를 기다립니다."""
+    loop = asyncio.get_running_loop()
+    # 요청별 구간 시간(common.metrics)이 DB 스레드에서도 기록되도록 컨텍스트를 넘겨줍니다.
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_db_executor, ctx.run, partial(func, *args, **kwargs))
+
+
+# DB 함수별 실행 시간 (/metrics의 db_query_duration_seconds, Server-Timing의 db 구간)
+_timed_db = timed_function(DB_QUERY_SECONDS, "db")
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def apply_migrations():
+    """common/migrations 폴더의 SQL 파일을 번호 순서대로, 아직 적용되지 않은 것만 실행합니다."""
+    files = sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+    applied_now = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version    VARCHAR(100) PRIMARY KEY,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            """)
+            cur.execute("SELECT version FROM schema_migrations;")
+            done = {row[0] for row in cur.fetchall()}
+            for name in files:
+                if name in done:
+                    continue
+                with open(os.path.join(MIGRATIONS_DIR, name), encoding="utf-8") as f:
+                    cur.execute(f.read())
+                cur.execute("INSERT INTO schema_migrations (version) VALUES (%s);", (name,))
+                applied_now.append(name)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+    return applied_now
+
+
+def apply_trade_to_position(quantity, avg_cost, trade_qty, trade_price):
+    """
+    잔고 (수량, 평균단가)에 거래 하나를 반영한 결과를 돌려줍니다.
+    - 매수: 수량 가중 평균으로 평단가 갱신
+    - 매도: 평단가는 그대로, 수량만 감소 (전량 매도 시 평단가 0으로 초기화)
+    add_trade의 UPSERT SQL과 같은 규칙이어야 합니다.
+    """
+    new_qty = quantity + trade_qty
+    if trade_qty > 0:
+        held = max(quantity, 0)
+        avg_cost = (held * avg_cost + trade_qty * trade_price) / (held + trade_qty)
+    elif new_qty <= 0:
+        avg_cost = 0
+    return new_qty, avg_cost
+
+
+# 거래 1건을 positions에 반영하는 UPSERT (apply_trade_to_position과 같은 규칙)
+POSITION_UPSERT_QUERY = """
+INSERT INTO positions (stock_code, currency, quantity, avg_cost, last_trade_id, updated_at)
+VALUES (%(stock_code)s, %(currency)s, %(quantity)s,
+        CASE WHEN %(quantity)s > 0 THEN %(price)s ELSE 0 END,
+        %(trade_id)s, CURRENT_TIMESTAMP)
+ON CONFLICT (stock_code, currency) DO UPDATE SET
+    avg_cost = CASE
+        WHEN EXCLUDED.quantity > 0 THEN
+            (GREATEST(positions.quantity, 0) * positions.avg_cost + EXCLUDED.quantity * %(price)s)
+            / (GREATEST(positions.quantity, 0) + EXCLUDED.quantity)
+        WHEN positions.quantity + EXCLUDED.quantity <= 0 THEN 0
+        ELSE positions.avg_cost
+    END,
+    quantity = positions.quantity + EXCLUDED.quantity,
+    last_trade_id = EXCLUDED.last_trade_id,
+    updated_at = CURRENT_TIMESTAMP;
+"""
+
+
+# trades를 건드리지 않고 positions만 다시 쓸 때는 트리거가 돌지 않으므로 직접 올립니다. (006 마이그레이션)
+TRADES_VERSION_BUMP_QUERY = "UPDATE trades_version SET version = version + 1 WHERE id = 1;"
+
+
+def replay_positions(conn, keys=None):
+    """
+    trades를 (trade_date, id) 순서대로 다시 읽어 positions를 재계산합니다. (커밋은 호출한 쪽에서)
+    잔고 스냅샷, 과거 시점 잔고와 같은 순서라서 과거 거래를 나중에 가져와도 결과가 같습니다.
+    keys에 [(stock_code, currency), ...]를 주면 해당 종목만 다시 계산합니다.
+    잔고가 바뀌므로 같은 트랜잭션에서 trades_version도 올려 /holdings 캐시와 ETag를 무효화합니다.
     """
-    
+    where = ""
+    params = None
+    if keys is not None:
+        keys = set(keys)
+        if not keys:
+            return 0
+        where = "WHERE stock_code = ANY(%s)"
+        params = (list({code for code, _ in keys}),)
+
+    positions = {}
+    # 이름 있는 커서(서버 사이드 커서)로 읽어서 거래가 많아도 메모리에 한 번에 올리지 않습니다.
+    read_cur = conn.cursor(name="replay_positions")
+    read_cur.itersize = 5000
+    try:
+        read_cur.execute(f"""
+        SELECT id, stock_code, currency, quantity, price
+        FROM trades {where}
+        ORDER BY trade_date, id;
+        """, params)
+        for trade_id, code, currency, qty, price in read_cur:
+            key = (code, currency)
+            if keys is not None and key not in keys:
+                continue
+            quantity, avg_cost, _ = positions.get(key, (0, 0, None))
+            quantity, avg_cost = apply_trade_to_position(quantity, avg_cost, qty, price)
+            positions[key] = (quantity, avg_cost, trade_id)
+    finally:
+        read_cur.close()
+
+    cur = conn.cursor()
     try:
-        cur.execute(query)
-        # 결과값을 딕셔너리 리스트 형태로 변환 (API가 이해하기 쉽게)
-        columns = [desc[0] for desc in cur.description]
-        result = [dict(zip(columns, row)) for row in cur.fetchall()]
-        return result
-    except Exception as e:
-        print(f"데이터 조회 중 오류 발생: {e}")
-        return []
+        if keys is None:
+            cur.execute("DELETE FROM positions;")
+        else:
+            for code, currency in keys:
+                cur.execute("DELETE FROM positions WHERE stock_code = %s AND currency = %s;", (code, currency))
+        rows = [(code, currency, q, a, tid) for (code, currency), (q, a, tid) in positions.items()]
+        if rows:
+            execute_values(cur, """
+            INSERT INTO positions (stock_code, currency, quantity, avg_cost, last_trade_id) VALUES %s
+            """, rows)
+        cur.execute(TRADES_VERSION_BUMP_QUERY)
     finally:
         cur.close()
-        conn.close() 
+    return len(positions)
+
 
+class PositionsNotReady(Exception):
+    """positions를 아직 다시 계산하지 않아 잔고를 믿을 수 없음 (008 마이그레이션의 positions_state)"""
 
-def add_trade(stock_code, quantity, price, currency):
-    """사용자가 매수 버튼을 누르면 호출되어 trades 테이블에 기록을 남깁니다."""
-    conn = get_db_connection() # 기존에 만드신 DB 연결 함수 이름 확인!
+
+POSITIONS_STATE_QUERY = "SELECT needs_rebuild FROM positions_state WHERE id = 1;"
+POSITIONS_REBUILT_QUERY = "UPDATE positions_state SET needs_rebuild = FALSE, rebuilt_at = CURRENT_TIMESTAMP WHERE id = 1;"
+
+
+def _rebuild_all_positions(conn):
     cur = conn.cursor()
-    
-    # trade_date는 현재 시간으로, trade_type은 'BUY'로 저장
-    query = """
-    INSERT INTO trades (stock_code, quantity, price, currency, trade_type, trade_date)
-    VALUES (%s, %s, %s, %s, 'BUY', CURRENT_TIMESTAMP);
-    """
     try:
-        cur.execute(query, (stock_code, quantity, price, currency))
-        conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
+        # 재계산하는 동안 들어온 거래가 DELETE에 지워지지 않도록 거래 저장을 잠시 막습니다. (읽기는 그대로)
+        cur.execute("LOCK TABLE trades IN SHARE MODE;")
+        count = replay_positions(conn)
+        cur.execute(POSITIONS_REBUILT_QUERY)
+        return count
     finally:
         cur.close()
-        conn.close()
+
+
+@_timed_db
+def rebuild_positions():
+    """positions 테이블을 trades 전체 기록으로부터 다시 만듭니다."""
+    with db_connection() as conn:
+        try:
+            count = _rebuild_all_positions(conn)
+            conn.commit()
+            return count
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+
+@_timed_db
+def rebuild_positions_if_needed():
+    """
+    positions_state가 재계산이 필요하다고 표시하고 있을 때만 positions를 다시 만듭니다. (API 서버 스케줄러가 호출)
+    다시 만든 종목 수를, 할 일이 없으면 None을 돌려줍니다.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(POSITIONS_STATE_QUERY)
+            if not cur.fetchone()[0]:
+                conn.commit()
+                return None
+            # 여러 워커가 동시에 시작해도 한 곳만 계산하도록 행을 잠그고 다시 확인합니다.
+            cur.execute("SELECT needs_rebuild FROM positions_state WHERE id = 1 FOR UPDATE;")
+            if not cur.fetchone()[0]:
+                conn.commit()
+                return None
+            count = _rebuild_all_positions(conn)
+            conn.commit()
+            return count
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_latest_exchange_rates():
+    """DB에서 각 통화별 최신 화율 정보를 가져오기"""
+    with db_connection() as conn:
+        # RealDictCursor를 사용하면 결과가 {'currency_code': 'USD', 'rate': 1470} 처럼 딕셔너리 형태로 나와서 다루기 편합니다.
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            # 각 통화(currency_code)별로 날짜(rate_date)가 가장 최신인 것 1개씩만 가져오는 SQL
+            query = """
+            SELECT DISTINCT ON (currency_code)
+                    id, currency_code, country_name, rate, rate_date
+            FROM exchange_rates
+            ORDER BY currency_code, rate_date DESC;
+            """
+            cur.execute(query)
+            rates = cur.fetchall()
+            conn.commit()
+            return rates
+
+        except Exception as e:
+            conn.rollback()
+            print(f"환율 데이터 조회 실패 : {e}")
+
+        finally:
+            cur.close()
+
+
+# 평균 단가는 매수 수량으로 가중한 값이고, 매도 시에는 수량만 줄어듭니다.
+HOLDINGS_QUERY = """
+SELECT 
+    stock_code, 
+    quantity as total_quantity, 
+    avg_cost as avg_buy_price, 
+    currency
+FROM positions
+WHERE quantity > 0
+ORDER BY stock_code;
+"""
+
+TRADES_VERSION_QUERY = "SELECT version FROM trades_version WHERE id = 1;"
+
+
+def _read_holdings(cur):
+    cur.execute(POSITIONS_STATE_QUERY)
+    if cur.fetchone()[0]:
+        raise PositionsNotReady("잔고(positions)를 다시 계산하는 중입니다. 잠시 후 다시 시도하세요.")
+    cur.execute(HOLDINGS_QUERY)
+    # 결과값을 딕셔너리 리스트 형태로 변환 (API가 이해하기 쉽게)
+    columns = [desc[0] for desc in cur.description]
+    return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+@_timed_db
+def get_stock_holdings():
+    """
+    add_trade가 함께 갱신해 두는 positions 테이블에서 잔고를 읽습니다. (거래 수와 무관하게 종목 수만큼만 읽음)
+    positions를 아직 다시 계산하지 않았으면 PositionsNotReady, 그 밖의 오류도 빈 목록으로 바꾸지 않고 그대로 올립니다.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            result = _read_holdings(cur)
+            conn.commit()
+            return result
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_trades_version():
+    """거래 기록이 바뀔 때마다 트리거가 1씩 올리는 버전 번호 (006 마이그레이션)"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(TRADES_VERSION_QUERY)
+            version = cur.fetchone()[0]
+            conn.commit()
+            return version
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_stock_holdings_versioned():
+    """
+    (거래 버전, 잔고 목록)을 함께 읽습니다. 오류는 get_stock_holdings와 같이 그대로 올립니다.
+    버전을 먼저 읽으므로 잔고는 적어도 그 버전만큼은 최신입니다. (사이에 저장된 거래는 다음 버전에서 다시 읽힘)
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(TRADES_VERSION_QUERY)
+            version = cur.fetchone()[0]
+            result = _read_holdings(cur)
+            conn.commit()
+            return version, result
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def add_trade(stock_code, quantity, price, currency, trade_type=None, idempotency_key=None):
+    """
+    사용자가 매수/매도 버튼을 누르면 호출되어 trades 테이블에 기록을 남깁니다.
+    같은 트랜잭션 안에서 positions 잔고도 함께 갱신합니다. (매도는 음수 수량)
+    trade_type을 주지 않으면 수량 부호로 'BUY'/'SELL'을 정합니다.
+    idempotency_key로 이미 저장된 거래가 있으면 새로 저장하지 않습니다. 저장된 거래의 id를 돌려줍니다.
+    """
+    # trade_date는 현재 시간으로 저장
+    trade_type = trade_type or ("SELL" if quantity < 0 else "BUY")
+    query = """
+    INSERT INTO trades (stock_code, quantity, price, currency, trade_type, trade_date)
+    VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+    RETURNING id;
+    """
+    params = (stock_code, quantity, price, currency, trade_type)
+    if idempotency_key:
+        query = """
+        INSERT INTO trades (stock_code, quantity, price, currency, trade_type, trade_date, idempotency_key)
+        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP, %s)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        RETURNING id;
+        """
+        params += (idempotency_key,)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(query, params)
+            row = cur.fetchone()
+            if row is None:
+                # 같은 키로 이미 저장된 거래 (재시도)
+                cur.execute("SELECT id FROM trades WHERE idempotency_key = %s;", (idempotency_key,))
+                trade_id = cur.fetchone()[0]
+                conn.commit()
+                return trade_id
+            trade_id = row[0]
+            cur.execute(POSITION_UPSERT_QUERY, {
+                "stock_code": stock_code,
+                "currency": currency,
+                "quantity": quantity,
+                "price": price,
+                "trade_id": trade_id,
+            })
+            conn.commit()
+            return trade_id
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+# 다시 시도해도 똑같이 실패하는, 데이터 자체가 잘못된 오류 (길이 초과, 숫자 범위, 제약 위반 등)
+# 연결 끊김이나 풀 대기 시간 초과처럼 나중에 다시 하면 되는 오류와 구분할 때 씁니다. (trade_queue의 데드레터)
+ROW_REJECTED_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+
+@_timed_db
+def insert_trades_batch(trades):
+    """
+    거래 대기열(api/trade_queue.py)에서 꺼낸 거래들을 한 트랜잭션으로 저장합니다.
+    trades: {"idempotency_key", "stock_code", "quantity", "price", "currency", "trade_type", "trade_date"} 목록
+    이미 저장된 키는 건너뛰고(재처리), 새로 저장된 거래만 (trade_date, id) 순서로 positions에 반영합니다.
+    {idempotency_key: trade_id}를 돌려줍니다. (이미 있던 거래 포함)
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            inserted = dict(execute_values(cur, """
+            INSERT INTO trades (idempotency_key, stock_code, quantity, price, currency, trade_type, trade_date)
+            VALUES %s
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING idempotency_key, id;
+            """, [(t["idempotency_key"], t["stock_code"], t["quantity"], t["price"], t["currency"],
+                   t["trade_type"], t["trade_date"]) for t in trades], page_size=len(trades), fetch=True))
+            new = sorted((t for t in trades if t["idempotency_key"] in inserted), key=lambda t: t["trade_date"])
+            if new:
+                # 같은 종목에 더 늦은 날짜의 거래가 이미 있으면(다른 워커의 대기열을 늦게 저장한 경우 등)
+                # 뒤에 덧붙이면 순서가 어긋나므로 그 종목들을 (trade_date, id) 순서로 다시 계산합니다.
+                keys = {(t["stock_code"], t["currency"]) for t in new}
+                cur.execute("""
+                SELECT 1 FROM trades
+                WHERE stock_code = ANY(%s) AND trade_date > %s::timestamp AND id <> ALL(%s)
+                LIMIT 1;
+                """, (list({code for code, _ in keys}), new[0]["trade_date"], list(inserted.values())))
+                if cur.fetchone() is not None:
+                    replay_positions(conn, keys)
+                else:
+                    for t in new:
+                        cur.execute(POSITION_UPSERT_QUERY, {
+                            "stock_code": t["stock_code"],
+                            "currency": t["currency"],
+                            "quantity": t["quantity"],
+                            "price": t["price"],
+                            "trade_id": inserted[t["idempotency_key"]],
+                        })
+                # 이미 만들어 둔 날짜의 스냅샷에 들어가야 할 거래가 늦게 저장됐다면 그 스냅샷을 지웁니다. (copy_trades와 같은 규칙)
+                cur.execute("""
+                DELETE FROM position_snapshot_index WHERE snapshot_date >= %s::date;
+                """, (new[0]["trade_date"],))
+            keys = [t["idempotency_key"] for t in trades]
+            existing = [k for k in keys if k not in inserted]
+            if existing:
+                cur.execute("SELECT idempotency_key, id FROM trades WHERE idempotency_key = ANY(%s);", (existing,))
+                inserted.update(cur.fetchall())
+            conn.commit()
+            return inserted
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_trade_by_idempotency_key(idempotency_key):
+    """멱등 키로 저장된 거래 {'id', 'trade_date'} (없으면 None)"""
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cur.execute("SELECT id, trade_date FROM trades WHERE idempotency_key = %s;", (idempotency_key,))
+            row = cur.fetchone()
+            conn.commit()
+            return row
+        finally:
+            cur.close()
+
+
+def _replay_trades(cur, positions, after, until):
+    """positions {(종목, 통화): (수량, 평단가)}에 (after, until] 날짜 구간의 거래를 (trade_date, id) 순서로 반영합니다."""
+    cur.execute("""
+    SELECT stock_code, currency, quantity, price
+    FROM trades
+    WHERE (%(after)s::date IS NULL OR trade_date >= %(after)s::date + 1)
+      AND trade_date < %(until)s::date + 1
+    ORDER BY trade_date, id;
+    """, {"after": after, "until": until})
+    for code, currency, qty, price in cur:
+        quantity, avg_cost = positions.get((code, currency), (0, 0))
+        positions[(code, currency)] = apply_trade_to_position(quantity, avg_cost, qty, price)
+    return positions
+
+
+def _load_snapshot(cur, as_of):
+    """as_of 이전(포함) 가장 가까운 스냅샷의 (날짜, 잔고)를 돌려줍니다. 없으면 (None, {})"""
+    cur.execute("SELECT MAX(snapshot_date) FROM position_snapshot_index WHERE snapshot_date <= %s;", (as_of,))
+    snapshot_date = cur.fetchone()[0]
+    positions = {}
+    if snapshot_date is not None:
+        cur.execute("""
+        SELECT stock_code, currency, quantity, avg_cost FROM position_snapshots WHERE snapshot_date = %s;
+        """, (snapshot_date,))
+        positions = {(code, currency): (q, a) for code, currency, q, a in cur.fetchall()}
+    return snapshot_date, positions
+
+
+@_timed_db
+def get_holdings_as_of(as_of):
+    """
+    as_of 날짜 장 마감 기준 잔고를 get_stock_holdings와 같은 형식으로 돌려줍니다.
+    가장 가까운 이전 스냅샷에서 시작해 그 이후 거래만 다시 계산합니다.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            snapshot_date, positions = _load_snapshot(cur, as_of)
+            _replay_trades(cur, positions, snapshot_date, as_of)
+            conn.commit()
+        finally:
+            cur.close()
+    return [
+        {"stock_code": code, "total_quantity": q, "avg_buy_price": a, "currency": currency}
+        for (code, currency), (q, a) in sorted(positions.items())
+        if q > 0
+    ]
+
+
+@_timed_db
+def create_position_snapshots(until=None, interval_days=None):
+    """
+    마지막 스냅샷부터 interval_days 간격으로 until(기본: 어제)까지 빠진 스냅샷을 만듭니다.
+    스냅샷이 하나도 없으면 첫 거래일부터 시작합니다. 만든 스냅샷 날짜 목록을 돌려줍니다.
+    각 스냅샷은 직전 스냅샷 + 그 사이 거래로 계산하므로 trades 전체를 반복해서 읽지 않습니다.
+    """
+    until = until or date.today() - timedelta(days=1)
+    interval = timedelta(days=interval_days or SNAPSHOT_INTERVAL_DAYS)
+    created = []
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            snapshot_date, positions = _load_snapshot(cur, until)
+            if snapshot_date is None:
+                cur.execute("SELECT MIN(trade_date)::date FROM trades;")
+                first_trade = cur.fetchone()[0]
+                if first_trade is None:
+                    conn.commit()
+                    return created
+                next_date = first_trade
+            else:
+                next_date = snapshot_date + interval
+
+            while next_date <= until:
+                _replay_trades(cur, positions, snapshot_date, next_date)
+                rows = [(next_date, code, currency, q, a) for (code, currency), (q, a) in positions.items() if q != 0]
+                cur.execute("""
+                INSERT INTO position_snapshot_index (snapshot_date, positions) VALUES (%s, %s)
+                ON CONFLICT (snapshot_date) DO NOTHING;
+                """, (next_date, len(rows)))
+                if cur.rowcount and rows:
+                    execute_values(cur, """
+                    INSERT INTO position_snapshots (snapshot_date, stock_code, currency, quantity, avg_cost) VALUES %s
+                    """, rows)
+                # 스냅샷 하나마다 커밋해서 중간에 멈춰도 다음 실행이 이어서 만듭니다.
+                conn.commit()
+                created.append(next_date)
+                snapshot_date, next_date = next_date, next_date + interval
+            return created
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def compact_position_snapshots(keep_days=None):
+    """keep_days보다 오래된 스냅샷은 달마다 마지막 것 하나만 남기고 지웁니다. 지운 개수를 돌려줍니다."""
+    cutoff = date.today() - timedelta(days=SNAPSHOT_KEEP_DAYS if keep_days is None else keep_days)
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+            DELETE FROM position_snapshot_index
+            WHERE snapshot_date < %(cutoff)s
+              AND snapshot_date NOT IN (
+                  SELECT MAX(snapshot_date)
+                  FROM position_snapshot_index
+                  WHERE snapshot_date < %(cutoff)s
+                  GROUP BY date_trunc('month', snapshot_date)
+              );
+            """, {"cutoff": cutoff})
+            deleted = cur.rowcount
+            conn.commit()
+            return deleted
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+class _CopyStream:
+    """행(tuple) 이터레이터를 COPY ... FROM STDIN이 읽을 수 있는 CSV 파일처럼 보이게 합니다."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = ""
+        self._out = io.StringIO()
+        self._writer = csv.writer(self._out, lineterminator="\n")
+
+    def _encode(self, row):
+        self._out.seek(0)
+        self._out.truncate()
+        self._writer.writerow(row)
+        return self._out.getvalue()
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += self._encode(row)
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    readline = read
+
+
+@_timed_db
+def copy_trades(rows):
+    """
+    거래 기록을 COPY로 한 트랜잭션에 대량 저장합니다.
+    rows: (stock_code, quantity, price, currency, trade_type, trade_date) 튜플의 이터러블
+          (제너레이터를 넘기면 전체를 메모리에 올리지 않고 흘려보냅니다)
+    저장이 끝나면 영향을 받은 종목의 positions를 한 번만 다시 계산합니다.
+    """
+    touched = set()
+    counter = [0]
+
+    def tracked(source):
+        for row in source:
+            touched.add((row[0], row[3]))
+            counter[0] += 1
+            yield row
+
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM trades;")
+            max_id_before = cur.fetchone()[0]
+            cur.copy_expert("""
+            COPY trades (stock_code, quantity, price, currency, trade_type, trade_date)
+            FROM STDIN WITH (FORMAT csv)
+            """, _CopyStream(tracked(rows)))
+            # 거래마다가 아니라 가져오기가 끝난 뒤 종목별로 한 번씩만 잔고를 재계산합니다.
+            replay_positions(conn, touched)
+            # 과거 날짜 거래가 들어왔다면 그 날짜 이후의 잔고 스냅샷은 더 이상 맞지 않으므로 지웁니다.
+            cur.execute("""
+            DELETE FROM position_snapshot_index
+            WHERE snapshot_date >= (SELECT MIN(trade_date)::date FROM trades WHERE id > %s);
+            """, (max_id_before,))
+            conn.commit()
+            return counter[0]
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_history_sync(symbol, interval):
+    """시세 이력 동기화 상태 {'synced_from', 'synced_to', 'last_bar', 'synced_at'} (없으면 None)"""
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cur.execute("""
+            SELECT synced_from, synced_to, last_bar, synced_at
+            FROM price_history_sync
+            WHERE symbol = %s AND bar_interval = %s;
+            """, (symbol, interval))
+            row = cur.fetchone()
+            conn.commit()
+            return row
+        finally:
+            cur.close()
+
+
+@_timed_db
+def save_price_bars(symbol, interval, bars, synced_from, synced_to):
+    """
+    받아 온 봉을 저장하고 동기화 상태를 갱신합니다. (한 트랜잭션)
+    bars: (bar_date, open, high, low, close, adj_close, volume) 튜플 목록
+    같은 날짜의 봉은 덮어씁니다. (장중에 받은 마지막 봉이 나중에 확정되므로)
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            if bars:
+                execute_values(cur, """
+                INSERT INTO price_history (symbol, bar_interval, bar_date, open, high, low, close, adj_close, volume)
+                VALUES %s
+                ON CONFLICT (symbol, bar_interval, bar_date) DO UPDATE SET
+                    open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+                    close = EXCLUDED.close, adj_close = EXCLUDED.adj_close, volume = EXCLUDED.volume;
+                """, [(symbol, interval, *bar) for bar in bars])
+            cur.execute("""
+            INSERT INTO price_history_sync (symbol, bar_interval, synced_from, synced_to, last_bar, synced_at)
+            VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (symbol, bar_interval) DO UPDATE SET
+                synced_from = LEAST(price_history_sync.synced_from, EXCLUDED.synced_from),
+                synced_to = GREATEST(price_history_sync.synced_to, EXCLUDED.synced_to),
+                last_bar = GREATEST(price_history_sync.last_bar, EXCLUDED.last_bar),
+                synced_at = CURRENT_TIMESTAMP;
+            """, (symbol, interval, synced_from, synced_to, max((b[0] for b in bars), default=None)))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_price_history(symbol, interval, start, end):
+    """로컬에 저장된 봉을 날짜순으로 돌려줍니다. (start, end 포함)"""
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cur.execute("""
+            SELECT bar_date, open, high, low, close, adj_close, volume
+            FROM price_history
+            WHERE symbol = %s AND bar_interval = %s AND bar_date BETWEEN %s AND %s
+            ORDER BY bar_date;
+            """, (symbol, interval, start, end))
+            rows = cur.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_history_sync_many(symbols, interval):
+    """여러 종목의 시세 이력 동기화 상태를 한 번에 읽습니다. {symbol: get_history_sync와 같은 dict} (없는 종목은 빠짐)"""
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cur.execute("""
+            SELECT symbol, synced_from, synced_to, last_bar, synced_at
+            FROM price_history_sync
+            WHERE symbol = ANY(%s) AND bar_interval = %s;
+            """, (list(symbols), interval))
+            rows = cur.fetchall()
+            conn.commit()
+            return {row.pop("symbol"): row for row in rows}
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_first_trade_dates():
+    """종목별 첫 거래일 {stock_code: date} (분석용 시세 이력을 어디서부터 받아 둘지 정할 때 사용)"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT stock_code, MIN(trade_date)::date FROM trades GROUP BY stock_code;")
+            rows = cur.fetchall()
+            conn.commit()
+            return dict(rows)
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_trade_history(end=None):
+    """분석용: (stock_code, currency, quantity, price, trade_date) 목록을 시간순으로 돌려줍니다. (end 날짜 포함)"""
+    query = """
+    SELECT stock_code, currency, quantity::float8, price::float8, trade_date
+    FROM trades
+    WHERE (%(end)s::date IS NULL OR trade_date < %(end)s::date + 1)
+    ORDER BY trade_date, id;
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(query, {"end": end})
+            rows = cur.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            cur.close()
+
+
+TRADE_COLUMNS = ("id", "stock_code", "quantity", "price", "currency", "trade_type", "trade_date")
+TRADE_EXPORT_CHUNK = 2000  # 내보내기에서 서버 측 커서로 한 번에 가져오는 행 수
+
+
+def _trade_filters(stock_code=None, currency=None, trade_type=None, start=None, end=None):
+    """거래 목록/내보내기 공통 WHERE 조건 (end 날짜 포함)"""
+    conditions, params = [], {}
+    if stock_code:
+        conditions.append("stock_code = %(stock_code)s")
+        params["stock_code"] = stock_code
+    if currency:
+        conditions.append("currency = %(currency)s")
+        params["currency"] = currency
+    if trade_type:
+        conditions.append("trade_type = %(trade_type)s")
+        params["trade_type"] = trade_type
+    if start:
+        conditions.append("trade_date >= %(start)s::date")
+        params["start"] = start
+    if end:
+        conditions.append("trade_date < %(end)s::date + 1")
+        params["end"] = end
+    return conditions, params
+
+
+@_timed_db
+def list_trades(after=None, limit=100, descending=True, **filters):
+    """
+    거래 기록을 (trade_date, id) 순서로 limit건 읽습니다. (키셋 페이지네이션)
+    after: 이전 페이지 마지막 행의 (trade_date, id). 주면 그 다음 행부터 읽으므로 OFFSET처럼 앞 페이지를 다시 훑지 않습니다.
+    (행 목록, 다음 페이지가 있는지)를 돌려줍니다.
+    """
+    conditions, params = _trade_filters(**filters)
+    if after is not None:
+        conditions.append(f"(trade_date, id) {'<' if descending else '>'} (%(after_date)s, %(after_id)s)")
+        params["after_date"], params["after_id"] = after
+    order = "DESC" if descending else "ASC"
+    query = f"""
+    SELECT {", ".join(TRADE_COLUMNS)}
+    FROM trades
+    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+    ORDER BY trade_date {order}, id {order}
+    LIMIT %(limit)s;
+    """
+    params["limit"] = limit + 1   # 한 건 더 읽어서 다음 페이지 여부를 판단
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            conn.commit()
+            return rows[:limit], len(rows) > limit
+        finally:
+            cur.close()
+
+
+def iter_trades(chunk_size=TRADE_EXPORT_CHUNK, **filters):
+    """
+    조건에 맞는 거래 기록을 오래된 순으로 chunk_size행씩 나눠 돌려주는 제너레이터 (행은 TRADE_COLUMNS 순서의 튜플)
+    서버 측(named) 커서를 쓰므로 행이 아무리 많아도 메모리에는 한 묶음만 올라옵니다.
+    다 읽거나 중간에 닫힐 때까지 커넥션 하나를 붙잡고 있습니다.
+    """
+    conditions, params = _trade_filters(**filters)
+    query = f"""
+    SELECT {", ".join(TRADE_COLUMNS)}
+    FROM trades
+    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+    ORDER BY trade_date, id;
+    """
+    with db_connection() as conn:
+        cur = conn.cursor(name="trades_export")
+        cur.itersize = chunk_size
+        try:
+            cur.execute(query, params)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            # 다 읽었든 클라이언트가 중간에 끊었든(GeneratorExit) 커서를 닫고 읽기 트랜잭션을 끝낸 뒤 반납합니다.
+            cur.close()
+            conn.rollback()
+
+
+@_timed_db
+def get_close_prices(symbols, start, end, interval="1d"):
+    """
+    분석용: price_history 종가를 종목별 배열로 돌려줍니다.
+    [(symbol, [1970-01-01 기준 일수, ...], [종가, ...]), ...] (날짜순)
+    행 단위 대신 종목당 한 행으로 받아 수십만 개의 파이썬 튜플을 만들지 않습니다.
+    """
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+            SELECT symbol,
+                   array_agg(bar_date - DATE '1970-01-01' ORDER BY bar_date),
+                   array_agg(close::float8 ORDER BY bar_date)
+            FROM price_history
+            WHERE bar_interval = %s AND symbol = ANY(%s) AND bar_date BETWEEN %s AND %s
+            GROUP BY symbol;
+            """, (interval, list(symbols), start, end))
+            rows = cur.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_exchange_rate_history(end):
+    """분석용: exchange_rates 이력을 통화별 배열로 돌려줍니다. (end 날짜까지, 형식은 get_close_prices와 같음)"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+            SELECT currency_code,
+                   array_agg(rate_date - DATE '1970-01-01' ORDER BY rate_date),
+                   array_agg(rate::float8 ORDER BY rate_date)
+            FROM exchange_rates
+            WHERE rate_date <= %s
+            GROUP BY currency_code;
+            """, (end,))
+            rows = cur.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            cur.close()
+
+
+async def get_latest_exchange_rates_async():
+    return await run_db(get_latest_exchange_rates)
+
+
+async def get_stock_holdings_async():
+    return await run_db(get_stock_holdings)
+
+
+async def get_holdings_as_of_async(as_of):
+    return await run_db(get_holdings_as_of, as_of)
+
+
+async def add_trade_async(stock_code, quantity, price, currency, trade_type=None, idempotency_key=None):
+    return await run_db(add_trade, stock_code, quantity, price, currency, trade_type, idempotency_key)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+"""
+로트(매수 단위) 회계 엔진과 실현손익
+
+trades에 거래가 들어오면 DB 트리거가 방식별 대기열(lot_pending, 009 마이그레이션)에 넣어 두고,
+이 엔진은 대기열의 거래를 (trade_date, id) 순서로 읽어 열린 로트(lots)와 실현손익(realized_pnl)을 갱신한 뒤 대기열에서 지웁니다.
+조회 API는 이 두 테이블만 읽으므로 trades 전체를 다시 훑지 않습니다.
+
+- fifo: 매수 1건마다 로트를 만들고, 매도는 가장 먼저 산 로트부터 차감
+- average: 종목별 로트 하나에 이동평균 단가를 유지 (positions의 평단가와 같은 규칙)
+
+진행 위치를 id로 기억하지 않으므로 커밋 순서가 id 순서와 달라도 빠지는 거래가 없습니다.
+이미 반영한 거래보다 앞선 날짜의 거래가 나중에 들어오면 그 종목만 로트를 지우고 처음부터 다시 반영합니다.
+금액은 모두 거래 통화 기준이며, 중간에 멈춰도 배치 단위로 커밋되므로 다시 실행하면 이어서 처리합니다.
+"""
+from psycopg2.extras import RealDictCursor, execute_values
+
+from common.database import db_connection
+from common.metrics import DB_QUERY_SECONDS, timed_function
+
+LOT_METHODS = ("fifo", "average")
+LOT_BATCH_SIZE = 5000
+
+_timed_db = timed_function(DB_QUERY_SECONDS, "db")
+
+
+class LotBook:
+    """한 방식(fifo/average)의 열린 로트를 메모리에 들고 거래를 하나씩 반영합니다."""
+
+    def __init__(self, method):
+        if method not in LOT_METHODS:
+            raise ValueError(f"지원하지 않는 로트 방식입니다: {method}")
+        self.method = method
+        self.open = {}      # (stock_code, currency) -> 열린 로트 목록 (오래된 순)
+        self.dirty = {}     # open_trade_id -> 로트 (DB에 다시 써야 하는 로트)
+
+    def load(self, key, lots):
+        """DB에서 읽은 열린 로트를 등록합니다. (이미 읽은 종목은 무시)"""
+        self.open.setdefault(key, list(lots))
+
+    def apply(self, trade_id, stock_code, currency, quantity, price, trade_date):
+        """거래 1건을 반영하고, 매도였다면 실현손익 행 목록을 돌려줍니다."""
+        key = (stock_code, currency)
+        lots = self.open.setdefault(key, [])
+        if quantity > 0:
+            self._buy(lots, trade_id, stock_code, currency, quantity, price, trade_date)
+            return []
+        if quantity < 0:
+            return self._sell(lots, trade_id, stock_code, currency, -quantity, price, trade_date)
+        return []
+
+    def _buy(self, lots, trade_id, stock_code, currency, quantity, price, trade_date):
+        if self.method == "average" and lots:
+            lot = lots[0]
+            lot["cost"] = (lot["remaining"] * lot["cost"] + quantity * price) / (lot["remaining"] + quantity)
+            lot["quantity"] += quantity
+            lot["remaining"] += quantity
+        else:
+            lot = {
+                "open_trade_id": trade_id, "stock_code": stock_code, "currency": currency,
+                "opened_at": trade_date, "quantity": quantity, "remaining": quantity,
+                "cost": price, "closed_at": None,
+            }
+            lots.append(lot)
+        self.dirty[lot["open_trade_id"]] = lot
+
+    def _sell(self, lots, trade_id, stock_code, currency, quantity, price, trade_date):
+        realized = []
+        while quantity > 0 and lots:
+            lot = lots[0]
+            matched = min(quantity, lot["remaining"])
+            lot["remaining"] -= matched
+            quantity -= matched
+            realized.append((self.method, trade_id, lot["open_trade_id"], stock_code, currency,
+                             matched, lot["cost"], price, (price - lot["cost"]) * matched, trade_date))
+            if lot["remaining"] <= 0:
+                lot["closed_at"] = trade_date
+                lots.pop(0)
+            self.dirty[lot["open_trade_id"]] = lot
+        if quantity > 0:
+            # 보유 수량보다 많이 판 부분은 맞출 로트가 없으므로 원가 없이 기록만 남깁니다.
+            realized.append((self.method, trade_id, None, stock_code, currency,
+                             quantity, None, price, None, trade_date))
+        return realized
+
+    def take_dirty(self):
+        lots = list(self.dirty.values())
+        self.dirty = {}
+        return lots
+
+
+def _load_open_lots(cur, book, keys):
+    """아직 메모리에 없는 종목의 열린 로트를 한 번에 읽어 옵니다."""
+    keys = {key for key in keys if key not in book.open}
+    if not keys:
+        return
+    cur.execute("""
+    SELECT open_trade_id, stock_code, currency, opened_at, quantity, remaining, cost, closed_at
+    FROM lots
+    WHERE method = %s AND stock_code = ANY(%s) AND remaining > 0
+    ORDER BY opened_at, open_trade_id;
+    """, (book.method, list({code for code, _ in keys})))
+    found = {}
+    for row in cur.fetchall():
+        key = (row["stock_code"], row["currency"])
+        if key in keys:
+            found.setdefault(key, []).append(dict(row))
+    for key in keys:
+        book.load(key, found.get(key, []))
+
+
+def _backdated_keys(cur, method, trades):
+    """
+    대기열 거래보다 (trade_date, id)가 뒤인 거래를 이미 반영한 종목을 찾습니다.
+    trades는 대기열 앞부분을 순서대로 읽은 것이라 종목별 첫 거래가 그 종목에서 가장 이른 대기 거래입니다.
+    """
+    first = {}
+    for t in trades:
+        first.setdefault((t["stock_code"], t["currency"]), t)
+    rows = list(first.values())
+    cur.execute("""
+    SELECT k.stock_code, k.currency
+    FROM unnest(%s::text[], %s::text[], %s::timestamp[], %s::bigint[]) AS k(stock_code, currency, trade_date, id)
+    WHERE EXISTS (
+        SELECT 1 FROM trades t
+        WHERE t.stock_code = k.stock_code AND t.currency = k.currency
+          AND (t.trade_date, t.id) > (k.trade_date, k.id)
+          AND NOT EXISTS (SELECT 1 FROM lot_pending p WHERE p.method = %s AND p.trade_id = t.id)
+    );
+    """, ([r["stock_code"] for r in rows], [r["currency"] for r in rows],
+          [r["trade_date"] for r in rows], [r["id"] for r in rows], method))
+    return {(row["stock_code"], row["currency"]) for row in cur.fetchall()}
+
+
+def _rewind(cur, book, keys):
+    """keys 종목의 로트/실현손익을 지우고, 그 종목의 거래를 모두 대기열에 다시 넣습니다."""
+    params = {"method": book.method, "codes": [code for code, _ in keys], "currencies": [c for _, c in keys]}
+    for table in ("lots", "realized_pnl"):
+        cur.execute(f"""
+        DELETE FROM {table}
+        WHERE method = %(method)s
+          AND (stock_code, currency) IN (SELECT * FROM unnest(%(codes)s::text[], %(currencies)s::text[]));
+        """, params)
+    cur.execute("""
+    INSERT INTO lot_pending (method, trade_id)
+    SELECT %(method)s, t.id
+    FROM trades t
+    JOIN unnest(%(codes)s::text[], %(currencies)s::text[]) AS k(stock_code, currency)
+      ON t.stock_code = k.stock_code AND t.currency = k.currency
+    ON CONFLICT DO NOTHING;
+    """, params)
+    for key in keys:
+        book.open.pop(key, None)
+
+
+def _save_batch(cur, book, realized, trades):
+    lots = book.take_dirty()
+    if lots:
+        execute_values(cur, """
+        INSERT INTO lots (method, open_trade_id, stock_code, currency, opened_at, quantity, remaining, cost, closed_at)
+        VALUES %s
+        ON CONFLICT (method, open_trade_id) DO UPDATE SET
+            quantity = EXCLUDED.quantity,
+            remaining = EXCLUDED.remaining,
+            cost = EXCLUDED.cost,
+            closed_at = EXCLUDED.closed_at;
+        """, [(book.method, l["open_trade_id"], l["stock_code"], l["currency"], l["opened_at"],
+               l["quantity"], l["remaining"], l["cost"], l["closed_at"]) for l in lots])
+    if realized:
+        execute_values(cur, """
+        INSERT INTO realized_pnl (method, sell_trade_id, open_trade_id, stock_code, currency,
+                                  quantity, cost, price, pnl, realized_at)
+        VALUES %s
+        """, realized)
+    cur.execute("DELETE FROM lot_pending WHERE method = %s AND trade_id = ANY(%s);",
+                (book.method, [t["id"] for t in trades]))
+    cur.execute("UPDATE lot_engine_state SET updated_at = CURRENT_TIMESTAMP WHERE method = %s;", (book.method,))
+
+
+@_timed_db
+def process_lots(method, batch_size=LOT_BATCH_SIZE):
+    """
+    대기열(lot_pending)에 있는 거래를 처리합니다. 처리한 거래 수를 돌려줍니다.
+    batch_size건마다 로트/실현손익/대기열 삭제를 한 트랜잭션으로 커밋합니다.
+    같은 방식을 동시에 실행하면 뒤에 온 쪽은 앞의 처리가 끝날 때까지 기다렸다가 남은 거래만 처리합니다.
+    """
+    book = LotBook(method)
+    processed = 0
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            while True:
+                # 방식 행을 잠가서 같은 방식을 두 곳에서 동시에 처리하지 않도록 합니다.
+                cur.execute("SELECT method FROM lot_engine_state WHERE method = %s FOR UPDATE;", (method,))
+                if cur.fetchone() is None:
+                    raise RuntimeError("lot_engine_state가 없습니다. 먼저 migrate를 실행하세요.")
+                cur.execute("""
+                SELECT t.id, t.stock_code, t.currency, t.quantity, t.price, t.trade_date
+                FROM lot_pending p
+                JOIN trades t ON t.id = p.trade_id
+                WHERE p.method = %s
+                ORDER BY t.trade_date, t.id
+                LIMIT %s;
+                """, (method, batch_size))
+                trades = cur.fetchall()
+                if not trades:
+                    conn.commit()
+                    return processed
+
+                backdated = _backdated_keys(cur, method, trades)
+                if backdated:
+                    # 이미 반영한 거래보다 앞선 날짜의 거래: 그 종목만 처음부터 다시 반영하도록 되돌리고 대기열을 다시 읽습니다.
+                    _rewind(cur, book, backdated)
+                    conn.commit()
+                    continue
+
+                _load_open_lots(cur, book, {(t["stock_code"], t["currency"]) for t in trades})
+                realized = []
+                for t in trades:
+                    realized.extend(book.apply(t["id"], t["stock_code"], t["currency"],
+                                               t["quantity"], t["price"], t["trade_date"]))
+                _save_batch(cur, book, realized, trades)
+                conn.commit()
+                processed += len(trades)
+                if len(trades) < batch_size:
+                    return processed
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def reset_lots(method):
+    """방식의 로트/실현손익을 지우고 모든 거래를 대기열에 다시 넣어 처음부터 처리하게 합니다."""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT 1 FROM lot_engine_state WHERE method = %s FOR UPDATE;", (method,))
+            cur.execute("DELETE FROM lots WHERE method = %s;", (method,))
+            cur.execute("DELETE FROM realized_pnl WHERE method = %s;", (method,))
+            cur.execute("""
+            INSERT INTO lot_pending (method, trade_id) SELECT %s, id FROM trades ON CONFLICT DO NOTHING;
+            """, (method,))
+            cur.execute("UPDATE lot_engine_state SET updated_at = CURRENT_TIMESTAMP WHERE method = %s;", (method,))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_realized_pnl(method, start=None, end=None, stock_code=None):
+    """기간 내 실현손익을 종목/통화별로 합산해 돌려줍니다. (end 날짜 포함)"""
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cur.execute("""
+            SELECT stock_code, currency,
+                   SUM(quantity) AS quantity,
+                   SUM(cost * quantity) AS cost_basis,
+                   SUM(price * quantity) AS proceeds,
+                   SUM(pnl) AS pnl,
+                   SUM(CASE WHEN open_trade_id IS NULL THEN quantity ELSE 0 END) AS unmatched_quantity,
+                   COUNT(DISTINCT sell_trade_id) AS sells
+            FROM realized_pnl
+            WHERE method = %(method)s
+              AND (%(start)s::date IS NULL OR realized_at >= %(start)s::date)
+              AND (%(end)s::date IS NULL OR realized_at < %(end)s::date + 1)
+              AND (%(code)s::text IS NULL OR stock_code = %(code)s)
+            GROUP BY stock_code, currency
+            ORDER BY stock_code, currency;
+            """, {"method": method, "start": start, "end": end, "code": stock_code})
+            rows = cur.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            cur.close()
+
+
+@_timed_db
+def get_open_lots(method, stock_code=None):
+    """열린 로트 목록 (종목, 매수 날짜 순서대로)"""
+    with db_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cur.execute("""
+            SELECT open_trade_id, stock_code, currency, opened_at, quantity, remaining, cost
+            FROM lots
+            WHERE method = %(method)s AND remaining > 0
+              AND (%(code)s::text IS NULL OR stock_code = %(code)s)
+            ORDER BY stock_code, currency, opened_at, open_trade_id;
+            """, {"method": method, "code": stock_code})
+            rows = cur.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            cur.close()
@@ -0,0 +1,81 @@
+"""
+DB 관리용 명령어 모음
+
+사용법 (프로젝트 루트에서):
+    python common/manage.py migrate             # common/migrations의 SQL 적용
+    python common/manage.py rebuild-positions   # trades 전체로 positions 테이블 재계산
+    python common/manage.py process-lots        # 새 거래를 로트/실현손익에 반영 (--reset이면 처음부터)
+    python common/manage.py snapshot            # 밀린 잔고 스냅샷 생성 (SNAPSHOT_INTERVAL_DAYS 간격)
+    python common/manage.py compact-snapshots   # 오래된 스냅샷은 월말 것만 남기고 정리
+"""
+import argparse
+import sys, os
+
+# 부모 폴더의 common 폴더를 참조하기 위한 설정
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.database import apply_migrations, rebuild_positions, create_position_snapshots, compact_position_snapshots
+from common.lots import LOT_METHODS, process_lots, reset_lots
+
+
+def cmd_migrate(args):
+    applied = apply_migrations()
+    if applied:
+        for name in applied:
+            print(f"✅ 적용 완료: {name}")
+    else:
+        print("적용할 마이그레이션이 없습니다.")
+
+
+def cmd_rebuild_positions(args):
+    count = rebuild_positions()
+    print(f"✅ positions 재계산 완료: {count}개 종목")
+
+
+def cmd_process_lots(args):
+    methods = LOT_METHODS if args.method == "all" else (args.method,)
+    for method in methods:
+        if args.reset:
+            reset_lots(method)
+        count = process_lots(method)
+        print(f"✅ {method} 로트 처리 완료: 새 거래 {count}건")
+
+
+def cmd_snapshot(args):
+    created = create_position_snapshots(interval_days=args.interval_days)
+    if created:
+        print(f"✅ 잔고 스냅샷 {len(created)}개 생성: {created[0]} ~ {created[-1]}")
+    else:
+        print("새로 만들 스냅샷이 없습니다.")
+
+
+def cmd_compact_snapshots(args):
+    deleted = compact_position_snapshots(args.keep_days)
+    print(f"✅ 오래된 스냅샷 {deleted}개 정리 완료")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stock Asset Manager DB 관리 도구")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("migrate", help="마이그레이션 SQL 적용").set_defaults(func=cmd_migrate)
+    sub.add_parser("rebuild-positions", help="trades 기록으로 positions 테이블 재계산").set_defaults(func=cmd_rebuild_positions)
+
+    lots = sub.add_parser("process-lots", help="새 거래를 로트/실현손익에 반영")
+    lots.add_argument("--method", choices=LOT_METHODS + ("all",), default="all")
+    lots.add_argument("--reset", action="store_true", help="기존 로트/실현손익을 지우고 처음부터 다시 처리")
+    lots.set_defaults(func=cmd_process_lots)
+
+    snapshot = sub.add_parser("snapshot", help="밀린 잔고 스냅샷 생성")
+    snapshot.add_argument("--interval-days", type=int, default=None, help="스냅샷 간격(일), 기본값은 SNAPSHOT_INTERVAL_DAYS")
+    snapshot.set_defaults(func=cmd_snapshot)
+
+    compact = sub.add_parser("compact-snapshots", help="오래된 스냅샷을 월말 것만 남기고 정리")
+    compact.add_argument("--keep-days", type=int, default=None, help="이 기간 안의 스냅샷은 모두 유지, 기본값은 SNAPSHOT_KEEP_DAYS")
+    compact.set_defaults(func=cmd_compact_snapshots)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Prometheus 형식 메트릭과 요청별 구간 시간
+
+외부 라이브러리 없이 카운터/히스토그램을 들고 있다가 /metrics에서 텍스트 형식으로 내보냅니다.
+- 라우트별 응답 시간, 업스트림(야후/Frankfurter) 호출 시간, DB 함수별 실행 시간은 히스토그램으로 쌓습니다.
+  (히스토그램의 _count가 곧 호출 수이므로 outcome 라벨로 성공/실패/타임아웃 횟수도 함께 볼 수 있음)
+- 시세 캐시 적중률처럼 다른 모듈이 이미 세고 있는 값은 register_collector로 읽어 갈 함수를 등록해 둡니다.
+- 요청 하나 안에서 DB/업스트림에 쓴 시간은 contextvar에 모아 두었다가 Server-Timing 헤더로 붙일 수 있습니다.
+"""
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+# 초 단위 버킷 (5ms ~ 30s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}   # 라벨 값 튜플 -> 누적값
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # 라벨 값 튜플 -> [버킷별 개수..., 합계, 개수]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(float(series[-2]))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, func):
+        """
+        /metrics를 만들 때마다 불릴 함수를 등록합니다.
+        func()는 (이름, 종류('gauge'/'counter'), 설명, [({라벨}, 값), ...]) 목록을 돌려줍니다.
+        """
+        self._collectors.append(func)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for func in self._collectors:
+            try:
+                families = func()
+            except Exception as e:
+                # 통계 하나를 못 읽었다고 /metrics 전체가 실패하지 않게 합니다. (예: DB 풀이 아직 없음)
+                print(f"메트릭 수집 실패 ({getattr(func, '__name__', func)}): {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 프로세스 전체가 함께 쓰는 레지스트리
+registry = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# --- 요청별 구간 시간 (Server-Timing) ---
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.segments = {}   # 구간 이름 -> 누적 초 (병렬로 돈 구간은 겹쳐서 더해짐)
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.segments[name] = self.segments.get(name, 0.0) + seconds
+
+    def header(self):
+        """Server-Timing 헤더 값. app은 전체에서 DB/업스트림 시간을 뺀 나머지(라우팅, 계산, 직렬화)입니다."""
+        total = time.perf_counter() - self.started
+        with self._lock:
+            segments = dict(self.segments)
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in segments.items()]
+        parts.append(f"app;dur={max(total - sum(segments.values()), 0) * 1000:.1f}")
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def start_request_timings():
+    """현재 요청의 구간 시간 기록을 시작합니다. (미들웨어에서 호출)"""
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def add_timing(name, seconds):
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def timed(histogram, segment=None, **labels):
+    """블록 실행 시간을 outcome(ok/error) 라벨과 함께 histogram에 쌓고, segment가 있으면 요청 구간 시간에도 더합니다."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, outcome=outcome, **labels)
+        if segment:
+            add_timing(segment, elapsed)
+
+
+def timed_function(histogram, segment=None):
+    """함수 실행 시간을 function 라벨(함수 이름)로 쌓는 데코레이터"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(histogram, segment, function=func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- 여러 모듈이 함께 쓰는 메트릭 ---
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "API 라우트별 응답 시간", ("method", "route", "status"))
+UPSTREAM_REQUEST_SECONDS = registry.histogram(
+    "upstream_request_duration_seconds", "업스트림 호출 시간 (outcome: ok/error/timeout)", ("provider", "outcome"))
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_duration_seconds", "common.database / common.lots 함수별 실행 시간", ("function", "outcome"))
+FX_RATE_LOOKUPS = registry.counter(
+    "fx_rate_lookups_total", "/market/exchange-rate 응답이 나온 단계 (db, yfinance, backup_api, stale, default, none)",
+    ("source", "status"))
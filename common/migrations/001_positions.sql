@@ -0,0 +1,12 @@
+-- 종목별 현재 잔고 (trades를 매번 GROUP BY 하지 않도록 add_trade에서 함께 갱신)
+CREATE TABLE IF NOT EXISTS positions (
+    stock_code    VARCHAR(20) NOT NULL,
+    currency      VARCHAR(3)  NOT NULL,
+    quantity      NUMERIC     NOT NULL DEFAULT 0,
+    avg_cost      NUMERIC     NOT NULL DEFAULT 0,  -- 수량 가중 평균 매입단가
+    last_trade_id BIGINT,                          -- 마지막으로 반영된 trades.id
+    updated_at    TIMESTAMP   NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (stock_code, currency)
+);
+
+CREATE INDEX IF NOT EXISTS positions_open_idx ON positions (stock_code) WHERE quantity > 0;
@@ -0,0 +1,24 @@
+-- 종목별 일/주/월봉 시세 (야후에서 받은 봉을 로컬에 쌓아 두고 빠진 구간만 추가로 받음)
+CREATE TABLE IF NOT EXISTS price_history (
+    symbol       VARCHAR(20) NOT NULL,
+    bar_interval VARCHAR(4)  NOT NULL,  -- '1d', '1wk', '1mo'
+    bar_date     DATE        NOT NULL,
+    open         NUMERIC,
+    high         NUMERIC,
+    low          NUMERIC,
+    close        NUMERIC     NOT NULL,
+    adj_close    NUMERIC,
+    volume       BIGINT,
+    PRIMARY KEY (symbol, bar_interval, bar_date)
+);
+
+-- 종목별 동기화 상태: 어느 구간을 받아 왔고, 마지막 봉이 언제이며, 마지막으로 언제 확인했는지
+CREATE TABLE IF NOT EXISTS price_history_sync (
+    symbol       VARCHAR(20) NOT NULL,
+    bar_interval VARCHAR(4)  NOT NULL,
+    synced_from  DATE        NOT NULL,  -- 업스트림에 요청했던 가장 이른 날짜
+    synced_to    DATE        NOT NULL,  -- 업스트림에 요청했던 가장 늦은 날짜
+    last_bar     DATE,                  -- 저장된 가장 최근 봉
+    synced_at    TIMESTAMP   NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (symbol, bar_interval)
+);
@@ -0,0 +1,45 @@
+-- 예전 add_trade는 매도도 trade_type='BUY'로 저장했으므로 수량 부호로 바로잡습니다.
+UPDATE trades SET trade_type = 'SELL' WHERE quantity < 0 AND trade_type IS DISTINCT FROM 'SELL';
+
+-- 매수 단위(로트)별 잔량과 단가 (common/lots.py가 trades를 id 순서로 이어서 처리하며 갱신)
+-- fifo: 매수 1건 = 로트 1개 / average: 종목별로 이동평균 단가를 쓰는 로트 1개 (전량 매도 후 다시 사면 새 로트)
+CREATE TABLE IF NOT EXISTS lots (
+    method        VARCHAR(8)  NOT NULL,            -- 'fifo' 또는 'average'
+    open_trade_id BIGINT      NOT NULL,            -- 로트를 연 매수 거래의 trades.id
+    stock_code    VARCHAR(20) NOT NULL,
+    currency      VARCHAR(3)  NOT NULL,
+    opened_at     TIMESTAMP   NOT NULL,
+    quantity      NUMERIC     NOT NULL,            -- 이 로트로 매수한 총 수량
+    remaining     NUMERIC     NOT NULL,            -- 아직 팔지 않은 수량
+    cost          NUMERIC     NOT NULL,            -- 1주당 취득 단가
+    closed_at     TIMESTAMP,                       -- 잔량이 0이 된 시각
+    PRIMARY KEY (method, open_trade_id)
+);
+
+CREATE INDEX IF NOT EXISTS lots_open_idx ON lots (method, stock_code, currency, open_trade_id) WHERE remaining > 0;
+
+-- 매도 1건이 어떤 로트와 맞춰졌는지와 그 실현손익 (거래 통화 기준)
+CREATE TABLE IF NOT EXISTS realized_pnl (
+    id            BIGSERIAL   PRIMARY KEY,
+    method        VARCHAR(8)  NOT NULL,
+    sell_trade_id BIGINT      NOT NULL,
+    open_trade_id BIGINT,                          -- 맞출 로트가 없던 초과 매도분은 NULL
+    stock_code    VARCHAR(20) NOT NULL,
+    currency      VARCHAR(3)  NOT NULL,
+    quantity      NUMERIC     NOT NULL,
+    cost          NUMERIC,                         -- 1주당 취득 단가 (초과 매도분은 NULL)
+    price         NUMERIC     NOT NULL,            -- 1주당 매도 단가
+    pnl           NUMERIC,                         -- (price - cost) * quantity
+    realized_at   TIMESTAMP   NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS realized_pnl_lookup_idx ON realized_pnl (method, realized_at);
+
+-- 방식별로 어디까지 처리했는지 (다음 실행은 last_trade_id 이후 거래만 읽음)
+CREATE TABLE IF NOT EXISTS lot_engine_state (
+    method        VARCHAR(8) PRIMARY KEY,
+    last_trade_id BIGINT     NOT NULL DEFAULT 0,
+    updated_at    TIMESTAMP  NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO lot_engine_state (method) VALUES ('fifo'), ('average') ON CONFLICT DO NOTHING;
@@ -0,0 +1,19 @@
+-- 날짜 범위로 거래를 읽는 시점 조회(/holdings?as_of=)와 스냅샷 생성용
+CREATE INDEX IF NOT EXISTS trades_trade_date_idx ON trades (trade_date, id);
+
+-- 스냅샷을 만든 날짜 목록 (잔고가 하나도 없던 날의 스냅샷도 기록하기 위해 따로 둠)
+CREATE TABLE IF NOT EXISTS position_snapshot_index (
+    snapshot_date DATE      PRIMARY KEY,          -- 이 날짜 거래까지 반영한 잔고
+    positions     INTEGER   NOT NULL,
+    created_at    TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 날짜별 잔고 스냅샷 (trades를 (trade_date, id) 순서로 반영한 결과, 수량 0인 종목은 저장하지 않음)
+CREATE TABLE IF NOT EXISTS position_snapshots (
+    snapshot_date DATE        NOT NULL REFERENCES position_snapshot_index (snapshot_date) ON DELETE CASCADE,
+    stock_code    VARCHAR(20) NOT NULL,
+    currency      VARCHAR(3)  NOT NULL,
+    quantity      NUMERIC     NOT NULL,
+    avg_cost      NUMERIC     NOT NULL,
+    PRIMARY KEY (snapshot_date, stock_code, currency)
+);
@@ -0,0 +1,8 @@
+-- GET /trades 목록/내보내기용: 필터 + (trade_date, id) 키셋 페이지네이션을 인덱스 범위 스캔으로 처리합니다.
+-- 필터가 없을 때는 004의 trades_trade_date_idx (trade_date, id)를 씁니다. (역방향 스캔으로 최신순도 처리)
+CREATE INDEX IF NOT EXISTS trades_code_date_idx ON trades (stock_code, trade_date, id);
+CREATE INDEX IF NOT EXISTS trades_currency_date_idx ON trades (currency, trade_date, id);
+CREATE INDEX IF NOT EXISTS trades_type_date_idx ON trades (trade_type, trade_date, id);
+
+-- type 필터가 인덱스를 그대로 쓸 수 있도록 구분이 비어 있는 예전 매수 기록을 채웁니다. (매도는 003에서 정리됨)
+UPDATE trades SET trade_type = 'BUY' WHERE trade_type IS NULL AND quantity >= 0;
@@ -0,0 +1,21 @@
+-- 거래 기록이 바뀔 때마다 1씩 올라가는 버전 번호 (GET /holdings의 ETag와 잔고 응답 캐시가 이 값을 기준으로 함)
+-- add_trade(매수/매도), 대량 가져오기(COPY), 직접 실행한 SQL까지 모두 잡도록 trades의 문장 단위 트리거로 올립니다.
+-- 한 행짜리 테이블이라 거래를 동시에 저장하면 이 행에서 순서대로 기다리지만, 거래 저장은 드물어서 문제가 되지 않습니다.
+CREATE TABLE IF NOT EXISTS trades_version (
+    id      SMALLINT PRIMARY KEY CHECK (id = 1),
+    version BIGINT   NOT NULL
+);
+
+INSERT INTO trades_version (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_trades_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE trades_version SET version = version + 1 WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trades_version_bump ON trades;
+CREATE TRIGGER trades_version_bump
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON trades
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_trades_version();
@@ -0,0 +1,5 @@
+-- 거래 저장 요청의 멱등 키 (Idempotency-Key 헤더, 대기열 모드에서는 키를 주지 않아도 서버가 만들어 붙임)
+-- 같은 키로 다시 들어온 거래(클라이언트 재시도, 대기열 재처리)는 저장하지 않고 기존 거래를 돌려줍니다.
+-- 키가 없는 예전 거래(NULL)는 몇 개든 들어갈 수 있습니다.
+ALTER TABLE trades ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64);
+CREATE UNIQUE INDEX IF NOT EXISTS trades_idempotency_key_idx ON trades (idempotency_key);
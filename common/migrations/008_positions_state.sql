@@ -0,0 +1,11 @@
+-- positions를 trades로부터 다시 계산해야 하는지 표시하는 한 행짜리 테이블
+-- 001에서 positions를 빈 채로 만들었고, 재계산 순서도 (trade_date, id)로 바뀌었으므로 이 마이그레이션을 적용한 DB는 한 번 다시 계산합니다.
+-- API 서버가 시작하면 스케줄러가 needs_rebuild를 보고 자동으로 재계산하며(manage.py rebuild-positions도 같음),
+-- 끝나기 전에는 /holdings가 비어 있거나 틀린 잔고 대신 503을 돌려줍니다.
+CREATE TABLE IF NOT EXISTS positions_state (
+    id            SMALLINT  PRIMARY KEY CHECK (id = 1),
+    needs_rebuild BOOLEAN   NOT NULL,
+    rebuilt_at    TIMESTAMP
+);
+
+INSERT INTO positions_state (id, needs_rebuild) VALUES (1, TRUE) ON CONFLICT (id) DO UPDATE SET needs_rebuild = TRUE;
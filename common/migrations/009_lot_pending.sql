@@ -0,0 +1,52 @@
+-- 로트 엔진이 아직 반영하지 않은 거래 (방식마다 한 행)
+-- trades에 행이 들어오면 문장 단위 트리거가 넣고, common/lots.py가 (trade_date, id) 순서로 반영한 뒤 지웁니다.
+-- 먼저 시작했지만 늦게 커밋된 거래(작은 id, 이른 trade_date)도 커밋되는 순간 여기에 나타나므로 id 기준 진행 위치처럼 건너뛰지 않습니다.
+-- 이제 lot_engine_state는 방식 목록과 동시 처리 방지용 잠금으로만 쓰고 last_trade_id는 읽지 않습니다.
+CREATE TABLE IF NOT EXISTS lot_pending (
+    method   VARCHAR(8) NOT NULL,
+    trade_id BIGINT     NOT NULL,
+    PRIMARY KEY (method, trade_id)
+);
+
+CREATE OR REPLACE FUNCTION queue_lot_trades() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO lot_pending (method, trade_id)
+    SELECT s.method, n.id FROM new_trades n CROSS JOIN lot_engine_state s
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trades_lot_pending ON trades;
+CREATE TRIGGER trades_lot_pending
+    AFTER INSERT ON trades
+    REFERENCING NEW TABLE AS new_trades
+    FOR EACH STATEMENT EXECUTE FUNCTION queue_lot_trades();
+
+-- 이전 엔진은 last_trade_id까지를 id 순서로 처리했습니다. 그 뒤의 거래는 대기열에 넣고,
+-- 이미 처리한 거래 중 id 순서와 (trade_date, id) 순서가 어긋나는 종목만 로트를 지우고 처음부터 다시 넣습니다.
+INSERT INTO lot_pending (method, trade_id)
+SELECT s.method, t.id FROM lot_engine_state s JOIN trades t ON t.id > s.last_trade_id
+ON CONFLICT DO NOTHING;
+
+CREATE TEMP TABLE lot_misordered ON COMMIT DROP AS
+SELECT DISTINCT s.method, x.stock_code, x.currency
+FROM lot_engine_state s
+CROSS JOIN LATERAL (
+    SELECT stock_code, currency, trade_date,
+           MAX(trade_date) OVER (PARTITION BY stock_code, currency ORDER BY id
+                                 ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING) AS latest_before
+    FROM trades
+    WHERE id <= s.last_trade_id
+) x
+WHERE x.latest_before > x.trade_date;
+
+DELETE FROM lots l USING lot_misordered m
+WHERE l.method = m.method AND l.stock_code = m.stock_code AND l.currency = m.currency;
+
+DELETE FROM realized_pnl r USING lot_misordered m
+WHERE r.method = m.method AND r.stock_code = m.stock_code AND r.currency = m.currency;
+
+INSERT INTO lot_pending (method, trade_id)
+SELECT m.method, t.id FROM lot_misordered m JOIN trades t ON t.stock_code = m.stock_code AND t.currency = m.currency
+ON CONFLICT DO NOTHING;
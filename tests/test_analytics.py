@@ -0,0 +1,56 @@
+"""api.analytics.compute_analytics: 행렬로 계산한 기간 수익률"""
+from datetime import datetime, date
+
+import numpy as np
+import pytest
+
+from api.analytics import compute_analytics
+
+
+def _days(*dates):
+    return [int(np.datetime64(d, "D").astype(np.int64)) for d in dates]
+
+
+def test_no_trades():
+    assert compute_analytics([], [], [], {}) is None
+
+
+def test_single_position_return_in_krw():
+    trades = [("AAPL", "USD", 10, 100.0, datetime(2024, 1, 1, 10))]
+    prices = [("AAPL", _days("2024-01-01", "2024-01-02", "2024-01-03"), [100.0, 110.0, 99.0])]
+
+    result = compute_analytics(trades, prices, [], {"USD": 1000.0}, end=date(2024, 1, 3), include_series=True)
+
+    assert result["days"] == 3
+    assert result["value"] == pytest.approx(990_000.0)
+    assert result["net_invested"] == pytest.approx(1_000_000.0)
+    assert result["twr"] == pytest.approx(-0.01)
+    assert result["max_drawdown"] == pytest.approx(99 / 110 - 1, abs=1e-6)
+    # 기여도는 일별 기여의 단순 합: 0 + 0.1 - 0.1
+    assert result["contribution"] == {"AAPL": pytest.approx(0.0, abs=1e-9)}
+    assert [row["value"] for row in result["series"]] == pytest.approx([1_000_000.0, 1_100_000.0, 990_000.0])
+
+
+def test_cash_flow_does_not_count_as_return():
+    # 둘째 날 같은 가격으로 추가 매수: 평가금액은 늘지만 수익률은 0
+    trades = [
+        ("005930.KS", "KRW", 10, 70000.0, datetime(2024, 1, 1)),
+        ("005930.KS", "KRW", 10, 70000.0, datetime(2024, 1, 2)),
+    ]
+    prices = [("005930.KS", _days("2024-01-01", "2024-01-02"), [70000.0, 70000.0])]
+
+    result = compute_analytics(trades, prices, [], {}, end=date(2024, 1, 2))
+
+    assert result["value"] == pytest.approx(1_400_000.0)
+    assert result["twr"] == pytest.approx(0.0)
+
+
+def test_fx_history_is_used_for_valuation():
+    trades = [("AAPL", "USD", 1, 100.0, datetime(2024, 1, 1))]
+    prices = [("AAPL", _days("2024-01-01", "2024-01-02"), [100.0, 100.0])]
+    fx = [("USD", _days("2024-01-01", "2024-01-02"), [1300.0, 1430.0])]
+
+    result = compute_analytics(trades, prices, fx, {"USD": 9999.0}, end=date(2024, 1, 2))
+
+    assert result["value"] == pytest.approx(143_000.0)
+    assert result["twr"] == pytest.approx(0.1)
@@ -0,0 +1,42 @@
+"""api.bulk_import.TradeRowParser: CSV 행 경계와 거부 행의 줄 번호"""
+from api.bulk_import import TradeRowParser, MAX_RECORD_LINES
+
+
+def _parse(text):
+    parser = TradeRowParser("csv")
+    rows = [row for row in map(parser.feed, text.splitlines(keepends=True)) if row is not None]
+    parser.finish()
+    return parser, rows
+
+
+def test_quoted_newline_stays_in_one_row():
+    parser, rows = _parse(
+        "stock_code,quantity,price,currency,memo\n"
+        'AAPL,10,190.5,USD,"분할 매수\n1차"\n'
+        "MSFT,x,400,USD,\n"
+        "NVDA,3,120,USD,\n"
+    )
+
+    assert [row[:4] for row in rows] == [("AAPL", 10, 190.5, "USD"), ("NVDA", 3, 120.0, "USD")]
+    assert [reject["line"] for reject in parser.rejects] == [4]
+
+
+def test_unclosed_quote_is_rejected_at_its_first_line():
+    parser, rows = _parse(
+        "stock_code,quantity,price,currency,memo\n"
+        "AAPL,10,190.5,USD,\n"
+        'MSFT,1,400,USD,"닫히지 않음\n'
+        "NVDA,3,120,USD,\n"
+    )
+
+    assert [row[0] for row in rows] == ["AAPL"]
+    assert parser.rejected == 1 and parser.rejects[0]["line"] == 3
+
+
+def test_runaway_quote_does_not_swallow_the_rest():
+    body = "".join(f"NVDA,{i + 1},120,USD,\n" for i in range(MAX_RECORD_LINES + 5))
+    parser, rows = _parse('stock_code,quantity,price,currency,memo\nAAPL,1,1,USD,"\n' + body)
+
+    assert parser.rejects[0]["line"] == 2
+    assert parser.rejected == 1
+    assert len(rows) == 6   # 끊은 뒤의 줄들은 다시 행으로 읽힘
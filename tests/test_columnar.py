@@ -0,0 +1,90 @@
+"""api.columnar: Accept 헤더로 응답 형식 고르기, 열 단위 본문 인코딩"""
+import gzip
+
+import numpy as np
+import pytest
+
+from api import columnar
+from api.columnar import negotiate, columnar_response, JSON, ARROW, MSGPACK
+
+
+@pytest.fixture
+def all_formats(monkeypatch):
+    # pyarrow/msgpack가 설치되지 않은 환경에서도 선택 규칙만 확인합니다.
+    monkeypatch.setattr(columnar, "pa", object())
+    monkeypatch.setattr(columnar, "msgpack", object())
+
+
+@pytest.mark.parametrize("accept", [None, "", "*/*", "text/html"])
+def test_defaults_to_json(accept):
+    assert negotiate(accept) == JSON
+
+
+def test_highest_q_wins(all_formats):
+    assert negotiate(f"{JSON};q=0.5, {MSGPACK};q=0.9, {ARROW};q=0.8") == MSGPACK
+
+
+def test_tie_goes_to_first_listed(all_formats):
+    assert negotiate(f"{ARROW}, {MSGPACK}") == ARROW
+
+
+def test_q_zero_is_excluded(all_formats):
+    assert negotiate(f"{ARROW};q=0, {JSON};q=0.1") == JSON
+
+
+def test_unavailable_format_falls_back(monkeypatch):
+    monkeypatch.setattr(columnar, "pa", None)
+    assert negotiate(ARROW) == JSON
+
+
+class FakeRequest:
+    def __init__(self, **headers):
+        self.headers = {name.replace("_", "-"): value for name, value in headers.items()}
+
+
+COLUMNS = [("symbol", "str"), ("price", "f8")]
+ROWS = [{"symbol": "AAPL", "price": 190.5}, {"symbol": "005930.KS", "price": None}]
+
+
+def test_arrow_round_trip():
+    pa = pytest.importorskip("pyarrow")
+    response = columnar_response(FakeRequest(accept=ARROW), ROWS, ROWS, COLUMNS)
+
+    assert response.media_type == ARROW
+    table = pa.ipc.open_stream(response.body).read_all()
+    assert table.column("symbol").to_pylist() == ["AAPL", "005930.KS"]
+    assert str(table.schema.field("price").type) == "double"
+    prices = table.column("price").to_numpy()
+    assert prices[0] == 190.5 and np.isnan(prices[1])   # 값이 없으면 NaN
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    response = columnar_response(FakeRequest(accept=MSGPACK), ROWS, ROWS, COLUMNS)
+
+    body = msgpack.unpackb(response.body)
+    assert body["columns"] == ["symbol", "price"]
+    assert body["dtypes"] == {"symbol": "str", "price": "f8"}
+    assert body["data"]["symbol"] == ["AAPL", "005930.KS"]
+    prices = np.frombuffer(body["data"]["price"], dtype="<f8")
+    assert prices[0] == 190.5 and np.isnan(prices[1])
+
+
+def test_zstd_compressed_msgpack():
+    msgpack = pytest.importorskip("msgpack")
+    zstandard = pytest.importorskip("zstandard")
+    rows = [{"symbol": f"S{i:04d}", "price": float(i)} for i in range(500)]
+    response = columnar_response(FakeRequest(accept=MSGPACK, accept_encoding="gzip, zstd"), rows, rows, COLUMNS)
+
+    assert response.headers["content-encoding"] == "zstd"
+    body = msgpack.unpackb(zstandard.ZstdDecompressor().decompressobj().decompress(response.body))
+    assert np.frombuffer(body["data"]["price"], dtype="<f8").tolist() == [float(i) for i in range(500)]
+
+
+def test_gzip_when_zstd_is_not_accepted():
+    msgpack = pytest.importorskip("msgpack")
+    rows = [{"symbol": f"S{i:04d}", "price": float(i)} for i in range(500)]
+    response = columnar_response(FakeRequest(accept=MSGPACK, accept_encoding="gzip"), rows, rows, COLUMNS)
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert msgpack.unpackb(gzip.decompress(response.body))["data"]["symbol"][-1] == "S0499"
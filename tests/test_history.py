@@ -0,0 +1,44 @@
+"""api.history.missing_ranges: 로컬 시세 이력에 빠진 구간 계산"""
+from datetime import date, datetime, timedelta
+
+from api.history import missing_ranges, HISTORY_SYNC_TTL
+
+TODAY = date(2024, 6, 14)
+NOW = datetime(2024, 6, 14, 12, 0)
+
+
+def _sync(synced_from, synced_to, last_bar=None, synced_at=NOW):
+    return {"synced_from": synced_from, "synced_to": synced_to, "last_bar": last_bar, "synced_at": synced_at}
+
+
+def test_nothing_synced_yet():
+    assert missing_ranges(None, date(2024, 1, 1), date(2024, 3, 1), TODAY, NOW) == [(date(2024, 1, 1), date(2024, 3, 1))]
+
+
+def test_end_is_clamped_to_today():
+    assert missing_ranges(None, date(2024, 6, 1), date(2024, 12, 31), TODAY, NOW) == [(date(2024, 6, 1), TODAY)]
+
+
+def test_future_range_is_empty():
+    assert missing_ranges(None, date(2024, 7, 1), date(2024, 7, 5), TODAY, NOW) == []
+
+
+def test_head_and_tail_gaps():
+    sync = _sync(date(2024, 3, 1), date(2024, 5, 1), last_bar=date(2024, 4, 30))
+    assert missing_ranges(sync, date(2024, 1, 1), date(2024, 6, 1), TODAY, NOW) == [
+        (date(2024, 1, 1), date(2024, 2, 29)),
+        (date(2024, 4, 30), date(2024, 6, 1)),   # 마지막 봉부터 다시 받음
+    ]
+
+
+def test_covered_range_needs_nothing():
+    sync = _sync(date(2024, 1, 1), date(2024, 5, 1), last_bar=date(2024, 5, 1))
+    assert missing_ranges(sync, date(2024, 2, 1), date(2024, 4, 1), TODAY, NOW) == []
+
+
+def test_recent_tail_is_rechecked_only_after_ttl():
+    fresh = _sync(date(2024, 1, 1), TODAY, last_bar=TODAY, synced_at=NOW)
+    assert missing_ranges(fresh, date(2024, 2, 1), TODAY, TODAY, NOW) == []
+
+    old = _sync(date(2024, 1, 1), TODAY, last_bar=TODAY, synced_at=NOW - timedelta(seconds=HISTORY_SYNC_TTL))
+    assert missing_ranges(old, date(2024, 2, 1), TODAY, TODAY, NOW) == [(TODAY, TODAY)]
@@ -0,0 +1,81 @@
+"""common.lots.LotBook: FIFO / 이동평균 로트 매칭과 실현손익"""
+import pytest
+
+from common.lots import LotBook
+
+
+def _pnl(rows):
+    # realized 행: (method, sell_id, open_id, code, currency, quantity, cost, price, pnl, realized_at)
+    return [(r[2], r[5], r[8]) for r in rows]
+
+
+def test_fifo_sells_oldest_lot_first():
+    book = LotBook("fifo")
+    book.apply(1, "AAPL", "USD", 10, 100.0, "d1")
+    book.apply(2, "AAPL", "USD", 10, 120.0, "d2")
+
+    realized = book.apply(3, "AAPL", "USD", -15, 130.0, "d3")
+
+    assert _pnl(realized) == [(1, 10, 300.0), (2, 5, 50.0)]
+    [lot] = book.open[("AAPL", "USD")]
+    assert (lot["open_trade_id"], lot["remaining"], lot["cost"]) == (2, 5, 120.0)
+
+
+def test_fifo_closes_lot_and_marks_dirty():
+    book = LotBook("fifo")
+    book.apply(1, "AAPL", "USD", 5, 10.0, "d1")
+    book.take_dirty()
+
+    book.apply(2, "AAPL", "USD", -5, 12.0, "d2")
+
+    assert book.open[("AAPL", "USD")] == []
+    [lot] = book.take_dirty()
+    assert lot["remaining"] == 0 and lot["closed_at"] == "d2"
+
+
+def test_average_keeps_one_lot_with_moving_cost():
+    book = LotBook("average")
+    book.apply(1, "005930.KS", "KRW", 10, 100.0, "d1")
+    book.apply(2, "005930.KS", "KRW", 10, 200.0, "d2")
+
+    realized = book.apply(3, "005930.KS", "KRW", -4, 180.0, "d3")
+
+    assert _pnl(realized) == [(1, 4, 120.0)]
+    [lot] = book.open[("005930.KS", "KRW")]
+    assert (lot["quantity"], lot["remaining"], lot["cost"]) == (20, 16, 150.0)
+
+
+def test_average_opens_new_lot_after_full_sell():
+    book = LotBook("average")
+    book.apply(1, "AAPL", "USD", 10, 100.0, "d1")
+    book.apply(2, "AAPL", "USD", -10, 110.0, "d2")
+    book.apply(3, "AAPL", "USD", 5, 90.0, "d3")
+
+    [lot] = book.open[("AAPL", "USD")]
+    assert (lot["open_trade_id"], lot["cost"]) == (3, 90.0)
+
+
+def test_oversell_is_recorded_without_cost():
+    book = LotBook("fifo")
+    book.apply(1, "AAPL", "USD", 3, 100.0, "d1")
+
+    realized = book.apply(2, "AAPL", "USD", -5, 110.0, "d2")
+
+    assert _pnl(realized) == [(1, 3, 30.0), (None, 2, None)]
+    assert realized[1][6] is None
+
+
+def test_symbols_are_tracked_separately():
+    book = LotBook("fifo")
+    book.apply(1, "AAPL", "USD", 10, 100.0, "d1")
+    book.apply(2, "MSFT", "USD", 10, 300.0, "d2")
+
+    realized = book.apply(3, "MSFT", "USD", -10, 310.0, "d3")
+
+    assert _pnl(realized) == [(2, 10, 100.0)]
+    assert book.open[("AAPL", "USD")][0]["remaining"] == 10
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        LotBook("lifo")
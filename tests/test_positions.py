@@ -0,0 +1,34 @@
+"""common.database.apply_trade_to_position: 잔고 수량/평균단가 계산 (positions UPSERT와 같은 규칙)"""
+import pytest
+
+from common.database import apply_trade_to_position
+
+
+def test_buy_updates_weighted_average():
+    assert apply_trade_to_position(10, 100.0, 10, 200.0) == (20, 150.0)
+
+
+def test_first_buy_sets_price():
+    assert apply_trade_to_position(0, 0, 5, 42.0) == (5, 42.0)
+
+
+def test_partial_sell_keeps_average():
+    assert apply_trade_to_position(20, 150.0, -5, 999.0) == (15, 150.0)
+
+
+def test_full_sell_resets_average():
+    assert apply_trade_to_position(20, 150.0, -20, 160.0) == (0, 0)
+
+
+def test_buy_after_oversell_ignores_negative_holding():
+    quantity, avg_cost = apply_trade_to_position(-5, 0, 10, 30.0)
+    assert quantity == 5
+    assert avg_cost == pytest.approx(30.0)
+
+
+def test_replaying_trades_in_sequence():
+    trades = [(10, 100.0), (-4, 120.0), (6, 90.0), (-12, 95.0)]
+    quantity, avg_cost = 0, 0
+    for qty, price in trades:
+        quantity, avg_cost = apply_trade_to_position(quantity, avg_cost, qty, price)
+    assert (quantity, avg_cost) == (0, 0)
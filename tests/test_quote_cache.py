@@ -0,0 +1,146 @@
+"""api.quote_cache.QuoteCache: TTL, LRU, 동시 요청 합치기"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.quote_cache import QuoteCache
+
+
+def _cache(**kwargs):
+    kwargs.setdefault("ttl_func", lambda symbol: 60)
+    return QuoteCache(**kwargs)
+
+
+def test_second_lookup_hits_cache():
+    cache = _cache()
+    calls = []
+
+    def fetch_many(symbols):
+        calls.append(list(symbols))
+        return {s: {"price": 1.0} for s in symbols}
+
+    cache.get_many(["AAPL", "MSFT"], fetch_many)
+    result = cache.get_many(["AAPL", "MSFT", "NVDA"], fetch_many)
+
+    assert calls == [["AAPL", "MSFT"], ["NVDA"]]
+    assert set(result) == {"AAPL", "MSFT", "NVDA"}
+    assert cache.stats()["hits"] == 2
+
+
+def test_expired_entry_is_refetched_and_served_stale_on_error():
+    cache = _cache(ttl_func=lambda symbol: 0)
+    cache.get_many(["AAPL"], lambda symbols: {"AAPL": {"price": 1.0}})
+
+    def failing(symbols):
+        raise ConnectionError("down")
+
+    result = cache.get_many(["AAPL"], failing)
+    assert result["AAPL"][0] == {"price": 1.0}
+    assert cache.stats()["stale_served"] == 1
+
+
+def test_error_without_any_value_is_raised():
+    cache = _cache()
+    with pytest.raises(ConnectionError):
+        cache.get_many(["AAPL"], lambda symbols: (_ for _ in ()).throw(ConnectionError("down")))
+
+
+def test_lru_evicts_least_recently_used():
+    cache = _cache(maxsize=2)
+    fetch = lambda symbols: {s: {"price": 1.0} for s in symbols}
+    cache.get_many(["A"], fetch)
+    cache.get_many(["B"], fetch)
+    cache.get_many(["A"], fetch)       # A를 최근에 쓴 것으로
+    cache.get_many(["C"], fetch)       # B가 밀려남
+
+    assert cache.peek("A") is not None
+    assert cache.peek("B") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_concurrent_requests_share_one_fetch():
+    cache = _cache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch(symbols):
+        calls.append(list(symbols))
+        started.set()
+        release.wait(5)
+        return {s: {"price": 2.0} for s in symbols}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_many(["AAPL"], slow_fetch)))
+    leader.start()
+    assert started.wait(5)
+
+    followers = [threading.Thread(target=lambda: results.append(cache.get_many(["AAPL"], slow_fetch)))
+                 for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    # 뒤따른 요청들이 진행 중인 요청을 기다리기 시작할 때까지
+    deadline = time.time() + 5
+    while cache.stats()["coalesced"] < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == [["AAPL"]]
+    assert cache.stats()["coalesced"] == 3
+    assert [r["AAPL"][0] for r in results] == [{"price": 2.0}] * 4
+
+
+def test_get_fresh_returns_only_unexpired():
+    cache = _cache(ttl_func=lambda symbol: 60 if symbol == "AAPL" else 0)
+    cache.get_many(["AAPL", "MSFT"], lambda symbols: {s: {"price": 1.0} for s in symbols})
+
+    assert set(cache.get_fresh(["AAPL", "MSFT"])) == {"AAPL"}
+
+
+def test_async_waiters_do_not_call_upstream():
+    cache = _cache()
+    calls = []
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow_fetch(symbols):
+            # run_upstream 자리: 여기 들어온 요청만 업스트림 슬롯을 잡습니다.
+            calls.append(list(symbols))
+            await release.wait()
+            return {s: {"price": 3.0} for s in symbols}
+
+        leader = asyncio.create_task(cache.get_many_async(["AAPL"], slow_fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(cache.get_many_async(["AAPL"], slow_fetch)) for _ in range(5)]
+        while cache.stats()["coalesced"] < 5:
+            await asyncio.sleep(0)
+        release.set()
+        return await asyncio.gather(leader, *followers)
+
+    results = asyncio.run(run())
+    assert calls == [["AAPL"]]
+    assert [r["AAPL"][0] for r in results] == [{"price": 3.0}] * 6
+
+
+def test_cancelled_leader_releases_waiters():
+    cache = _cache()
+
+    async def run():
+        async def hang(symbols):
+            await asyncio.sleep(60)
+
+        leader = asyncio.create_task(cache.get_many_async(["AAPL"], hang))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_many_async(["AAPL"], hang))
+        while cache.stats()["coalesced"] < 1:
+            await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.wait_for(follower, 5)
+
+    assert asyncio.run(run()) == {}
+    assert cache.stats()["inflight"] == 0
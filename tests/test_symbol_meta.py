@@ -0,0 +1,31 @@
+"""api.symbol_meta.SymbolMetaCache: 종목명 조회와 파일 저장 묶기 (야후 조회는 가짜 함수로 바꿈)"""
+import time
+
+from api.symbol_meta import SymbolMetaCache
+
+
+def _fetch_name(symbol):
+    time.sleep(0.01)
+    return f"{symbol} Inc."
+
+
+def test_batch_of_lookups_is_saved_once(tmp_path):
+    path = tmp_path / "symbol_meta.json"
+    cache = SymbolMetaCache(path=str(path), fetch_name=_fetch_name, workers=4)
+    symbols = [f"S{i}" for i in range(20)]
+
+    names = cache.resolve_names(symbols, timeout=5)
+
+    assert names == {s: f"{s} Inc." for s in symbols}
+    assert cache.writes == 1
+    reloaded = SymbolMetaCache(path=str(path), fetch_name=_fetch_name)
+    assert reloaded.resolve_names(symbols) == names
+
+
+def test_remember_many_writes_once_and_skips_unchanged(tmp_path):
+    cache = SymbolMetaCache(path=str(tmp_path / "symbol_meta.json"), fetch_name=_fetch_name)
+
+    cache.remember_many({"AAPL": "Apple Inc.", "MSFT": "Microsoft", "X": "X"})
+    cache.flush()
+
+    assert cache.writes == 1
@@ -0,0 +1,22 @@
+"""api.trade_history: 키셋 페이지네이션 cursor"""
+from datetime import datetime
+
+import pytest
+
+from api.trade_history import encode_cursor, decode_cursor, InvalidCursor
+
+
+def test_cursor_round_trip():
+    row = {"trade_date": datetime(2024, 3, 5, 9, 30, 15, 123456), "id": 98765}
+    assert decode_cursor(encode_cursor(row)) == (row["trade_date"], row["id"])
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor({"trade_date": datetime(2024, 1, 1), "id": 1})
+    assert all(c.isalnum() or c in "-_=" for c in cursor)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "MjAyNC0wMS0wMQ==", "YWJjfGRlZg=="])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
@@ -0,0 +1,151 @@
+"""api.trade_queue.TradeQueue: 그룹 fsync, 묶음 저장, 데드레터, 주인 없는 슬롯 (DB 저장 함수는 가짜로 바꿈)"""
+import asyncio
+import json
+
+import psycopg2
+import pytest
+
+from api import trade_queue as tq
+
+
+class FakeDB:
+    def __init__(self):
+        self.trades = {}
+        self.batches = []
+        self.down = False
+
+    def insert_trades_batch(self, trades):
+        self.batches.append(len(trades))
+        if self.down:
+            raise psycopg2.OperationalError("connection refused")
+        if any(t["stock_code"] == "POISON" for t in trades):
+            raise psycopg2.DataError("value too long for type character varying(20)")
+        return {t["idempotency_key"]: self.trades.setdefault(t["idempotency_key"], len(self.trades) + 1)
+                for t in trades}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(tq, "insert_trades_batch", db.insert_trades_batch)
+    monkeypatch.setattr(tq, "get_trade_by_idempotency_key", lambda key: None)
+    return db
+
+
+def _open(path, **kwargs):
+    queue = tq.TradeQueue(str(path), **kwargs)
+    queue.open()
+    return queue
+
+
+def test_concurrent_submits_share_fsync_and_commit_in_batches(tmp_path, db):
+    async def run():
+        queue = _open(tmp_path, batch_size=40)
+        await asyncio.gather(*(queue.submit("AAPL", 1, 100.0, "USD", None, f"k{i}") for i in range(100)))
+        assert queue.fsyncs < 100
+        assert await queue.commit_pending() == 100
+        assert db.batches == [40, 40, 20]
+        assert (await queue.status("k7"))["status"] == "committed"
+        assert queue.stats()["backlog_bytes"] == 0
+        queue.close()
+
+    asyncio.run(run())
+
+
+def test_duplicate_key_is_not_queued_twice(tmp_path, db):
+    async def run():
+        queue = _open(tmp_path)
+        await queue.submit("AAPL", 1, 100.0, "USD", None, "same")
+        key, state = await queue.submit("AAPL", 1, 100.0, "USD", None, "same")
+        assert state["status"] == "queued"
+        assert queue.duplicates == 1
+        assert await queue.commit_pending() == 1
+        queue.close()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("stock_code, currency", [("X" * 21, "USD"), ("AAPL", "US"), ("", "USD")])
+def test_invalid_trade_is_refused_before_ack(tmp_path, db, stock_code, currency):
+    async def run():
+        queue = _open(tmp_path)
+        with pytest.raises(ValueError):
+            await queue.submit(stock_code, 1, 1.0, currency, None)
+        assert queue.accepted == 0
+        queue.close()
+
+    asyncio.run(run())
+
+
+def test_rejected_row_goes_to_dead_letter(tmp_path, db):
+    async def run():
+        queue = _open(tmp_path)
+        for i in range(3):
+            await queue.submit("AAPL", 1, 1.0, "USD", None, f"ok{i}")
+        await queue.submit("POISON", 1, 1.0, "USD", None, "bad")
+
+        assert await queue.commit_pending() == 3
+        state = await queue.status("bad")
+        assert state["status"] == "failed" and "too long" in state["error"]
+        assert queue.stats()["backlog_bytes"] == 0
+        [entry] = [json.loads(line) for line in (tmp_path / "queue-0.dead.jsonl").read_text().splitlines()]
+        assert entry["record"]["idempotency_key"] == "bad"
+        queue.close()
+
+        # 재시작해도 failed 상태를 기억합니다.
+        reopened = _open(tmp_path)
+        assert (await reopened.status("bad"))["status"] == "failed"
+        reopened.close()
+
+    asyncio.run(run())
+
+
+def test_connection_error_keeps_trades_queued(tmp_path, db):
+    async def run():
+        queue = _open(tmp_path)
+        await queue.submit("AAPL", 1, 1.0, "USD", None, "k")
+        db.down = True
+        with pytest.raises(psycopg2.OperationalError):
+            await queue.commit_pending()
+        assert (await queue.status("k"))["status"] == "queued"
+        assert not (tmp_path / "queue-0.dead.jsonl").exists()
+
+        db.down = False
+        assert await queue.commit_pending() == 1
+        queue.close()
+
+    asyncio.run(run())
+
+
+def test_recovers_unsaved_trades_and_drops_torn_line(tmp_path, db):
+    async def run():
+        queue = _open(tmp_path)
+        await queue.submit("AAPL", 1, 1.0, "USD", None, "k1")
+        queue._file.write(b'{"idempotency_key": "to')   # 쓰는 도중에 죽은 줄
+        queue._file.flush()
+        queue.close()
+
+        reopened = _open(tmp_path)
+        assert (await reopened.status("k1"))["status"] == "queued"
+        assert await reopened.commit_pending() == 1
+        assert reopened.corrupt == 0
+        reopened.close()
+
+    asyncio.run(run())
+
+
+def test_orphaned_slot_is_drained_by_another_worker(tmp_path, db):
+    async def run():
+        worker = _open(tmp_path)
+        gone = _open(tmp_path)
+        assert gone.slot == 1
+        await gone.submit("MSFT", 1, 1.0, "USD", None, "orphan")
+        gone.close()   # 워커가 줄어 슬롯 1을 아무도 잡지 않음
+
+        assert await worker.commit_pending() == 1
+        assert worker.stats()["orphans_drained"] == 1
+        assert "orphan" in db.trades
+        assert (tmp_path / "queue-1.jsonl").stat().st_size == 0
+        worker.close()
+
+    asyncio.run(run())
@@ -0,0 +1,187 @@
+"""api.upstream: 토큰 버킷, 서킷 브레이커, 재시도 정책"""
+import pytest
+
+from api import upstream
+from api.upstream import TokenBucket, CircuitBreaker, UpstreamClient, UpstreamUnavailable, UpstreamEmpty
+
+
+class FakeClock:
+    """time 모듈 대신 쓰는 시계. sleep은 기다리지 않고 시간만 앞으로 돌립니다."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(upstream, "time", clock)
+    return clock
+
+
+# --- TokenBucket ---
+def test_bucket_allows_burst_then_waits(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        assert bucket.acquire(max_wait=0)
+    assert clock.slept == []
+
+    assert bucket.acquire(max_wait=1)
+    assert clock.slept == [pytest.approx(0.5)]
+
+
+def test_bucket_refuses_when_wait_is_too_long(clock):
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.acquire()
+    assert not bucket.acquire(max_wait=0.5)
+    clock.now += 1
+    assert bucket.acquire(max_wait=0)
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.acquire(cost=5)
+    clock.now += 100
+    assert bucket.available() == 5
+
+
+def test_bucket_cost_is_capped_at_capacity(clock):
+    bucket = TokenBucket(rate=1, burst=2)
+    assert bucket.acquire(cost=50, max_wait=0)
+
+
+def test_zero_rate_means_unlimited(clock):
+    bucket = TokenBucket(rate=0, burst=0)
+    assert all(bucket.acquire(max_wait=0) for _ in range(100))
+    assert bucket.available() is None
+
+
+# --- CircuitBreaker ---
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failures=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failures=2, reset_seconds=30)
+    breaker.failure()
+    breaker.success()
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker(failures=1, reset_seconds=30)
+    breaker.failure()
+    clock.now += 30
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failures=1, reset_seconds=30)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+    assert not breaker.allow()
+
+
+def test_release_returns_probe_slot(clock):
+    breaker = CircuitBreaker(failures=1, reset_seconds=30)
+    breaker.failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
+
+
+# --- UpstreamClient.call ---
+def _client(retries=2, failures=5):
+    client = UpstreamClient("test", object, rate=0, burst=0, retries=retries)
+    client.breaker = CircuitBreaker(failures=failures, reset_seconds=30)
+    return client
+
+
+def test_call_retries_transient_errors(clock):
+    client = _client(retries=2)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConnectionError("reset")
+        return "ok"
+
+    assert client.call(flaky) == "ok"
+    assert len(attempts) == 3
+    assert client.retried == 2
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_call_raises_last_error_after_retries(clock):
+    client = _client(retries=1)
+
+    def down():
+        raise TimeoutError("slow")
+
+    with pytest.raises(TimeoutError):
+        client.call(down)
+    assert client.breaker.stats()["consecutive_failures"] == 2
+
+
+def test_open_circuit_rejects_without_calling(clock):
+    client = _client(retries=0, failures=1)
+    with pytest.raises(ConnectionError):
+        client.call(lambda: (_ for _ in ()).throw(ConnectionError("down")))
+
+    called = []
+    with pytest.raises(UpstreamUnavailable):
+        client.call(lambda: called.append(1))
+    assert called == []
+    assert client.rejected["open"] == 1
+
+
+def test_empty_result_counts_as_failure_without_retry(clock):
+    client = _client(retries=2)
+    attempts = []
+
+    def empty():
+        attempts.append(1)
+        raise UpstreamEmpty("no data")
+
+    with pytest.raises(UpstreamEmpty):
+        client.call(empty)
+    assert len(attempts) == 1
+    assert client.breaker.stats()["consecutive_failures"] == 1
+
+
+def test_non_transient_error_is_not_an_outage(clock):
+    client = _client(retries=2)
+    client.breaker.failure()
+
+    with pytest.raises(KeyError):
+        client.call(lambda: {}["missing"])
+    assert client.breaker.stats()["consecutive_failures"] == 0